@@ -0,0 +1,304 @@
+#!/usr/bin/env python3
+"""
+Time the client functions and CLI commands against a local fake API.
+
+Run from the repository root:
+
+    python benchmarks/bench_api.py [--sizes 1000,10000,100000] [--output results.json]
+
+For each size a `FakeApi` is seeded with that many notes and tasks (a tenth
+as many tags, a few clocks per task) and every case is run `--repeat` times
+from cold caches. The median time of each case is compared with
+benchmarks/baseline.json: a case slower by more than `--threshold` is
+flagged and the exit status is 1. Record a new baseline on the machine the
+comparisons will run on with `--save-baseline`.
+"""
+
+import argparse
+import contextlib
+import gc
+import json
+import os
+import platform
+import re
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from fake_api import FakeApi  # noqa: E402
+
+BASELINE = Path(__file__).resolve().parent / "baseline.json"
+# Differences smaller than this many seconds are noise, whatever the ratio
+NOISE_FLOOR = 0.01
+
+
+class Case(NamedTuple):
+    """
+    A timed call, and what it handles for the throughput.
+
+    `kind` names the records it handles, counted from the fake API; when it
+    is None the case makes `--ops` calls and throughput is calls per second.
+    """
+
+    name: str
+    kind: Optional[str]
+    run: Callable[[FakeApi, int], Any]
+
+
+def _ids(api: FakeApi, table: str, ops: int) -> List[int]:
+    ids = sorted(getattr(api, table))
+    return ids[:: max(1, len(ids) // ops)][:ops]
+
+
+def client_cases() -> List[Case]:
+    import notes
+    import tags
+    import tasks
+
+    def get_note(api: FakeApi, ops: int) -> None:
+        for note_id in _ids(api, "notes", ops):
+            notes.get_note(note_id)
+
+    def update_note(api: FakeApi, ops: int) -> None:
+        for note_id in _ids(api, "notes", ops):
+            notes.update_note(note_id, {"title": f"Note {note_id}"})
+
+    def create_note(api: FakeApi, ops: int) -> None:
+        for i in range(ops):
+            notes.create_note(f"{api.base_url}/notes", {"title": f"New {i}"})
+
+    def create_task_clock(api: FakeApi, ops: int) -> None:
+        for task_id in _ids(api, "tasks", ops):
+            tasks.create_task_clock(
+                task_id, "2024-10-21T09:00:00Z", "2024-10-21T10:00:00Z"
+            )
+
+    return [
+        Case("notes.get_notes", "notes", lambda api, ops: notes.get_notes()),
+        Case("notes.iter_notes", "notes", lambda api, ops: list(notes.iter_notes())),
+        Case(
+            "notes.get_notes_no_content",
+            "notes",
+            lambda api, ops: notes.get_notes_no_content(),
+        ),
+        Case("notes.get_notes_tree", "notes", lambda api, ops: notes.get_notes_tree()),
+        Case(
+            "notes.search_notes", "notes", lambda api, ops: notes.search_notes("plan")
+        ),
+        Case("tags.get_tags", "tags", lambda api, ops: tags.get_tags()),
+        Case(
+            "tags.get_tags_with_notes",
+            "tags",
+            lambda api, ops: tags.get_tags_with_notes(),
+        ),
+        Case(
+            "tags.list_tags_with_notes",
+            "tags",
+            lambda api, ops: tags.list_tags_with_notes(),
+        ),
+        Case("tags.get_tag_closure", "tags", lambda api, ops: tags.get_tag_closure()),
+        Case(
+            "tasks.get_tasks_details",
+            "tasks",
+            lambda api, ops: tasks.get_tasks_details(),
+        ),
+        Case(
+            "tasks.iter_tasks_details",
+            "tasks",
+            lambda api, ops: list(tasks.iter_tasks_details()),
+        ),
+        Case("tasks.get_tasks_tree", "tasks", lambda api, ops: tasks.get_tasks_tree()),
+        Case("notes.get_note", None, get_note),
+        # Writes last, as they change what the reads would return
+        Case("notes.update_note", None, update_note),
+        Case("notes.create_note", None, create_note),
+        Case("tasks.create_task_clock", None, create_task_clock),
+    ]
+
+
+def run_cli(args: List[str]) -> None:
+    """Run a CLI command in this process, its output thrown away."""
+    from main import app
+
+    with open(os.devnull, "w") as sink, contextlib.redirect_stdout(sink):
+        code = app(args, prog_name="draftsmith", standalone_mode=False)
+    if code:
+        raise RuntimeError(f"`{' '.join(args)}` exited with {code}")
+
+
+def cli_cases() -> List[Case]:
+    commands = [
+        ("notes", "notes list"),
+        ("notes", "notes list --format ndjson"),
+        ("notes", "notes search plan"),
+        ("notes", "notes tree list"),
+        ("tags", "tags list"),
+        ("tags", "tags tree list"),
+        ("tasks", "task list"),
+        ("tasks", "task list --format ndjson"),
+        ("tasks", "task tree list"),
+        ("tasks", "task schedule list"),
+        ("clocks", "task clocks list"),
+    ]
+    return [
+        Case(
+            f"cli {command}", kind, lambda api, ops, args=command.split(): run_cli(args)
+        )
+        for kind, command in commands
+    ]
+
+
+def reset(base_url: str) -> None:
+    """Start from a new client, with every response and lookup cache empty."""
+    import notes
+    import tags
+    from api_client import configure_client
+
+    configure_client(base_url).cache.clear()
+    notes.clear_note_cache()
+    tags._tag_indexes.clear()
+    tags._tag_closures.clear()
+    # Not left for a collection inside the next timed run
+    gc.collect()
+
+
+def run_case(case: Case, api: FakeApi, repeat: int, ops: int) -> Dict[str, Any]:
+    times = []
+    for _ in range(repeat):
+        reset(api.base_url)
+        start = time.perf_counter()
+        case.run(api, ops)
+        times.append(time.perf_counter() - start)
+    median = statistics.median(times)
+    handled = ops if case.kind is None else api.records[case.kind]
+    return {
+        "median": median,
+        "min": min(times),
+        "handled": handled,
+        "per_second": handled / median if median else None,
+    }
+
+
+class Row(NamedTuple):
+    name: str
+    size: str
+    result: Dict[str, Any]
+    change: Optional[float]
+    regression: bool
+
+
+def compare(
+    results: Dict[str, Dict[str, Dict[str, Any]]],
+    baseline: Dict[str, Dict[str, Dict[str, Any]]],
+    threshold: float,
+) -> List[Row]:
+    """
+    Compare each result's median time with the baseline's.
+
+    A result is a regression when its median is more than `threshold` (a
+    fraction) and more than `NOISE_FLOOR` seconds slower. Cases or sizes
+    missing from the baseline have no change.
+    """
+    rows = []
+    for name, sizes in results.items():
+        for size, result in sizes.items():
+            before = baseline.get(name, {}).get(size)
+            if not before or not before["median"]:
+                rows.append(Row(name, size, result, None, False))
+                continue
+            change = result["median"] / before["median"] - 1
+            slower = result["median"] - before["median"]
+            regression = change > threshold and slower > NOISE_FLOOR
+            rows.append(Row(name, size, result, change, regression))
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", default="1000,10000,100000")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument(
+        "--ops", type=int, default=100, help="Calls per write or lookup case."
+    )
+    parser.add_argument("--only", help="Only run cases whose name matches this regex.")
+    parser.add_argument("--output", type=Path, help="Write the results here as JSON.")
+    parser.add_argument("--baseline", type=Path, default=BASELINE)
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.3,
+        help="Flag cases this much slower than the baseline (default: 0.3, i.e. 30%%).",
+    )
+    parser.add_argument(
+        "--save-baseline",
+        action="store_true",
+        help="Write the results to the baseline instead of comparing.",
+    )
+    args = parser.parse_args()
+
+    # Keep the response cache away from the user's
+    os.environ["DRAFTSMITH_CACHE_DIR"] = tempfile.mkdtemp(prefix="draftsmith-bench-")
+    import codec
+    import main as cli  # noqa: F401 Imported up front so no case pays for it
+    import polars  # noqa: F401
+
+    cases = client_cases() + cli_cases()
+    if args.only:
+        cases = [case for case in cases if re.search(args.only, case.name)]
+    results: Dict[str, Dict[str, Dict[str, Any]]] = {}
+    for size in [int(size) for size in args.sizes.split(",")]:
+        print(f"Seeding {size} records...", file=sys.stderr)
+        with FakeApi(size) as api:
+            for case in cases:
+                results.setdefault(case.name, {})[str(size)] = run_case(
+                    case, api, args.repeat, args.ops
+                )
+                print(f"  {case.name}", file=sys.stderr)
+
+    report = {
+        "meta": {
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "codec": codec.NAME,
+            "repeat": args.repeat,
+            "ops": args.ops,
+        },
+        "results": results,
+    }
+    if args.output:
+        args.output.write_bytes(codec.dumps(report))
+    if args.save_baseline:
+        args.baseline.write_text(json.dumps(report, indent=2) + "\n")
+        print(f"Saved the baseline to {args.baseline}", file=sys.stderr)
+
+    baseline = {}
+    if args.baseline.exists() and not args.save_baseline:
+        baseline = json.loads(args.baseline.read_text())["results"]
+    rows = compare(results, baseline, args.threshold)
+    print(f"{'case':<36} {'size':>7} {'median':>10} {'per second':>12} {'change':>8}")
+    for row in rows:
+        change = "" if row.change is None else f"{row.change:+.0%}"
+        print(
+            f"{row.name:<36} {row.size:>7} {row.result['median'] * 1000:>8.1f}ms"
+            f" {row.result['per_second']:>12,.0f} {change:>8}"
+            + ("  REGRESSION" if row.regression else "")
+        )
+    regressions = sum(row.regression for row in rows)
+    if regressions:
+        print(
+            f"\n{regressions} case(s) more than {args.threshold:.0%} slower than"
+            f" the baseline ({args.baseline}).",
+            file=sys.stderr,
+        )
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
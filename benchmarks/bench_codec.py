@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Compare the JSON codecs on payloads shaped like the API's largest responses.
+
+Run from the repository root:
+
+    python benchmarks/bench_codec.py [--notes 5000] [--tasks 5000]
+"""
+
+import argparse
+import json
+import random
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+WORDS = "the note task draft meeting review plan idea todo project week".split()
+
+
+def make_notes(count: int) -> list:
+    """Notes as returned by `get_notes`, with a few paragraphs of Markdown each."""
+    rng = random.Random(0)
+    return [
+        {
+            "id": i,
+            "title": " ".join(rng.choices(WORDS, k=4)).title(),
+            "content": "\n\n".join(
+                "# Heading\n" + " ".join(rng.choices(WORDS, k=rng.randint(40, 120)))
+                for _ in range(3)
+            ),
+            "created_at": "2024-10-20T05:04:42.709064Z",
+            "modified_at": "2024-10-20T05:15:03.334779Z",
+        }
+        for i in range(count)
+    ]
+
+
+def make_tasks(count: int) -> list:
+    """Tasks as returned by `get_tasks_details`, with schedules and clocks."""
+    rng = random.Random(0)
+    return [
+        {
+            "id": i,
+            "note_id": i,
+            "status": rng.choice(["todo", "done", "wait"]),
+            "effort_estimate": rng.random() * 8,
+            "actual_effort": rng.random() * 8,
+            "deadline": "2023-06-30T15:00:00Z",
+            "priority": rng.randint(1, 5),
+            "all_day": False,
+            "goal_relationship": rng.randint(1, 5),
+            "created_at": "2024-10-20T10:31:58.269465Z",
+            "modified_at": "2024-10-20T10:31:58.269465Z",
+            "schedules": [
+                {
+                    "id": i * 10 + j,
+                    "start_datetime": "2023-06-01T09:00:00Z",
+                    "end_datetime": "2023-06-01T17:00:00Z",
+                }
+                for j in range(rng.randint(0, 3))
+            ],
+            "clocks": [
+                {
+                    "id": i * 10 + j,
+                    "clock_in": "2023-06-01T09:00:00Z",
+                    "clock_out": "2023-06-01T10:00:00Z",
+                }
+                for j in range(rng.randint(0, 5))
+            ],
+        }
+        for i in range(count)
+    ]
+
+
+def best_of(function, repeat: int) -> float:
+    return min(timeit.repeat(function, number=1, repeat=repeat))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--notes", type=int, default=5000)
+    parser.add_argument("--tasks", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    try:
+        import orjson
+    except ImportError:
+        orjson = None
+
+    codecs = {
+        "json": (
+            lambda obj: json.dumps(obj, separators=(",", ":")).encode(),
+            json.loads,
+        )
+    }
+    if orjson:
+        codecs["orjson"] = (orjson.dumps, orjson.loads)
+    else:
+        print("orjson is not installed, only timing the standard library.\n")
+
+    print(f"{'payload':<8} {'size':>8} {'codec':<7} {'encode':>9} {'decode':>9}")
+    for name, payload in [
+        ("notes", make_notes(args.notes)),
+        ("tasks", make_tasks(args.tasks)),
+    ]:
+        body = json.dumps(payload).encode()
+        for codec_name, (dumps, loads) in codecs.items():
+            encode = best_of(
+                lambda dumps=dumps, payload=payload: dumps(payload), args.repeat
+            )
+            decode = best_of(lambda loads=loads, body=body: loads(body), args.repeat)
+            print(
+                f"{name:<8} {len(body) / 1e6:>6.1f}MB {codec_name:<7}"
+                f" {encode * 1000:>7.1f}ms {decode * 1000:>7.1f}ms"
+            )
+
+
+if __name__ == "__main__":
+    main()
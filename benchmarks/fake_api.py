@@ -0,0 +1,333 @@
+"""
+A local HTTP stand-in for the Draftsmith API, seeded with generated records.
+
+Serves the read endpoints the client uses, plus enough writes (notes,
+tasks and clocks) to time them, on a real socket so requests go through the
+same connection pool, HTTP parsing and JSON decoding as against the server.
+
+    with FakeApi(notes=10_000) as api:
+        configure_client(api.base_url)
+        get_notes()
+
+Or serve it for the CLI, on its default port:
+
+    python benchmarks/fake_api.py --notes 10000
+"""
+
+import itertools
+import json
+import random
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+WORDS = "the note task draft meeting review plan idea todo project week".split()
+TIMESTAMP = "2024-10-20T05:04:42.709064Z"
+
+
+def _tree(parents: Dict[int, Optional[int]], node: Callable[[int], Dict]) -> List:
+    """Nest records by their parents, as the /tree endpoints return them."""
+    children: Dict[Optional[int], List[int]] = {}
+    for child, parent in parents.items():
+        children.setdefault(parent, []).append(child)
+
+    def build(record_id: int) -> Dict[str, Any]:
+        record = node(record_id)
+        if record_id in children:
+            record["children"] = [build(c) for c in children[record_id]]
+        return record
+
+    return [build(root) for root in children.get(None, [])]
+
+
+class FakeApi:
+    """
+    Generated notes, tags, tasks and clocks served over HTTP on localhost.
+
+    Records are generated from a fixed seed, so a size always gives the same
+    payloads. Response bodies are encoded once and kept until a write.
+
+    Args:
+        notes (int): The number of notes.
+        tasks (Optional[int]): The number of tasks, each on its own note (default: `notes`).
+        tags (Optional[int]): The number of tags, in a tree (default: a tenth of `notes`).
+        clocks (int): The most clocks and schedules a task has; each gets between none and this many.
+        seed (int): Seeds the generated records.
+    """
+
+    def __init__(
+        self,
+        notes: int = 1000,
+        tasks: Optional[int] = None,
+        tags: Optional[int] = None,
+        clocks: int = 4,
+        seed: int = 0,
+    ):
+        rng = random.Random(seed)
+        tasks = min(notes, notes if tasks is None else tasks)
+        tags = max(1, notes // 10 if tags is None else tags)
+        self.lock = threading.Lock()
+        self.notes: Dict[int, Dict[str, Any]] = {
+            i: {
+                "id": i,
+                "title": " ".join(rng.choices(WORDS, k=4)).title(),
+                "content": " ".join(rng.choices(WORDS, k=rng.randint(20, 60))),
+                "created_at": TIMESTAMP,
+                "modified_at": TIMESTAMP,
+            }
+            for i in range(1, notes + 1)
+        }
+        # Mostly under an earlier note, so the tree is a few levels deep
+        self.note_parents = {
+            i: rng.randint(1, i - 1) if i > 1 and rng.random() < 0.9 else None
+            for i in self.notes
+        }
+        self.tags = {i: f"tag{i}" for i in range(1, tags + 1)}
+        self.tag_parents = {i: i // 4 or None for i in self.tags}
+        self.note_tags: Dict[int, List[int]] = {i: [] for i in self.tags}
+        for note_id in self.notes:
+            for tag_id in rng.sample(range(1, tags + 1), min(tags, rng.randint(0, 3))):
+                self.note_tags[tag_id].append(note_id)
+        self.tasks: Dict[int, Dict[str, Any]] = {}
+        self.clocks: Dict[int, Dict[str, Any]] = {}
+        for i in range(1, tasks + 1):
+            task = {
+                "id": i,
+                "note_id": i,
+                "status": rng.choice(["todo", "done", "wait"]),
+                "effort_estimate": round(rng.random() * 8, 2),
+                "actual_effort": round(rng.random() * 8, 2),
+                "deadline": "2023-06-30T15:00:00Z",
+                "priority": rng.randint(1, 5),
+                "all_day": False,
+                "goal_relationship": rng.randint(1, 5),
+                "created_at": TIMESTAMP,
+                "modified_at": TIMESTAMP,
+                "schedules": [
+                    {
+                        "id": i * 10 + j,
+                        "start_datetime": f"2023-06-{j + 1:02d}T09:00:00Z",
+                        "end_datetime": f"2023-06-{j + 1:02d}T17:00:00Z",
+                    }
+                    for j in range(rng.randint(0, clocks))
+                ],
+                "clocks": [],
+            }
+            self.tasks[i] = task
+            for j in range(rng.randint(0, clocks)):
+                self._add_clock(
+                    {
+                        "id": i * 10 + j,
+                        "task_id": i,
+                        "clock_in": f"2023-06-{j + 1:02d}T09:00:00Z",
+                        "clock_out": f"2023-06-{j + 1:02d}T10:00:00Z",
+                    }
+                )
+        self.task_parents = {
+            i: rng.randint(1, i - 1) if i > 1 and rng.random() < 0.5 else None
+            for i in self.tasks
+        }
+        self._next_note_id = itertools.count(max(self.notes, default=0) + 1)
+        self._next_clock_id = itertools.count(max(self.clocks, default=0) + 1)
+        self._bodies: Dict[str, bytes] = {}
+        self._server: Optional[ThreadingHTTPServer] = None
+        self.requests = 0
+
+    @property
+    def records(self) -> Dict[str, int]:
+        """The number of records of each kind being served."""
+        return {
+            "notes": len(self.notes),
+            "tags": len(self.tags),
+            "tasks": len(self.tasks),
+            "clocks": len(self.clocks),
+        }
+
+    def _add_clock(self, clock: Dict[str, Any]) -> Dict[str, Any]:
+        self.clocks[clock["id"]] = clock
+        self.tasks[clock["task_id"]]["clocks"].append(
+            {key: value for key, value in clock.items() if key != "task_id"}
+        )
+        return clock
+
+    def _tag_notes(self, tag_id: int) -> Optional[List[Dict[str, Any]]]:
+        notes = [
+            {"id": n, "title": self.notes[n]["title"]} for n in self.note_tags[tag_id]
+        ]
+        return notes or None
+
+    # The payloads of the read endpoints, built on first request
+
+    def _listing(self, path: str) -> Any:
+        if path == "/notes":
+            return list(self.notes.values())
+        if path == "/notes/no-content":
+            return [
+                {k: v for k, v in note.items() if k != "content"}
+                for note in self.notes.values()
+            ]
+        if path == "/notes/tree":
+            return _tree(
+                self.note_parents,
+                lambda i: {"id": i, "title": self.notes[i]["title"], "type": ""},
+            )
+        if path == "/tags":
+            return [{"id": i, "name": name} for i, name in self.tags.items()]
+        if path == "/tags/with-notes":
+            return [
+                {"tag_id": i, "tag_name": name, "notes": self._tag_notes(i)}
+                for i, name in self.tags.items()
+            ]
+        if path == "/tags/tree":
+            return _tree(
+                self.tag_parents,
+                lambda i: {"id": i, "name": self.tags[i], "notes": self._tag_notes(i)},
+            )
+        if path == "/tasks/details":
+            return list(self.tasks.values())
+        if path == "/tasks/tree":
+            return _tree(
+                self.task_parents,
+                lambda i: {"id": i, "title": self.notes[i]["title"], "type": ""},
+            )
+        if path == "/task_clocks":
+            return list(self.clocks.values())
+        return None
+
+    def handle(self, method: str, target: str, body: Any) -> Tuple[int, bytes]:
+        """Answer a request with a status and a JSON body."""
+        url = urlsplit(target)
+        path = url.path.rstrip("/") or "/"
+        with self.lock:
+            self.requests += 1
+            if method == "GET":
+                if path in self._bodies:
+                    return 200, self._bodies[path]
+                payload = self._listing(path)
+                if payload is not None:
+                    self._bodies[path] = json.dumps(payload).encode()
+                    return 200, self._bodies[path]
+                if path == "/notes/search":
+                    query = parse_qs(url.query).get("q", [""])[0].lower()
+                    return 200, _encode(
+                        [
+                            note
+                            for note in self.notes.values()
+                            if query in note["title"].lower()
+                            or query in note["content"].lower()
+                        ]
+                    )
+                if match := re.fullmatch(r"/(notes|tasks)/(\d+)", path):
+                    table = self.notes if match[1] == "notes" else self.tasks
+                    record = table.get(int(match[2]))
+                    if record is not None:
+                        return 200, _encode(record)
+                return 404, _encode({"error": "Not found"})
+            return self._write(method, path, body)
+
+    def _write(self, method: str, path: str, body: Any) -> Tuple[int, bytes]:
+        self._bodies.clear()
+        if method == "POST" and path == "/notes":
+            note_id = next(self._next_note_id)
+            self.notes[note_id] = {
+                "id": note_id,
+                "content": "",
+                **body,
+                "created_at": TIMESTAMP,
+                "modified_at": TIMESTAMP,
+            }
+            self.note_parents[note_id] = None
+            return 200, _encode({"id": note_id, "message": "Note created successfully"})
+        if method == "POST" and path == "/task_clocks":
+            if body.get("task_id") not in self.tasks:
+                return 404, _encode({"error": "Task not found"})
+            clock = self._add_clock({**body, "id": next(self._next_clock_id)})
+            return 200, _encode(clock)
+        match = re.fullmatch(r"/(notes|tasks)/(\d+)", path)
+        table = self.notes if match and match[1] == "notes" else self.tasks
+        if match is None or int(match[2]) not in table:
+            return 404, _encode({"error": "Not found"})
+        record_id = int(match[2])
+        if method == "PUT":
+            table[record_id].update(body)
+            return 200, _encode({"id": record_id, "message": "Updated successfully"})
+        if method == "DELETE":
+            del table[record_id]
+            return 200, _encode({"message": "Deleted successfully"})
+        return 405, _encode({"error": "Method not allowed"})
+
+    # Serving
+
+    def start(self, port: int = 0) -> str:
+        """Serve in a background thread, on a free port by default, returning the base URL."""
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # Keep-alive, as the client's pooled session expects
+            protocol_version = "HTTP/1.1"
+            # The headers and body are sent separately, which would otherwise
+            # wait on the client's delayed ACK, some 40ms a request
+            disable_nagle_algorithm = True
+
+            def _respond(self) -> None:
+                length = int(self.headers.get("Content-Length") or 0)
+                body = json.loads(self.rfile.read(length)) if length else None
+                status, payload = api.handle(self.command, self.path, body)
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            do_GET = do_POST = do_PUT = do_DELETE = _respond
+
+            def log_message(self, format: str, *args: Any) -> None:
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self.base_url
+
+    @property
+    def base_url(self) -> str:
+        if self._server is None:
+            raise RuntimeError("The fake API has not been started.")
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self) -> "FakeApi":
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.stop()
+
+
+def _encode(payload: Any) -> bytes:
+    return json.dumps(payload).encode()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Serve a seeded fake Draftsmith API.")
+    parser.add_argument("--notes", type=int, default=1000)
+    # The CLI's default, so it can be run against the fake as is
+    parser.add_argument("--port", type=int, default=37238)
+    args = parser.parse_args()
+    api = FakeApi(args.notes)
+    api.start(args.port)
+    print(f"Serving {api.records} at {api.base_url}, Ctrl-C to stop")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        api.stop()
@@ -0,0 +1,422 @@
+import codecs
+import json
+import socket
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from typing import Any, Iterable, Iterator, List, Optional
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import ConnectTimeoutError
+from urllib3.util.connection import allowed_gai_family
+import codec
+import tracing
+from response_cache import ResponseCache
+
+DEFAULT_BASE_URL = "http://localhost:37238"
+DEFAULT_POOL_SIZE = 10
+# Bytes read from the socket at a time by the streaming decoder
+STREAM_CHUNK_SIZE = 64 * 1024
+JSON_HEADERS = {"Content-Type": "application/json"}
+
+
+def build_url(path: str, base_url: str = DEFAULT_BASE_URL) -> str:
+    """
+    Join an API path onto a base URL.
+
+    Shared by the sync and async clients so both address endpoints identically.
+
+    Args:
+        path (str): The path of the endpoint, e.g. "/notes".
+        base_url (str): The base URL of the API (default: "http://localhost:37238").
+
+    Returns:
+        str: The full URL of the endpoint.
+
+    Example:
+        >>> build_url("/notes/4", "http://localhost:37238/")
+        "http://localhost:37238/notes/4"
+    """
+    return f"{base_url.rstrip('/')}{path}"
+
+
+def parse_response(response: Any, check: bool = False) -> Any:
+    """
+    Decode the JSON body of a response.
+
+    Accepts both `requests` and `httpx` responses so the sync and async
+    endpoint functions handle responses the same way. The body is decoded
+    with `codec.loads`, which uses orjson when it is installed.
+
+    Args:
+        response (Any): The response returned by the server.
+        check (bool): Raise an error for bad responses before decoding.
+
+    Returns:
+        Any: The decoded JSON body.
+    """
+    if check:
+        response.raise_for_status()  # Raise an error for bad responses
+    return tracing.loads(response.content, response)
+
+
+class JsonArrayDecoder:
+    """
+    Decode a JSON array fed to it in byte chunks, returning each element once it is complete.
+
+    Only the element being decoded and the unread part of the current chunk
+    are held in memory, so a large list endpoint is decoded in constant
+    memory rather than all at once. Being fed rather than reading, it serves
+    both `iter_json_array` and the async client's streams.
+
+    Raises:
+        ValueError: If the body is not a JSON array.
+
+    Example:
+        >>> decoder = JsonArrayDecoder()
+        >>> decoder.feed(b'[{"id": 1}, {"i')
+        [{"id": 1}]
+        >>> decoder.feed(b'd": 2}]', final=True)
+        [{"id": 2}]
+    """
+
+    def __init__(self) -> None:
+        self._decoder = json.JSONDecoder()
+        self._utf8 = codecs.getincrementaldecoder("utf-8")()
+        self._buffer = ""
+        self._pos = 0
+        self._started = False
+        self.finished = False
+        # Characters to wait for before decoding again, so retrying a large
+        # element stays linear in its size
+        self._wanted = 0
+
+    def feed(self, chunk: bytes, final: bool = False) -> List[Any]:
+        """
+        Add the next chunk of the body, `final` once there are no more.
+
+        Returns:
+            List[Any]: The elements completed by this chunk.
+        """
+        if self.finished:
+            return []
+        text = self._utf8.decode(chunk, final=final)
+        self._buffer += text
+        self._wanted -= len(text)
+        if self._wanted > 0 and not final:
+            return []
+        elements: List[Any] = []
+        buffer, pos = self._buffer, self._pos
+        while True:
+            skipped = " \t\r\n," if self._started else " \t\r\n"
+            while pos < len(buffer) and buffer[pos] in skipped:
+                pos += 1
+            if pos >= len(buffer):
+                if final:
+                    raise ValueError(
+                        "Unterminated JSON array."
+                        if self._started
+                        else "Expected a JSON array."
+                    )
+                break
+            if not self._started:
+                if buffer[pos] != "[":
+                    raise ValueError("Expected a JSON array.")
+                self._started = True
+                pos += 1
+                continue
+            if buffer[pos] == "]":
+                self.finished = True
+                break
+            try:
+                element, end = self._decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if final:
+                    raise
+                self._wanted = max(len(buffer) - pos, 1)
+                break
+            if end == len(buffer) and not final:
+                # A number at the end of the buffer may continue in the next chunk
+                self._wanted = 1
+                break
+            elements.append(element)
+            pos = end
+        if pos > STREAM_CHUNK_SIZE:
+            buffer, pos = buffer[pos:], 0
+        self._buffer, self._pos = buffer, pos
+        return elements
+
+
+def iter_json_array(chunks: Iterable[bytes]) -> Iterator[Any]:
+    """
+    Decode a JSON array from a stream of byte chunks, yielding one element at a time.
+
+    Args:
+        chunks (Iterable[bytes]): The body, e.g. `response.iter_content(STREAM_CHUNK_SIZE)`.
+
+    Yields:
+        Any: Each element of the array.
+
+    Raises:
+        ValueError: If the body is not a JSON array.
+
+    Example:
+        >>> list(iter_json_array([b'[{"id": 1}, {"i', b'd": 2}]']))
+        [{"id": 1}, {"id": 2}]
+    """
+    decoder = JsonArrayDecoder()
+    for chunk in chunks:
+        yield from decoder.feed(chunk)
+        if decoder.finished:
+            return
+    yield from decoder.feed(b"", final=True)
+
+
+class _TimedConnectionMixin:
+    """Records the DNS and connect (including TLS) times of new connections while tracing."""
+
+    _dns_host: str
+    port: int
+
+    def connect(self) -> None:
+        start = time.perf_counter()
+        super().connect()  # type: ignore[misc]
+        if tracing.current() is not None:
+            dns = getattr(tracing.connection, "dns", 0.0)
+            tracing.connection.connect = time.perf_counter() - start - dns
+
+    def _new_conn(self) -> socket.socket:
+        if tracing.current() is None:
+            return super()._new_conn()  # type: ignore[misc]
+        host = self._dns_host
+        start = time.perf_counter()
+        try:
+            addresses = socket.getaddrinfo(
+                host.strip("[]"), self.port, allowed_gai_family(), socket.SOCK_STREAM
+            )
+        except OSError:
+            # Left to urllib3, which reports it as usual
+            return super()._new_conn()  # type: ignore[misc]
+        tracing.connection.dns = time.perf_counter() - start
+        # Connect to the resolved addresses in turn, as urllib3 would, so
+        # the name is not looked up a second time
+        error: Optional[Exception] = None
+        for address in dict.fromkeys(info[4][0] for info in addresses):
+            self._dns_host = address
+            try:
+                return super()._new_conn()  # type: ignore[misc]
+            except ConnectTimeoutError as e:
+                error = e
+            finally:
+                self._dns_host = host
+        assert error is not None
+        raise error
+
+
+class _TimedHTTPConnection(_TimedConnectionMixin, HTTPConnection):
+    pass
+
+
+class _TimedHTTPSConnection(_TimedConnectionMixin, HTTPSConnection):
+    pass
+
+
+class _TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+
+class _TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _TimedHTTPSConnection
+
+
+class _TimedAdapter(HTTPAdapter):
+    """An `HTTPAdapter` whose new connections are timed for `tracing`."""
+
+    def init_poolmanager(self, *args: Any, **kwargs: Any) -> None:
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _TimedHTTPConnectionPool,
+            "https": _TimedHTTPSConnectionPool,
+        }
+
+
+class ApiClient:
+    """
+    A session-backed client for the Draftsmith API.
+
+    The client keeps a pool of keep-alive connections so repeated calls to the
+    API reuse an open TCP connection rather than opening a new one per request.
+
+    Args:
+        base_url (str): The base URL of the API (default: "http://localhost:37238").
+        pool_size (int): The maximum number of connections kept open per host.
+        timeout (Optional[float]): Timeout in seconds applied to every request.
+        cache (Optional[ResponseCache]): Where `get_json` keeps responses, None disables caching.
+
+    Example:
+        >>> client = ApiClient("http://localhost:37238", pool_size=20)
+        >>> client.get(client.url("/notes")).json()
+        [{"id": 1, "title": "First note", ...}, ...]
+    """
+
+    def __init__(
+        self,
+        base_url: str = DEFAULT_BASE_URL,
+        pool_size: int = DEFAULT_POOL_SIZE,
+        timeout: Optional[float] = None,
+        cache: Optional[ResponseCache] = None,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.cache = cache
+        self.session = requests.Session()
+        self.session.headers.update({"Connection": "keep-alive"})
+        adapter = _TimedAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def url(self, path: str, base_url: Optional[str] = None) -> str:
+        """
+        Build a full URL for an API path.
+
+        Args:
+            path (str): The path of the endpoint, e.g. "/notes".
+            base_url (Optional[str]): Overrides the client's base URL when given.
+
+        Returns:
+            str: The full URL of the endpoint.
+        """
+        return build_url(path, base_url or self.base_url)
+
+    def request(self, method: str, url: str, **kwargs: Any) -> requests.Response:
+        """
+        Send a request through the pooled session.
+
+        Args:
+            method (str): The HTTP method, e.g. "GET".
+            url (str): The full URL to send the request to.
+            **kwargs: Passed through to `requests.Session.request`.
+
+        Returns:
+            requests.Response: The response from the server.
+        """
+        kwargs.setdefault("timeout", self.timeout)
+        tracer = tracing.current()
+        if tracer is None:
+            response = self.session.request(method, url, **kwargs)
+        else:
+            response = tracing.send(tracer, self.session.request, method, url, **kwargs)
+        if method != "GET" and self.cache is not None:
+            self.cache.invalidate()
+        return response
+
+    def get(self, url: str, **kwargs: Any) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def get_json(self, url: str, check: bool = False) -> Any:
+        """
+        GET a JSON endpoint through the response cache.
+
+        Args:
+            url (str): The full URL to send the request to.
+            check (bool): Raise an error for bad responses before decoding.
+
+        Returns:
+            Any: The decoded JSON body.
+        """
+        if self.cache is None:
+            return parse_response(self.get(url), check)
+        return self.cache.fetch(
+            url, lambda headers: self.get(url, headers=headers), check
+        )
+
+    def iter_json(self, url: str) -> Iterator[Any]:
+        """
+        GET a JSON array endpoint and yield its elements as they arrive.
+
+        The response is streamed rather than buffered and bypasses the
+        response cache.
+
+        Args:
+            url (str): The full URL to send the request to.
+
+        Yields:
+            Any: Each element of the array.
+        """
+        with self.get(url, stream=True) as response:
+            response.raise_for_status()
+            chunks = response.iter_content(STREAM_CHUNK_SIZE)
+            yield from tracing.stream(response, chunks, iter_json_array)
+
+    def post(
+        self, url: str, json: Optional[Any] = None, **kwargs: Any
+    ) -> requests.Response:
+        kwargs.setdefault("headers", JSON_HEADERS)
+        if json is not None:
+            kwargs["data"] = codec.dumps(json)
+        return self.request("POST", url, **kwargs)
+
+    def put(
+        self, url: str, json: Optional[Any] = None, **kwargs: Any
+    ) -> requests.Response:
+        kwargs.setdefault("headers", JSON_HEADERS)
+        if json is not None:
+            kwargs["data"] = codec.dumps(json)
+        return self.request("PUT", url, **kwargs)
+
+    def delete(self, url: str, **kwargs: Any) -> requests.Response:
+        return self.request("DELETE", url, **kwargs)
+
+    def close(self) -> None:
+        """Close every pooled connection held by the client."""
+        self.session.close()
+
+
+_client: Optional[ApiClient] = None
+
+
+def get_client() -> ApiClient:
+    """
+    Return the shared client used by the endpoint functions.
+
+    The client is created on first use with the default settings and a
+    response cache.
+
+    Returns:
+        ApiClient: The shared client.
+    """
+    global _client
+    if _client is None:
+        _client = ApiClient(cache=ResponseCache())
+    return _client
+
+
+def configure_client(
+    base_url: str = DEFAULT_BASE_URL,
+    pool_size: int = DEFAULT_POOL_SIZE,
+    timeout: Optional[float] = None,
+    cache: bool = True,
+) -> ApiClient:
+    """
+    Replace the shared client with one built from the given settings.
+
+    Args:
+        base_url (str): The base URL of the API (default: "http://localhost:37238").
+        pool_size (int): The maximum number of connections kept open per host.
+        timeout (Optional[float]): Timeout in seconds applied to every request.
+        cache (bool): Keep JSON responses in a `ResponseCache`, see `ApiClient.get_json`.
+
+    Returns:
+        ApiClient: The new shared client.
+
+    Example:
+        >>> configure_client(pool_size=50)
+    """
+    global _client
+    if _client is not None:
+        _client.close()
+    _client = ApiClient(
+        base_url, pool_size, timeout, ResponseCache() if cache else None
+    )
+    return _client
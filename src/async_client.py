@@ -0,0 +1,566 @@
+import asyncio
+import codec
+import httpx
+from typing import AsyncIterator, Dict, Any, List, Optional
+from urllib.parse import quote
+import notes
+from api_client import (
+    DEFAULT_BASE_URL,
+    JSON_HEADERS,
+    STREAM_CHUNK_SIZE,
+    JsonArrayDecoder,
+    build_url,
+    parse_response,
+)
+
+DEFAULT_MAX_CONCURRENCY = 20
+
+
+class AsyncApiClient:
+    """
+    An asyncio client for the Draftsmith API.
+
+    Requests share a pool of keep-alive connections and at most
+    `max_concurrency` of them are in flight at once, the rest wait their turn.
+
+    Args:
+        base_url (str): The base URL of the API (default: "http://localhost:37238").
+        max_concurrency (int): The maximum number of requests in flight at once.
+        timeout (Optional[float]): Timeout in seconds applied to every request.
+        transport (Optional[httpx.AsyncBaseTransport]): Overrides the transport, e.g. for tests.
+
+    Example:
+        >>> async with AsyncApiClient(max_concurrency=50) as client:
+        ...     response = await client.get(client.url("/notes"))
+    """
+
+    def __init__(
+        self,
+        base_url: str = DEFAULT_BASE_URL,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+        timeout: Optional[float] = None,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.max_concurrency = max_concurrency
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        limits = httpx.Limits(
+            max_connections=max_concurrency, max_keepalive_connections=max_concurrency
+        )
+        self.client = httpx.AsyncClient(
+            limits=limits, timeout=timeout, transport=transport
+        )
+
+    def url(self, path: str, base_url: Optional[str] = None) -> str:
+        return build_url(path, base_url or self.base_url)
+
+    async def request(self, method: str, url: str, **kwargs: Any) -> httpx.Response:
+        """
+        Send a request once a concurrency slot is free.
+
+        Args:
+            method (str): The HTTP method, e.g. "GET".
+            url (str): The full URL to send the request to.
+            **kwargs: Passed through to `httpx.AsyncClient.request`.
+
+        Returns:
+            httpx.Response: The response from the server.
+        """
+        async with self.semaphore:
+            return await self.client.request(method, url, **kwargs)
+
+    async def get(self, url: str, **kwargs: Any) -> httpx.Response:
+        return await self.request("GET", url, **kwargs)
+
+    async def post(
+        self, url: str, json: Optional[Any] = None, **kwargs: Any
+    ) -> httpx.Response:
+        kwargs.setdefault("headers", JSON_HEADERS)
+        if json is not None:
+            kwargs["content"] = codec.dumps(json)
+        return await self.request("POST", url, **kwargs)
+
+    async def put(
+        self, url: str, json: Optional[Any] = None, **kwargs: Any
+    ) -> httpx.Response:
+        kwargs.setdefault("headers", JSON_HEADERS)
+        if json is not None:
+            kwargs["content"] = codec.dumps(json)
+        return await self.request("PUT", url, **kwargs)
+
+    async def delete(self, url: str, **kwargs: Any) -> httpx.Response:
+        return await self.request("DELETE", url, **kwargs)
+
+    async def iter_json(self, url: str) -> AsyncIterator[Any]:
+        """
+        GET a JSON array endpoint and yield its elements as they arrive.
+
+        The response is decoded as it is read, so memory use does not grow
+        with the length of the array. The request holds its concurrency slot
+        until the body has been read.
+
+        Args:
+            url (str): The full URL to send the request to.
+
+        Yields:
+            Any: Each element of the array.
+        """
+        decoder = JsonArrayDecoder()
+        async with self.semaphore:
+            async with self.client.stream("GET", url) as response:
+                response.raise_for_status()
+                async for chunk in response.aiter_bytes(STREAM_CHUNK_SIZE):
+                    for element in decoder.feed(chunk):
+                        yield element
+                    if decoder.finished:
+                        return
+        for element in decoder.feed(b"", final=True):
+            yield element
+
+    async def aclose(self) -> None:
+        """Close every pooled connection held by the client."""
+        await self.client.aclose()
+
+    async def __aenter__(self) -> "AsyncApiClient":
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.aclose()
+
+
+_client: Optional[AsyncApiClient] = None
+_client_loop: Optional[asyncio.AbstractEventLoop] = None
+_closer: Optional[AsyncIterator[None]] = None
+
+
+def get_async_client() -> AsyncApiClient:
+    """
+    Return the shared async client for the running event loop.
+
+    Connections cannot be shared between event loops, so a new client is
+    created the first time this is called from a different loop, and the
+    previous one is closed.
+
+    Returns:
+        AsyncApiClient: The shared client.
+    """
+    loop = asyncio.get_running_loop()
+    if _client is None or _client_loop is not loop:
+        _replace_client(AsyncApiClient(), loop)
+    assert _client is not None
+    return _client
+
+
+async def _close_at_shutdown(client: AsyncApiClient) -> AsyncIterator[None]:
+    # Finalised by loop.shutdown_asyncgens, which asyncio.run calls before
+    # closing the loop, the last moment the client's connections can be closed
+    try:
+        yield
+    finally:
+        await client.aclose()
+
+
+def _replace_client(client: AsyncApiClient, loop: asyncio.AbstractEventLoop) -> None:
+    global _client, _client_loop, _closer
+    previous, previous_loop = _client, _client_loop
+    _client, _client_loop = client, loop
+    if previous is not None and previous_loop is not None:
+        if previous_loop is loop:
+            loop.create_task(previous.aclose())
+        elif not previous_loop.is_closed():
+            # Closed on its own loop, whenever that runs next
+            asyncio.run_coroutine_threadsafe(previous.aclose(), previous_loop)
+    # Held here, as the loop only keeps a weak reference to the generator
+    _closer = _close_at_shutdown(client)
+    asyncio.ensure_future(_closer.__anext__())
+
+
+def configure_async_client(
+    base_url: str = DEFAULT_BASE_URL,
+    max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+    timeout: Optional[float] = None,
+    transport: Optional[httpx.AsyncBaseTransport] = None,
+) -> AsyncApiClient:
+    """
+    Replace the shared async client for the running event loop, closing the previous one.
+
+    Args:
+        base_url (str): The base URL of the API (default: "http://localhost:37238").
+        max_concurrency (int): The maximum number of requests in flight at once.
+        timeout (Optional[float]): Timeout in seconds applied to every request.
+        transport (Optional[httpx.AsyncBaseTransport]): Overrides the transport, e.g. for tests.
+
+    Returns:
+        AsyncApiClient: The new shared client.
+
+    Example:
+        >>> configure_async_client(max_concurrency=100)
+    """
+    client = AsyncApiClient(base_url, max_concurrency, timeout, transport)
+    _replace_client(client, asyncio.get_running_loop())
+    return client
+
+
+# Notes
+
+
+async def create_note(url: str, note_data: Dict[str, str]) -> Dict[str, Any]:
+    """Coroutine version of `notes.create_note`."""
+    response = await get_async_client().post(url, json=note_data)
+    return parse_response(response)
+
+
+async def update_note(
+    note_id: int, update_data: Dict[str, str], base_url: Optional[str] = None
+) -> Dict[str, Any]:
+    """Coroutine version of `notes.update_note`."""
+    client = get_async_client()
+    response = await client.put(
+        client.url(f"/notes/{note_id}", base_url), json=update_data
+    )
+    notes.forget_note(note_id, base_url or client.base_url)
+    return parse_response(response)
+
+
+async def delete_note(note_id: int, base_url: Optional[str] = None) -> Dict[str, str]:
+    """Coroutine version of `notes.delete_note`."""
+    client = get_async_client()
+    response = await client.delete(client.url(f"/notes/{note_id}", base_url))
+    notes.forget_note(note_id, base_url or client.base_url)
+    return parse_response(response)
+
+
+async def get_notes(base_url: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Coroutine version of `notes.get_notes`."""
+    client = get_async_client()
+    response = await client.get(client.url("/notes", base_url))
+    return parse_response(response, check=True)
+
+
+def iter_notes(base_url: Optional[str] = None) -> AsyncIterator[Dict[str, Any]]:
+    """Async generator version of `notes.iter_notes`."""
+    client = get_async_client()
+    return client.iter_json(client.url("/notes", base_url))
+
+
+async def get_note(
+    note_id: int, base_url: Optional[str] = None, refresh: bool = False
+) -> Dict[str, Any]:
+    """
+    Coroutine version of `notes.get_note`.
+
+    Shares its cache of notes with `notes.get_note`, so a note fetched by
+    either is served to both.
+    """
+    client = get_async_client()
+    lookup = notes.note_lookup(note_id, base_url or client.base_url, refresh)
+    try:
+        step = next(lookup)
+        while True:
+            if step == "note":
+                url = client.url(f"/notes/{note_id}", base_url)
+                step = lookup.send(await client.get(url))
+            else:
+                step = lookup.send(await get_notes(base_url))
+    except StopIteration as done:
+        return done.value
+
+
+async def get_notes_no_content(
+    base_url: Optional[str] = None,
+) -> List[Dict[str, Any]]:
+    """Coroutine version of `notes.get_notes_no_content`."""
+    client = get_async_client()
+    response = await client.get(client.url("/notes/no-content", base_url))
+    return parse_response(response, check=True)
+
+
+async def search_notes(
+    query: str, base_url: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    """Coroutine version of `notes.search_notes`."""
+    client = get_async_client()
+    url = client.url(f"/notes/search?q={quote(query)}", base_url)
+    response = await client.get(url)
+    return parse_response(response, check=True)
+
+
+async def create_note_hierarchy(
+    hierarchy_data: Dict[str, int], base_url: Optional[str] = None
+) -> Dict[str, Any]:
+    """Coroutine version of `notes.create_note_hierarchy`."""
+    client = get_async_client()
+    response = await client.post(
+        client.url("/notes/hierarchy", base_url), json=hierarchy_data
+    )
+    return parse_response(response, check=True)
+
+
+async def update_note_hierarchy(
+    note_id: int, hierarchy_data: Dict[str, Any], base_url: Optional[str] = None
+) -> Dict[str, Any]:
+    """Coroutine version of `notes.update_note_hierarchy`."""
+    client = get_async_client()
+    response = await client.put(
+        client.url(f"/notes/hierarchy/{note_id}", base_url), json=hierarchy_data
+    )
+    return parse_response(response)
+
+
+async def delete_note_hierarchy(
+    note_id: int, base_url: Optional[str] = None
+) -> Dict[str, Any]:
+    """Coroutine version of `notes.delete_note_hierarchy`."""
+    client = get_async_client()
+    response = await client.delete(client.url(f"/notes/hierarchy/{note_id}", base_url))
+    return parse_response(response)
+
+
+async def get_notes_tree(base_url: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Coroutine version of `notes.get_notes_tree`."""
+    client = get_async_client()
+    response = await client.get(client.url("/notes/tree", base_url))
+    return parse_response(response, check=True)
+
+
+# Tags
+
+
+async def create_tag(tag_name: str, base_url: Optional[str] = None) -> Dict[str, Any]:
+    """Coroutine version of `tags.create_tag`."""
+    client = get_async_client()
+    response = await client.post(client.url("/tags", base_url), json={"name": tag_name})
+    return parse_response(response)
+
+
+async def assign_tag_to_note(
+    note_id: int, tag_id: int, base_url: Optional[str] = None
+) -> Dict[str, Any]:
+    """Coroutine version of `tags.assign_tag_to_note`."""
+    client = get_async_client()
+    response = await client.post(
+        client.url(f"/notes/{note_id}/tags", base_url), json={"tag_id": tag_id}
+    )
+    return parse_response(response)
+
+
+async def update_tag(
+    tag_id: int, new_name: str, base_url: Optional[str] = None
+) -> Dict[str, Any]:
+    """Coroutine version of `tags.update_tag`."""
+    client = get_async_client()
+    response = await client.put(
+        client.url(f"/tags/{tag_id}", base_url), json={"name": new_name}
+    )
+    return parse_response(response)
+
+
+async def delete_tag(tag_id: int, base_url: Optional[str] = None) -> Dict[str, Any]:
+    """Coroutine version of `tags.delete_tag`."""
+    client = get_async_client()
+    response = await client.delete(client.url(f"/tags/{tag_id}", base_url))
+    return parse_response(response)
+
+
+async def get_tags_with_notes(
+    base_url: Optional[str] = None,
+) -> List[Dict[str, Any]]:
+    """Coroutine version of `tags.get_tags_with_notes`."""
+    client = get_async_client()
+    response = await client.get(client.url("/tags/with-notes", base_url))
+    return parse_response(response)
+
+
+async def get_tag_names(base_url: Optional[str] = None) -> List[str]:
+    """Coroutine version of `tags.get_tag_names`."""
+    client = get_async_client()
+    response = await client.get(client.url("/tags", base_url))
+    tags = parse_response(response, check=True)
+    return [tag["name"] for tag in tags]
+
+
+async def create_tag_hierarchy(
+    parent_tag_id: int, child_tag_id: int, base_url: Optional[str] = None
+) -> Dict[str, Any]:
+    """Coroutine version of `tags.create_tag_hierarchy`."""
+    client = get_async_client()
+    hierarchy_data = {"parent_tag_id": parent_tag_id, "child_tag_id": child_tag_id}
+    response = await client.post(
+        client.url("/tags/hierarchy", base_url), json=hierarchy_data
+    )
+    return parse_response(response)
+
+
+async def update_tag_hierarchy(
+    tag_id: int, parent_tag_id: int, base_url: Optional[str] = None
+) -> Dict[str, Any]:
+    """Coroutine version of `tags.update_tag_hierarchy`."""
+    client = get_async_client()
+    response = await client.put(
+        client.url(f"/tags/hierarchy/{tag_id}", base_url),
+        json={"parent_tag_id": parent_tag_id},
+    )
+    return parse_response(response)
+
+
+async def delete_tag_hierarchy_entry(
+    tag_hierarchy_id: int, base_url: Optional[str] = None
+) -> Dict[str, str]:
+    """Coroutine version of `tags.delete_tag_hierarchy_entry`."""
+    client = get_async_client()
+    response = await client.delete(
+        client.url(f"/tags/hierarchy/{tag_hierarchy_id}", base_url)
+    )
+    return parse_response(response)
+
+
+async def list_tags_with_notes(
+    base_url: Optional[str] = None,
+) -> List[Dict[str, Any]]:
+    """Coroutine version of `tags.list_tags_with_notes`."""
+    client = get_async_client()
+    response = await client.get(client.url("/tags/tree", base_url))
+    return parse_response(response)
+
+
+# Tasks
+
+
+async def create_task(
+    task_data: Dict[str, Any], base_url: Optional[str] = None
+) -> Dict[str, Any]:
+    """Coroutine version of `tasks.create_task`."""
+    client = get_async_client()
+    response = await client.post(client.url("/tasks", base_url), json=task_data)
+    try:
+        response.raise_for_status()
+    except httpx.HTTPStatusError:
+        print(f"Error response content: {response.content}")
+        raise
+    return parse_response(response)
+
+
+async def update_task(
+    task_id: int, update_data: Dict[str, Any], base_url: Optional[str] = None
+) -> Dict[str, Any]:
+    """Coroutine version of `tasks.update_task`."""
+    client = get_async_client()
+    response = await client.put(
+        client.url(f"/tasks/{task_id}", base_url), json=update_data
+    )
+    return parse_response(response, check=True)
+
+
+async def delete_task(task_id: int, base_url: Optional[str] = None) -> Dict[str, str]:
+    """Coroutine version of `tasks.delete_task`."""
+    client = get_async_client()
+    response = await client.delete(client.url(f"/tasks/{task_id}", base_url))
+    return parse_response(response, check=True)
+
+
+async def get_tasks_details(base_url: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Coroutine version of `tasks.get_tasks_details`."""
+    client = get_async_client()
+    response = await client.get(client.url("/tasks/details", base_url))
+    return parse_response(response, check=True)
+
+
+def iter_tasks_details(
+    base_url: Optional[str] = None,
+) -> AsyncIterator[Dict[str, Any]]:
+    """Async generator version of `tasks.iter_tasks_details`."""
+    client = get_async_client()
+    return client.iter_json(client.url("/tasks/details", base_url))
+
+
+async def get_tasks_tree(base_url: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Coroutine version of `tasks.get_tasks_tree`."""
+    client = get_async_client()
+    response = await client.get(client.url("/tasks/tree", base_url))
+    return parse_response(response, check=True)
+
+
+async def create_task_schedule(
+    task_schedule_data: Dict[str, str], base_url: Optional[str] = None
+) -> Dict[str, Any]:
+    """Coroutine version of `tasks.create_task_schedule`."""
+    client = get_async_client()
+    response = await client.post(
+        client.url("/task_schedules", base_url), json=task_schedule_data
+    )
+    return parse_response(response)
+
+
+async def update_task_schedule(
+    schedule_id: int, update_data: Dict[str, str], base_url: Optional[str] = None
+) -> Dict[str, Any]:
+    """Coroutine version of `tasks.update_task_schedule`."""
+    client = get_async_client()
+    response = await client.put(
+        client.url(f"/task_schedules/{schedule_id}", base_url), json=update_data
+    )
+    return parse_response(response)
+
+
+async def delete_task_schedule(
+    schedule_id: int, base_url: Optional[str] = None
+) -> Dict[str, Any]:
+    """Coroutine version of `tasks.delete_task_schedule`."""
+    client = get_async_client()
+    response = await client.delete(
+        client.url(f"/task_schedules/{schedule_id}", base_url)
+    )
+    return parse_response(response)
+
+
+async def create_task_clock(
+    task_id: int, clock_in: str, clock_out: str, base_url: Optional[str] = None
+) -> Dict[str, Any]:
+    """Coroutine version of `tasks.create_task_clock`."""
+    client = get_async_client()
+    data = {"task_id": task_id, "clock_in": clock_in, "clock_out": clock_out}
+    response = await client.post(client.url("/task_clocks", base_url), json=data)
+    return parse_response(response, check=True)
+
+
+async def update_task_clock(
+    task_clock_id: int, update_data: Dict[str, str], base_url: Optional[str] = None
+) -> Dict[str, Any]:
+    """Coroutine version of `tasks.update_task_clock`."""
+    client = get_async_client()
+    response = await client.put(
+        client.url(f"/task_clocks/{task_clock_id}", base_url), json=update_data
+    )
+    return parse_response(response)
+
+
+async def delete_task_clock(
+    task_clock_id: int, base_url: Optional[str] = None
+) -> Dict[str, Any]:
+    """Coroutine version of `tasks.delete_task_clock`."""
+    client = get_async_client()
+    response = await client.delete(
+        client.url(f"/task_clocks/{task_clock_id}", base_url)
+    )
+    return parse_response(response)
+
+
+async def get_task_clocks(
+    task_id: int, base_url: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    """Coroutine version of `tasks.get_task_clocks`."""
+    for task in await get_tasks_details(base_url):
+        if task["id"] == task_id:
+            return task.get("clocks", [])
+    return []
+
+
+async def update_task_hierarchy(
+    child_id: int, hierarchy_data: Dict[str, Any], base_url: Optional[str] = None
+) -> Dict[str, Any]:
+    """Coroutine version of `tasks.update_task_hierarchy`."""
+    client = get_async_client()
+    response = await client.put(
+        client.url(f"/tasks/{child_id}/hierarchy", base_url), json=hierarchy_data
+    )
+    return parse_response(response, check=True)
@@ -0,0 +1,289 @@
+import io
+import json
+import os
+import socket
+import socketserver
+import subprocess
+import sys
+import threading
+import traceback
+from contextlib import redirect_stderr, redirect_stdout
+from pathlib import Path
+from typing import Dict, Any, List, Optional
+
+# This module is the console entry point, so it only imports the standard
+# library until it knows the command has to run in this process.
+
+PROG_NAME = "draftsmith-api-client"
+# Sent with every command, and set in the daemon while it runs
+FORWARDED_ENV = (
+    "DRAFTSMITH_TRACE_FILE",
+    "DRAFTSMITH_CACHE_TTL",
+    "DRAFTSMITH_JSON_CODEC",
+)
+# Read once when the daemon starts, so a command asking for other values
+# runs directly instead
+STARTUP_ENV = ("DRAFTSMITH_CACHE_TTL", "DRAFTSMITH_JSON_CODEC")
+# Commands that run for long or stream their output, which the daemon would
+# only send back once they finish
+DIRECT_COMMANDS = (["daemon"], ["export"], ["notes", "import"])
+
+
+def socket_path() -> Path:
+    """
+    Return the Unix socket the daemon listens on.
+
+    The location is `$DRAFTSMITH_SOCKET` when set, otherwise daemon.sock in
+    the cache directory.
+    """
+    if path := os.environ.get("DRAFTSMITH_SOCKET"):
+        return Path(path)
+    from utils import cache_dir
+
+    return cache_dir() / "daemon.sock"
+
+
+def _send(path: Path, request: Dict[str, Any]) -> Dict[str, Any]:
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.connect(str(path))
+        client.sendall(json.dumps(request).encode() + b"\n")
+        with client.makefile("rb") as reader:
+            return json.loads(reader.readline())
+
+
+def forward(argv: List[str], path: Optional[Path] = None) -> Optional[Dict[str, Any]]:
+    """
+    Run a command in the daemon, if one is listening.
+
+    Args:
+        argv (List[str]): The command line arguments, without the program name.
+        path (Optional[Path]): The daemon socket (default: `socket_path()`).
+
+    Returns:
+        Optional[Dict[str, Any]]: The command's 'stdout', 'stderr' and 'exit_code',
+        or None if no daemon is running, it stopped before answering or it
+        was started with other settings.
+    """
+    path = path or socket_path()
+    if not path.exists():
+        return None
+    env = {name: os.environ.get(name) for name in FORWARDED_ENV}
+    try:
+        result = _send(path, {"argv": argv, "cwd": os.getcwd(), "env": env})
+    except (ConnectionError, FileNotFoundError, ValueError):
+        # Not listening, or stopped before answering
+        return None
+    return None if result.get("refused") else result
+
+
+def forward_command(
+    command: str, path: Optional[Path] = None
+) -> Optional[Dict[str, Any]]:
+    """
+    Send a control command ('ping' or 'stop') to the daemon.
+
+    Returns:
+        Optional[Dict[str, Any]]: The daemon's response, or None if it is not running.
+    """
+    path = path or socket_path()
+    if not path.exists():
+        return None
+    try:
+        return _send(path, {"command": command})
+    except (ConnectionRefusedError, FileNotFoundError):
+        return None
+
+
+def execute(
+    argv: List[str],
+    cwd: Optional[str] = None,
+    env: Optional[Dict[str, Optional[str]]] = None,
+) -> Dict[str, Any]:
+    """
+    Run a CLI command in this process and capture its output.
+
+    Args:
+        argv (List[str]): The command line arguments, without the program name.
+        cwd (Optional[str]): The directory to run the command in.
+        env (Optional[Dict[str, Optional[str]]]): Environment variables to set while it runs, None to unset one.
+
+    Returns:
+        Dict[str, Any]: The command's 'stdout', 'stderr' and 'exit_code'.
+    """
+    from main import app
+    from output import set_defaults
+
+    stdout, stderr = io.StringIO(), io.StringIO()
+    exit_code = 0
+    previous_cwd = os.getcwd()
+    previous_env = {name: os.environ.get(name) for name in env or {}}
+    # Not left over from the last command, should this one fail before setting them
+    set_defaults()
+    try:
+        _set_env(env or {})
+        if cwd:
+            os.chdir(cwd)
+        with redirect_stdout(stdout), redirect_stderr(stderr):
+            try:
+                app(args=argv, prog_name=PROG_NAME)
+            except SystemExit as e:
+                if isinstance(e.code, int):
+                    exit_code = e.code
+                else:
+                    exit_code = 0 if e.code is None else 1
+            except Exception:
+                traceback.print_exc()
+                exit_code = 1
+    finally:
+        os.chdir(previous_cwd)
+        _set_env(previous_env)
+    return {
+        "stdout": stdout.getvalue(),
+        "stderr": stderr.getvalue(),
+        "exit_code": exit_code,
+    }
+
+
+def _set_env(env: Dict[str, Optional[str]]) -> None:
+    for name, value in env.items():
+        if value is None:
+            os.environ.pop(name, None)
+        else:
+            os.environ[name] = value
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self) -> None:
+        request = json.loads(self.rfile.readline())
+        if request.get("command") == "stop":
+            response = {"stdout": "Daemon stopped.\n", "stderr": "", "exit_code": 0}
+            threading.Thread(target=self.server.shutdown).start()
+        elif request.get("command") == "ping":
+            response = {
+                "stdout": f"Daemon running, pid {os.getpid()}.\n",
+                "stderr": "",
+                "exit_code": 0,
+            }
+        elif _other_settings(request.get("env") or {}):
+            response = {"refused": "started with other settings"}
+        else:
+            _reset_per_command_state()
+            response = execute(request["argv"], request.get("cwd"), request.get("env"))
+        self.wfile.write(json.dumps(response).encode() + b"\n")
+
+
+def _other_settings(env: Dict[str, Optional[str]]) -> bool:
+    # Whether a command asks for settings the daemon read when it started
+    return any(
+        name in env and env[name] != os.environ.get(name) for name in STARTUP_ENV
+    )
+
+
+def _reset_per_command_state() -> None:
+    # Notes change on the server without the daemon hearing about it, so drop
+    # cached note bodies between commands. Connections and the tag index
+    # (which has its own TTL) stay warm.
+    if notes := sys.modules.get("notes"):
+        notes.clear_note_cache(forget_endpoints=False)
+
+
+def serve(path: Optional[Path] = None) -> None:
+    """
+    Run the daemon in the foreground until it is stopped.
+
+    Commands are run one at a time because each one redirects the process's
+    stdout and stderr while it runs.
+
+    Args:
+        path (Optional[Path]): The socket to listen on (default: `socket_path()`).
+    """
+    path = path or socket_path()
+    if path.exists():
+        if forward_command("ping", path) is not None:
+            raise RuntimeError(f"A daemon is already listening on {path}.")
+        path.unlink()
+    # Warm the imports every command needs before accepting connections
+    import main  # noqa: F401
+    import api_client
+    import tracing
+
+    api_client.get_client()
+    # Commands start in a warm process, their startup is not worth tracing
+    tracing.skip_startup()
+    previous_umask = os.umask(0o077)
+    try:
+        server = socketserver.UnixStreamServer(str(path), _Handler)
+    finally:
+        os.umask(previous_umask)
+    with server:
+        try:
+            server.serve_forever()
+        finally:
+            path.unlink(missing_ok=True)
+
+
+def start_background(path: Optional[Path] = None) -> int:
+    """
+    Start the daemon in a detached process.
+
+    Returns:
+        int: The process ID of the daemon.
+    """
+    path = path or socket_path()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "cli_daemon", str(path)],
+        cwd=Path(__file__).parent,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        start_new_session=True,
+    )
+    return process.pid
+
+
+def runs_directly(argv: List[str]) -> bool:
+    """
+    Whether a command must run in its own process rather than the daemon.
+
+    That is when `DRAFTSMITH_NO_DAEMON` is set, for the `daemon` commands,
+    commands reading from stdin (an argument of '-'), imports, exports,
+    `--watch` and any `--format` but the table, whose output should stream.
+    """
+    if os.environ.get("DRAFTSMITH_NO_DAEMON") or "-" in argv or "--watch" in argv:
+        return True
+    if any(argv[: len(command)] == command for command in DIRECT_COMMANDS):
+        return True
+    for i, arg in enumerate(argv):
+        if arg == "--format" and argv[i + 1 : i + 2] != ["table"]:
+            return True
+        if arg.startswith("--format=") and arg != "--format=table":
+            return True
+    return False
+
+
+def run() -> None:
+    """
+    Console entry point: run the command in the daemon, or directly if none is running.
+
+    Commands the daemon cannot run well run directly, see `runs_directly`,
+    as do commands the daemon stopped on before answering.
+    """
+    argv = sys.argv[1:]
+    if not runs_directly(argv) and (result := forward(argv)) is not None:
+        try:
+            sys.stdout.write(result["stdout"])
+            sys.stdout.flush()
+        except BrokenPipeError:
+            # Closed early, as by `| head`; quiet the flush at exit
+            os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+            sys.exit(1)
+        sys.stderr.write(result["stderr"])
+        sys.exit(result["exit_code"])
+
+    from main import app
+
+    app(prog_name=PROG_NAME)
+
+
+if __name__ == "__main__":
+    serve(Path(sys.argv[1]) if len(sys.argv) > 1 else None)
@@ -0,0 +1,40 @@
+import json
+import os
+from typing import Any, Union
+
+# orjson is optional (`pip install draftsmith-api_client[fast]`), the
+# standard library is used when it is missing or $DRAFTSMITH_JSON_CODEC=json
+try:
+    if os.environ.get("DRAFTSMITH_JSON_CODEC", "orjson") != "orjson":
+        raise ImportError
+    import orjson
+except ImportError:
+    orjson = None
+
+NAME = "orjson" if orjson else "json"
+
+
+def dumps(obj: Any) -> bytes:
+    """
+    Encode an object as compact UTF-8 JSON.
+
+    Example:
+        >>> dumps({"title": "Foo", "id": 1})
+        b'{"title":"Foo","id":1}'
+    """
+    if orjson:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode()
+
+
+def loads(data: Union[bytes, str]) -> Any:
+    """
+    Decode a JSON document.
+
+    Example:
+        >>> loads(b'[{"id": 1}]')
+        [{"id": 1}]
+    """
+    if orjson:
+        return orjson.loads(data)
+    return json.loads(data)
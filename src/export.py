@@ -0,0 +1,337 @@
+import json
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+from utils import parse_datetime
+
+# Rows per part file, so no table is ever held in memory whole
+DEFAULT_BATCH_SIZE = 10_000
+FORMATS = {"parquet": "parquet", "ipc": "arrow"}
+STATE_FILE = "_export.json"
+# Tables appended to on `append`, by the column they are compared on. The
+# others are small and rewritten on every export.
+INCREMENTAL = {"notes": "modified_at", "tasks": "modified_at"}
+
+
+def _schemas() -> Dict[str, Dict[str, Any]]:
+    # Fixed, so every part file of a table has the same columns and types.
+    # Timestamps are kept as the server's strings.
+    import polars as pl
+
+    return {
+        "notes": {
+            "id": pl.Int64,
+            "title": pl.String,
+            "content": pl.String,
+            "created_at": pl.String,
+            "modified_at": pl.String,
+        },
+        "tags": {"id": pl.Int64, "name": pl.String},
+        "note_tags": {"note_id": pl.Int64, "tag_id": pl.Int64},
+        "tag_hierarchy": {"parent_id": pl.Int64, "child_id": pl.Int64},
+        "note_hierarchy": {
+            "parent_id": pl.Int64,
+            "child_id": pl.Int64,
+            "type": pl.String,
+        },
+        "tasks": {
+            "id": pl.Int64,
+            "note_id": pl.Int64,
+            "status": pl.String,
+            "effort_estimate": pl.Float64,
+            "actual_effort": pl.Float64,
+            "deadline": pl.String,
+            "priority": pl.Int64,
+            "all_day": pl.Boolean,
+            "goal_relationship": pl.Int64,
+            "created_at": pl.String,
+            "modified_at": pl.String,
+        },
+        "schedules": {
+            "id": pl.Int64,
+            "task_id": pl.Int64,
+            "start_datetime": pl.String,
+            "end_datetime": pl.String,
+        },
+        "clocks": {
+            "id": pl.Int64,
+            "task_id": pl.Int64,
+            "clock_in": pl.String,
+            "clock_out": pl.String,
+        },
+    }
+
+
+TABLES = (
+    "notes",
+    "tags",
+    "note_tags",
+    "tag_hierarchy",
+    "note_hierarchy",
+    "tasks",
+    "schedules",
+    "clocks",
+)
+
+
+# Sources
+
+
+def _tree_edges(
+    tree: List[Dict[str, Any]], extra: Callable[[Dict[str, Any]], Dict[str, Any]]
+) -> Iterator[Dict[str, Any]]:
+    stack = [(node, None) for node in tree]
+    while stack:
+        node, parent = stack.pop()
+        if parent is not None:
+            yield {"parent_id": parent, "child_id": node["id"], **extra(node)}
+        stack.extend((child, node["id"]) for child in node.get("children") or [])
+
+
+class _Source:
+    """Where the exported records come from, the server or the local mirror."""
+
+    def __init__(self, base_url: Optional[str] = None, offline: bool = False):
+        self.base_url = base_url
+        self.store = None
+        if offline:
+            from store import open_store
+
+            self.store = open_store()
+
+    def notes(self) -> Iterator[Dict[str, Any]]:
+        if self.store:
+            return self.store.iter_notes()
+        from notes import iter_notes
+
+        return iter_notes(self.base_url)
+
+    def tags_with_notes(self) -> List[Dict[str, Any]]:
+        if self.store:
+            return self.store.get_tags_with_notes()
+        from tags import get_tags_with_notes
+
+        return get_tags_with_notes(self.base_url)
+
+    def tags_tree(self) -> List[Dict[str, Any]]:
+        if self.store:
+            return self.store.list_tags_with_notes()
+        from tags import list_tags_with_notes
+
+        return list_tags_with_notes(self.base_url)
+
+    def notes_tree(self) -> Optional[List[Dict[str, Any]]]:
+        # The mirror has no copy of the notes tree
+        if self.store:
+            return None
+        from notes import get_notes_tree
+
+        return get_notes_tree(self.base_url)
+
+    def tasks(self) -> Iterable[Dict[str, Any]]:
+        if self.store:
+            return self.store.get_tasks_details()
+        from tasks import iter_tasks_details
+
+        return iter_tasks_details(self.base_url)
+
+
+# Writing
+
+
+class _TableWriter:
+    """Buffers the rows of one table and writes them out a part file at a time."""
+
+    def __init__(
+        self, directory: Path, table: str, fmt: str, run: str, batch_size: int
+    ):
+        self.directory = directory / table
+        self.table = table
+        self.fmt = fmt
+        self.run = run
+        self.batch_size = batch_size
+        self.schema = _schemas()[table]
+        self.parts: List[Path] = []
+        self.rows = 0
+        self._buffer: List[Dict[str, Any]] = []
+
+    def add(self, record: Dict[str, Any]) -> None:
+        self._buffer.append(record)
+        if len(self._buffer) >= self.batch_size:
+            self.flush()
+
+    def write(self, records: Iterable[Dict[str, Any]]) -> None:
+        for record in records:
+            self.add(record)
+        self.flush()
+
+    def flush(self) -> None:
+        import polars as pl
+
+        if not self._buffer:
+            return
+        self.directory.mkdir(parents=True, exist_ok=True)
+        frame = pl.DataFrame(self._buffer, schema=self.schema, strict=False)
+        path = self.directory / f"part-{self.run}-{len(self.parts):05d}"
+        path = path.with_suffix(f".{FORMATS[self.fmt]}")
+        temporary = path.with_suffix(".tmp")
+        if self.fmt == "parquet":
+            frame.write_parquet(temporary)
+        else:
+            frame.write_ipc(temporary)
+        # Readers globbing the directory never see a half written part
+        temporary.replace(path)
+        self.parts.append(path)
+        self.rows += len(self._buffer)
+        self._buffer = []
+
+    def replace_previous(self) -> None:
+        """Delete the parts of earlier exports, keeping this one's."""
+        if self.directory.exists():
+            for path in self.directory.glob("part-*"):
+                if path not in self.parts:
+                    path.unlink()
+
+    def discard(self) -> None:
+        """Delete this export's parts, leaving the earlier ones as they were."""
+        for path in self.parts:
+            path.unlink(missing_ok=True)
+
+
+def export(
+    directory: Path,
+    fmt: str = "parquet",
+    append: bool = False,
+    base_url: Optional[str] = None,
+    offline: bool = False,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> Dict[str, int]:
+    """
+    Export the knowledge base as one directory of columnar part files per table.
+
+    The tables are notes, tags, note_tags, tag_hierarchy, note_hierarchy,
+    tasks, schedules and clocks. Notes and tasks are streamed from the server
+    and written `batch_size` rows at a time, so no table is ever built as one
+    frame. Each table is read back with, e.g. `pl.scan_parquet("out/notes/*.parquet")`.
+
+    With `append`, notes and tasks whose `modified_at` is older than the
+    newest one in the previous export are skipped, as are those at that
+    moment it already wrote, and the rest are added as new part files. A changed row then appears once per export it changed in; keep
+    the one with the latest `modified_at`. Deleted notes and tasks stay in
+    the earlier parts. The other tables are small and always rewritten.
+
+    Args:
+        directory (Path): Where to write, created if needed.
+        fmt (str): "parquet", or "ipc" for Arrow IPC files.
+        append (bool): Only add the notes and tasks changed since the previous export.
+        base_url (Optional[str]): The base URL of the API (default: the shared client's base URL).
+        offline (bool): Export the local mirror instead of asking the server, see `LocalStore`.
+        batch_size (int): Rows per part file.
+
+    Returns:
+        Dict[str, int]: The number of rows written to each table.
+
+    Raises:
+        ValueError: If the format is unknown, or differs from the export being appended to.
+
+    Example:
+        >>> export(Path("out"), "parquet", append=True)
+        {"notes": 12, "tags": 40, "note_tags": 2210, ..., "clocks": 9031}
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown format '{fmt}', expected parquet or ipc.")
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    state_path = directory / STATE_FILE
+    state = json.loads(state_path.read_text()) if state_path.exists() else {}
+    if append and state.get("format", fmt) != fmt:
+        raise ValueError(
+            f"The export in {directory} is {state['format']}, it cannot be appended as {fmt}."
+        )
+    watermarks = state.get("watermarks", {}) if append else {}
+    watermark_ids = state.get("watermark_ids", {}) if append else {}
+
+    source = _Source(base_url, offline)
+    # Part names sort by export, and no two exports share one
+    run = datetime.now().strftime("%Y%m%dT%H%M%S%f")
+    writers = {
+        table: _TableWriter(directory, table, fmt, run, batch_size) for table in TABLES
+    }
+
+    def changed(table: str, records: Iterable[Dict[str, Any]]) -> Iterator[Dict]:
+        # Track the newest value seen, and skip what the last export had.
+        # Compared as times, as the same moment may be written with another
+        # offset or precision. Records can arrive at the watermark after an
+        # export, so the ids written at it are kept to tell them apart.
+        column = INCREMENTAL[table]
+        since = watermarks.get(table)
+        since_at = parse_datetime(since) if since else None
+        seen = set(watermark_ids.get(table) or [])
+        newest, newest_at, newest_ids = since, since_at, set(seen)
+        for record in records:
+            value = record.get(column)
+            moment = parse_datetime(value) if value else None
+            if moment is not None and (newest_at is None or moment > newest_at):
+                newest, newest_at, newest_ids = value, moment, set()
+            if moment is not None and moment == newest_at:
+                newest_ids.add(record["id"])
+            if (
+                since_at is None
+                or moment is None
+                or moment > since_at
+                or (moment == since_at and record["id"] not in seen)
+            ):
+                yield record
+        state.setdefault("watermarks", {})[table] = newest
+        state.setdefault("watermark_ids", {})[table] = sorted(newest_ids)
+
+    def split_tasks(tasks: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        # Schedules and clocks are written as the tasks stream past, whether
+        # or not the task itself changed
+        for task in tasks:
+            for schedule in task.get("schedules") or []:
+                writers["schedules"].add({**schedule, "task_id": task["id"]})
+            for clock in task.get("clocks") or []:
+                writers["clocks"].add({**clock, "task_id": task["id"]})
+            yield task
+
+    try:
+        writers["notes"].write(changed("notes", source.notes()))
+
+        tags_with_notes = source.tags_with_notes()
+        writers["tags"].write(
+            {
+                "id": tag.get("tag_id", tag.get("id")),
+                "name": tag.get("tag_name", tag.get("name")),
+            }
+            for tag in tags_with_notes
+        )
+        writers["note_tags"].write(
+            {"note_id": note["id"], "tag_id": tag.get("tag_id", tag.get("id"))}
+            for tag in tags_with_notes
+            for note in tag.get("notes") or []
+        )
+        writers["tag_hierarchy"].write(_tree_edges(source.tags_tree(), lambda _: {}))
+        notes_tree = source.notes_tree()
+        if notes_tree is not None:
+            writers["note_hierarchy"].write(
+                _tree_edges(notes_tree, lambda node: {"type": node.get("type")})
+            )
+
+        writers["tasks"].write(changed("tasks", split_tasks(source.tasks())))
+        writers["schedules"].flush()
+        writers["clocks"].flush()
+    except BaseException:
+        for writer in writers.values():
+            writer.discard()
+        raise
+
+    for table, writer in writers.items():
+        if table in INCREMENTAL and append:
+            continue
+        if table == "note_hierarchy" and notes_tree is None:
+            continue
+        writer.replace_previous()
+    state["format"] = fmt
+    state_path.write_text(json.dumps(state, indent=2))
+    return {table: writer.rows for table, writer in writers.items()}
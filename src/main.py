@@ -1,54 +1,20 @@
 #!/usr/bin/env python3
 import typer
 import json
-import polars as pl
-import requests
 from typing import List
-from datetime import datetime
-from notes import (
-    create_note,
-    update_note,
-    delete_note,
-    get_notes,
-    get_notes_no_content,
-    search_notes,
-    create_note_hierarchy,
-    update_note_hierarchy,
-    delete_note_hierarchy,
-    get_notes_tree,
-)
-from tasks import (
-    create_task,
-    update_task,
-    delete_task,
-    get_tasks_details,
-    get_tasks_tree,
-    create_task_schedule,
-    update_task_schedule,
-    delete_task_schedule,
-    create_task_clock,
-    update_task_clock,
-    delete_task_clock,
-    get_task_clocks,
-    update_task_hierarchy,
-)
-from tags import (
-    create_tag,
-    assign_tag_to_note,
-    update_tag,
-    delete_tag,
-    get_tags_with_notes,
-    get_tag_names,
-    create_tag_hierarchy,
-    update_tag_hierarchy,
-    delete_tag_hierarchy_entry,
-    list_tags_with_notes,
-)
+from datetime import datetime, timedelta
+from typer.core import TyperGroup
+
+
+class _App(TyperGroup):
+    """Keeps the command line in `ctx.meta["argv"]`, e.g. for the command `--trace` shows."""
 
-app = typer.Typer()
+    def parse_args(self, ctx, args):
+        ctx.meta["argv"] = list(args)
+        return super().parse_args(ctx, args)
 
 
-app = typer.Typer()
+app = typer.Typer(cls=_App)
 
 # Define nested typers for notes, tags, and task
 notes_app = typer.Typer()
@@ -60,49 +26,324 @@ task_tree_app = typer.Typer()
 task_schedule_app = typer.Typer()
 task_clock_app = typer.Typer()
 
+daemon_app = typer.Typer()
+
 # Register sub-commands with the main typer
 app.add_typer(notes_app, name="notes")
 app.add_typer(tags_app, name="tags")
 app.add_typer(task_app, name="task")
+app.add_typer(daemon_app, name="daemon")
 
 
 def df_print(data):
-    df = pl.DataFrame(data)
-    print(df)
+    import polars as pl
+    from tracing import phase
+
+    with phase("polars"):
+        df = pl.DataFrame(data)
+        print(df)
+
+
+def df_from_records(records, batch_size: int = 1000):
+    """Build a DataFrame from an iterator of records, a batch at a time."""
+    import polars as pl
+    from itertools import islice
+    from tracing import phase
+
+    records = iter(records)
+    frames = []
+    while batch := list(islice(records, batch_size)):
+        with phase("polars"):
+            frames.append(pl.DataFrame(batch))
+    if not frames:
+        return pl.DataFrame()
+    with phase("polars"):
+        return pl.concat(frames, how="diagonal_relaxed")
 
 
 DF_PRINT = True
+OFFLINE_OPTION = typer.Option(
+    False, "--offline", "--cached", help="Read from the local mirror, see `sync`."
+)
+FORMAT_OPTION = typer.Option(
+    None, "--format", help="table, ndjson, tsv or json (default: the global --format)."
+)
+FIELDS_OPTION = typer.Option(
+    None, "--fields", help="Comma separated fields to write, in order."
+)
+
+
+@app.callback()
+def main(
+    ctx: typer.Context,
+    format: str = typer.Option(
+        "table", "--format", help="How list commands write: table, ndjson, tsv or json."
+    ),
+    fields: str = typer.Option(
+        None, "--fields", help="Comma separated fields list commands write, in order."
+    ),
+    trace: bool = typer.Option(
+        False,
+        "--trace",
+        help="Print each request's timings and where the command's time went. "
+        "Set $DRAFTSMITH_TRACE_FILE to also append them to a JSONL file.",
+    ),
+):
+    from output import set_defaults
+    from tracing import finish_trace, start_trace
+
+    try:
+        set_defaults(format, fields)
+    except ValueError as e:
+        raise typer.BadParameter(str(e), param_hint="--format")
+    if start_trace(" ".join(ctx.meta["argv"]), trace):
+        ctx.call_on_close(finish_trace)
+
+
+def open_mirror():
+    """Open the local mirror for an --offline command, exiting with an error if it was never synced."""
+    from store import open_store
+
+    try:
+        return open_store()
+    except FileNotFoundError as e:
+        typer.echo(f"Error: {e}", err=True)
+        raise typer.Exit(1)
+
+
+def print_records(records, format=None, fields=None, table=None):
+    """
+    Write the records of a list command in its --format, see `output.write_records`.
+
+    The table format prints a DataFrame, unless the command passes its own
+    `table` and no --fields were chosen.
+    """
+    from output import resolve, write_records
+
+    try:
+        _, selected = resolve(format, fields)
+    except ValueError as e:
+        typer.echo(f"Error: {e}", err=True)
+        raise typer.Exit(1)
+    if table is None or selected is not None:
+
+        def table(records):
+            df_print(df_from_records(records))
+
+    write_records(records, table, format, fields)
+
+
+@app.command("sync")
+def sync(full: bool = False):
+    """
+    Mirror notes, tags, tasks, schedules and clocks into the local store.
+    """
+    from store import LocalStore
+
+    stats = LocalStore().sync(full=full)
+    typer.echo(
+        f"Synced {stats['notes_fetched']} changed notes "
+        f"({stats['notes_deleted']} deleted), {stats['tags']} tags "
+        f"and {stats['tasks']} tasks."
+    )
+
+
+@app.command("export")
+def export_cli(
+    directory: str = typer.Argument(
+        ..., help="Where to write, one directory per table."
+    ),
+    format: str = typer.Option("parquet", "--format", "-f", help="parquet or ipc."),
+    append: bool = typer.Option(
+        False, help="Only add the notes and tasks changed since the last export."
+    ),
+    batch_size: int = typer.Option(10_000, help="Rows per part file."),
+    offline: bool = OFFLINE_OPTION,
+):
+    """
+    Export notes, tags, tasks, schedules and clocks as Parquet or Arrow IPC tables.
+    """
+    from pathlib import Path
+    from export import export
+
+    try:
+        rows = export(
+            Path(directory), format, append, offline=offline, batch_size=batch_size
+        )
+    except (ValueError, FileNotFoundError) as e:
+        typer.echo(f"Error: {e}", err=True)
+        raise typer.Exit(1)
+    for table, count in rows.items():
+        typer.echo(f"{table}: {count} rows")
+
+
+@app.command("sync-dir")
+def sync_dir_cli(
+    directory: str = typer.Argument(..., help="The directory of Markdown files."),
+    watch: bool = typer.Option(
+        False, "--watch", help="Keep syncing as files change, until interrupted."
+    ),
+    interval: float = typer.Option(
+        1.0, help="With --watch, seconds between looks at the directory."
+    ),
+    remote_interval: float = typer.Option(
+        30.0, help="With --watch, seconds between looks at the server."
+    ),
+):
+    """
+    Sync the notes with a directory of Markdown files, both ways.
+
+    Only edited files are sent and only changed notes downloaded, one
+    request per note.
+    """
+    from pathlib import Path
+    from sync_dir import DirectorySync
+
+    def report(stats):
+        counts = {key: value for key, value in stats.items() if key != "errors"}
+        if any(counts.values()) or not watch:
+            typer.echo(
+                ", ".join(f"{v} {k.replace('_', ' ')}" for k, v in counts.items())
+            )
+        for error in stats["errors"]:
+            typer.echo(f"Error: {error}", err=True)
+
+    try:
+        sync = DirectorySync(Path(directory))
+        if watch:
+            sync.watch(interval, remote_interval, report)
+        else:
+            stats = sync.sync()
+            report(stats)
+            if stats["errors"]:
+                raise typer.Exit(1)
+    except ValueError as e:
+        typer.echo(f"Error: {e}", err=True)
+        raise typer.Exit(1)
+    except KeyboardInterrupt:
+        pass
+
+
+# Daemon Commands
+@daemon_app.command("start")
+def daemon_start(background: bool = typer.Option(False, "--background", "-b")):
+    """
+    Keep the client, its connections and caches warm for later commands.
+
+    Commands find the daemon through its Unix socket and run in it, falling
+    back to running directly when it is not running.
+    """
+    from cli_daemon import serve, start_background, socket_path
+
+    if background:
+        pid = start_background()
+        typer.echo(f"Daemon started with pid {pid}, listening on {socket_path()}")
+    else:
+        typer.echo(f"Daemon listening on {socket_path()}")
+        serve()
+
+
+@daemon_app.command("stop")
+def daemon_stop():
+    from cli_daemon import forward_command
+
+    result = forward_command("stop")
+    typer.echo(result["stdout"].strip() if result else "Daemon is not running.")
+
+
+@daemon_app.command("status")
+def daemon_status():
+    from cli_daemon import forward_command
+
+    result = forward_command("ping")
+    typer.echo(result["stdout"].strip() if result else "Daemon is not running.")
 
 
 # Notes Commands
 @notes_app.command("search")
-def search(query: str, df: bool = DF_PRINT):
-    results = search_notes(query)
-    if df:
-        df_print(results)
+def search(
+    query: str,
+    df: bool = DF_PRINT,
+    offline: bool = OFFLINE_OPTION,
+    local: bool = typer.Option(
+        False, help="Rank the local mirror with BM25 instead of asking the server."
+    ),
+    limit: int = typer.Option(
+        10, "--limit", "-k", help="Results to show with --local."
+    ),
+    format: str = FORMAT_OPTION,
+    fields: str = FIELDS_OPTION,
+):
+    if local:
+        from search_index import open_search_index, snippet
+
+        store = open_mirror()
+        index = open_search_index(store)
+        ranked = index.search(query, limit)
+        terms = index.matched_terms(query)
+        notes = {
+            note["id"]: note for note in store.get_notes_by_id([i for i, _ in ranked])
+        }
+        results = [
+            {
+                "id": note_id,
+                "title": notes[note_id]["title"],
+                "score": round(score, 3),
+                "snippet": snippet(notes[note_id]["content"], terms),
+            }
+            for note_id, score in ranked
+        ]
+    elif offline:
+        results = open_mirror().search_notes(query)
     else:
-        for i in results:
-            print(f"{i['id']}\t{i['title']}")
+        from notes import search_notes
+
+        results = search_notes(query)
+
+    def table(results):
+        if df:
+            df_print(list(results))
+        else:
+            for i in results:
+                print(f"{i['id']}\t{i['title']}")
+
+    print_records(results, format, fields, table)
 
 
 @notes_app.command("list")
-def list_notes():
-    list_notes = get_notes()
-    df_print(list_notes)
+def list_notes(
+    offline: bool = OFFLINE_OPTION,
+    jsonl: bool = typer.Option(False, help="Same as --format ndjson."),
+    format: str = FORMAT_OPTION,
+    fields: str = FIELDS_OPTION,
+):
+    if offline:
+        list_notes = open_mirror().iter_notes()
+    else:
+        from notes import iter_notes
+
+        list_notes = iter_notes()
+    print_records(list_notes, "ndjson" if jsonl else format, fields)
 
 
 @notes_app.command("get")
-def get(id: int, df: bool = False):
-    list_notes = get_notes()
-    list_notes = [i for i in list_notes if i["id"] == id]
+def get(id: int, df: bool = False, offline: bool = OFFLINE_OPTION):
+    if offline:
+        note = open_mirror().get_note(id)
+    else:
+        from notes import get_note
+
+        note = get_note(id)
     if df:
-        df_print(list_notes)
+        df_print([note])
     else:
-        print(list_notes[0]["content"])
+        print(note["content"])
 
 
 @notes_app.command("update")
 def update(id: int, title: str | None, content: str | None):
+    from notes import update_note
+
     if title and content:
         update_note(id, {"title": title, "content": content})
     elif title:
@@ -114,8 +355,11 @@ def update(id: int, title: str | None, content: str | None):
 
 @notes_app.command("create")
 def create(title: str, content: str):
+    from api_client import get_client
+    from notes import create_note
+
     new_note = create_note(
-        "http://localhost:37238", {"title": title, "content": content}
+        get_client().url("/notes"), {"title": title, "content": content}
     )
     typer.echo(f"Note created successfully with ID: {new_note['id']}")
     get(new_note["id"], df=True)
@@ -123,6 +367,8 @@ def create(title: str, content: str):
 
 @notes_app.command("delete")
 def delete(id: int):
+    from notes import delete_note
+
     result = delete_note(id)
     if result.get("success"):
         typer.echo(f"Note with ID {id} has been successfully deleted.")
@@ -132,12 +378,63 @@ def delete(id: int):
         )
 
 
+@notes_app.command("import")
+def import_cli(
+    source: str = typer.Argument(
+        ..., help="A directory of Markdown files, a JSONL file, or '-' for stdin."
+    ),
+    workers: int = typer.Option(8, "--workers", "-w", help="Concurrent requests."),
+    checkpoint: str = typer.Option(
+        None, help="Checkpoint file (default: one per source in the cache directory)."
+    ),
+    restart: bool = typer.Option(False, help="Ignore any previous checkpoint."),
+):
+    """
+    Import notes concurrently, resuming from the checkpoint of an earlier run.
+    """
+    from pathlib import Path
+    from bulk import (
+        ImportCheckpoint,
+        default_checkpoint_path,
+        import_notes,
+        iter_records,
+    )
+
+    if checkpoint is None and source != "-":
+        checkpoint = default_checkpoint_path(source)
+    if checkpoint and restart:
+        Path(checkpoint).unlink(missing_ok=True)
+    log = ImportCheckpoint(Path(checkpoint)) if checkpoint else None
+    if log and log.ids:
+        typer.echo(f"Resuming, {len(log.ids)} notes already imported.", err=True)
+
+    def progress(stats):
+        typer.echo(f"\r{stats}", nl=False, err=True)
+
+    try:
+        stats = import_notes(
+            iter_records(source), workers=workers, checkpoint=log, progress=progress
+        )
+    finally:
+        if log:
+            log.close()
+    typer.echo(err=True)
+    for key, error in stats.errors[:20]:
+        typer.echo(f"Failed {key}: {error}", err=True)
+    if len(stats.errors) > 20:
+        typer.echo(f"... and {len(stats.errors) - 20} more errors.", err=True)
+    if stats.failed:
+        raise typer.Exit(1)
+
+
 # Notes Tree Commands
 notes_app.add_typer(notes_tree_app, name="tree")
 
 
 @notes_tree_app.command("list")
 def tree_list():
+    from notes import get_notes_tree
+
     notes_tree = get_notes_tree()
     if notes_tree:
 
@@ -155,6 +452,8 @@ def tree_list():
 
 @notes_tree_app.command("add_parent")
 def add_parent(child_id: int, parent_id: int):
+    from notes import create_note_hierarchy
+
     result = create_note_hierarchy({"parent_id": parent_id, "child_id": child_id})
     if result.get("success"):
         typer.echo(f"Successfully added note {parent_id} as parent of note {child_id}.")
@@ -166,6 +465,8 @@ def add_parent(child_id: int, parent_id: int):
 
 @notes_tree_app.command("remove_child")
 def remove_child(child_id: int):
+    from notes import delete_note_hierarchy
+
     result = delete_note_hierarchy(child_id)
     if result.get("success"):
         typer.echo(f"Successfully removed note {child_id} from its parent.")
@@ -177,28 +478,42 @@ def remove_child(child_id: int):
 
 # Tags Commands
 @tags_app.command("list")
-def list_tags(df: bool = DF_PRINT):
-    tags = list_tags_with_notes()
-    if df:
-        df = pl.DataFrame(tags).select(["id", "name", "notes"])
-        df_print(df)
+def list_tags(
+    df: bool = DF_PRINT,
+    offline: bool = OFFLINE_OPTION,
+    format: str = FORMAT_OPTION,
+    fields: str = FIELDS_OPTION,
+):
+    import polars as pl
+
+    if offline:
+        tags = open_mirror().list_tags_with_notes()
     else:
-        print(json.dumps(tags, indent=2))
+        from tags import list_tags_with_notes
+
+        tags = list_tags_with_notes()
+
+    def table(tags):
+        tags = list(tags)
+        if not df:
+            print(json.dumps(tags, indent=2))
+        elif tags:
+            df_print(pl.DataFrame(tags).select(["id", "name", "notes"]))
+
+    print_records(tags, format, fields, table)
 
 
 @tags_app.command("assign")
 def assign_tag(note_id: int, tag_name: str):
     # First, we need to create the tag if it doesn't exist
-    tags = get_tag_names()
-    if tag_name not in tags:
+    from tags import get_tag_index, assign_tag_to_note, create_tag
+
+    tag_index = get_tag_index()
+    tag_id = tag_index.resolve(tag_name)
+    if tag_id is None:
         create_tag(tag_name)
         typer.echo(f"Created new tag: {tag_name}")
-
-    # Now, we need to get the tag_id
-    tags_with_notes = get_tags_with_notes()
-    tag_id = next(
-        (tag["tag_id"] for tag in tags_with_notes if tag["tag_name"] == tag_name), None
-    )
+        tag_id = tag_index.resolve(tag_name)
 
     if tag_id is None:
         typer.echo(f"Error: Unable to find or create tag {tag_name}")
@@ -213,20 +528,53 @@ def assign_tag(note_id: int, tag_name: str):
     #     typer.echo(f"Failed to assign tag. Error: {result.get('error', 'Unknown error')}")
 
 
-@tags_app.command("rename")
-def rename(old_name: str, new_name: str):
-    tags = get_tag_names()
-    if old_name not in tags:
-        typer.echo(f"Error: Tag '{old_name}' does not exist.")
-        return
+@tags_app.command("assign-bulk")
+def assign_tags_bulk_cli(
+    note_ids: List[str] = typer.Argument(
+        None, help="Note IDs, or '-' to read whitespace separated IDs from stdin."
+    ),
+    tag_names: List[str] = typer.Option(..., "--tag", "-t", help="Tags to assign."),
+    query: str = typer.Option(None, "--query", "-q", help="Tag every matching note."),
+    workers: int = typer.Option(8, "--workers", "-w", help="Concurrent requests."),
+):
+    """
+    Assign one or more tags to many notes at once.
+    """
+    import sys
+    from bulk import assign_tags_bulk
 
-    tags_with_notes = get_tags_with_notes()
-    tag_id = next(
-        (tag["id"] for tag in tags_with_notes if tag["name"] == old_name), None
+    ids = []
+    for note_id in note_ids or []:
+        if note_id == "-":
+            ids.extend(int(token) for token in sys.stdin.read().split())
+        else:
+            ids.append(int(note_id))
+    if query:
+        from notes import search_notes
+
+        ids.extend(note["id"] for note in search_notes(query))
+    if not ids:
+        typer.echo("Error: No notes given, pass IDs, '-' or --query.", err=True)
+        raise typer.Exit(1)
+
+    result = assign_tags_bulk(ids, tag_names, workers=workers)
+    typer.echo(
+        f"Assigned {result['assigned']} tags, skipped {result['skipped']}"
+        f" already assigned, {result['failed']} failed."
     )
+    for note_id, tag_name, error in result["errors"][:20]:
+        typer.echo(f"Failed to tag note {note_id} with '{tag_name}': {error}", err=True)
+    if result["failed"]:
+        raise typer.Exit(1)
+
+
+@tags_app.command("rename")
+def rename(old_name: str, new_name: str):
+    from tags import update_tag, get_tag_index
 
+    tag_id = get_tag_index().resolve(old_name)
     if tag_id is None:
-        typer.echo(f"Error: Unable to find tag '{old_name}'")
+        typer.echo(f"Error: Tag '{old_name}' does not exist.")
         return
 
     result = update_tag(tag_id, new_name)
@@ -240,18 +588,11 @@ def rename(old_name: str, new_name: str):
 
 @tags_app.command("delete")
 def tag_cli_delete(tag_name: str):
-    tags = get_tag_names()
-    if tag_name not in tags:
-        typer.echo(f"Error: Tag '{tag_name}' does not exist.")
-        return
-
-    tags_with_notes = get_tags_with_notes()
-    tag_id = next(
-        (tag["id"] for tag in tags_with_notes if tag["name"] == tag_name), None
-    )
+    from tags import delete_tag, get_tag_index
 
+    tag_id = get_tag_index().resolve(tag_name)
     if tag_id is None:
-        typer.echo(f"Error: Unable to find tag '{tag_name}'")
+        typer.echo(f"Error: Tag '{tag_name}' does not exist.")
         return
 
     result = delete_tag(tag_id)
@@ -270,6 +611,8 @@ tags_app.add_typer(tags_tree_app, name="tree")
 
 @tags_tree_app.command("list")
 def tree_list():
+    from tags import list_tags_with_notes
+
     tags_tree = list_tags_with_notes()
     if tags_tree:
 
@@ -287,21 +630,13 @@ def tree_list():
 
 @tags_tree_app.command("add_parent")
 def add_parent(child_tag: str, parent_tag: str):
-    tags = get_tag_names()
-    if child_tag not in tags or parent_tag not in tags:
-        typer.echo(f"Error: One or both tags do not exist.")
-        return
-
-    tags_with_notes = get_tags_with_notes()
-    child_id = next(
-        (tag["id"] for tag in tags_with_notes if tag["name"] == child_tag), None
-    )
-    parent_id = next(
-        (tag["id"] for tag in tags_with_notes if tag["name"] == parent_tag), None
-    )
+    from tags import get_tag_index, create_tag_hierarchy
 
+    tag_index = get_tag_index()
+    child_id = tag_index.resolve(child_tag)
+    parent_id = tag_index.resolve(parent_tag)
     if child_id is None or parent_id is None:
-        typer.echo(f"Error: Unable to find one or both tags.")
+        typer.echo(f"Error: One or both tags do not exist.")
         return
 
     result = create_tag_hierarchy(parent_id, child_id)
@@ -317,18 +652,11 @@ def add_parent(child_tag: str, parent_tag: str):
 
 @tags_tree_app.command("remove_child")
 def remove_child(child_tag: str):
-    tags = get_tag_names()
-    if child_tag not in tags:
-        typer.echo(f"Error: Tag '{child_tag}' does not exist.")
-        return
-
-    tags_with_notes = get_tags_with_notes()
-    child_id = next(
-        (tag["id"] for tag in tags_with_notes if tag["name"] == child_tag), None
-    )
+    from tags import delete_tag_hierarchy_entry, get_tag_index
 
+    child_id = get_tag_index().resolve(child_tag)
     if child_id is None:
-        typer.echo(f"Error: Unable to find tag '{child_tag}'")
+        typer.echo(f"Error: Tag '{child_tag}' does not exist.")
         return
 
     result = delete_tag_hierarchy_entry(child_id)
@@ -341,56 +669,136 @@ def remove_child(child_tag: str):
 
 
 @tags_app.command("filter")
-def filter(tag_name: str):
-    tags_with_notes = get_tags_with_notes()
-    filtered_tag = next(
-        (tag for tag in tags_with_notes if tag["name"] == tag_name), None
-    )
+def filter(
+    tag_name: str,
+    offline: bool = OFFLINE_OPTION,
+    exact: bool = typer.Option(False, help="Leave out the tags below this one."),
+):
+    if offline:
+        from tags import TagClosure
+
+        closure = TagClosure(open_mirror().list_tags_with_notes())
+    else:
+        from tags import get_tag_closure
 
-    if filtered_tag is None:
+        closure = get_tag_closure()
+
+    if not closure.ids(tag_name):
         typer.echo(f"Error: Tag '{tag_name}' not found.")
         return
 
     typer.echo(f"Notes tagged with '{tag_name}':")
-    for note in filtered_tag.get("notes", []):
+    for note in closure.notes(tag_name, exact):
         typer.echo(f"- {note['title']} (ID: {note['id']})")
 
 
+def load_tag_bitmaps(offline: bool = False):
+    """Build the tag bitmaps for `tags query` and `tags search`, descendant aware."""
+    from tag_query import TagBitmaps
+    from tags import TagClosure
+
+    if offline:
+        store = open_mirror()
+        tags_with_notes = store.get_tags_with_notes()
+        closure = TagClosure(store.list_tags_with_notes())
+    else:
+        from tags import get_tag_closure, get_tags_with_notes
+        from utils import run_concurrently
+
+        tags_with_notes, closure = run_concurrently(
+            get_tags_with_notes, get_tag_closure
+        )
+    return TagBitmaps(tags_with_notes, closure)
+
+
+def warn_unknown_tags(bitmaps, query) -> None:
+    from tag_query import query_tags
+
+    for name in sorted(query_tags(query)):
+        if not bitmaps.known(name):
+            typer.echo(f"Warning: Tag '{name}' not found.", err=True)
+
+
+@tags_app.command("query")
+def query_tags_cli(
+    expression: str = typer.Argument(..., help="E.g. '(urgent | important) & !done'."),
+    exact: bool = typer.Option(False, help="Leave out the tags below each tag."),
+    offline: bool = OFFLINE_OPTION,
+    format: str = FORMAT_OPTION,
+    fields: str = FIELDS_OPTION,
+):
+    """
+    List the notes matching a tag expression of &, |, ! and parentheses.
+    """
+    from tag_query import TagQueryError, parse_tag_query
+
+    try:
+        query = parse_tag_query(expression)
+    except TagQueryError as e:
+        typer.echo(f"Error: {e}", err=True)
+        raise typer.Exit(1)
+    bitmaps = load_tag_bitmaps(offline)
+    warn_unknown_tags(bitmaps, query)
+    notes = (
+        {"id": note_id, "title": bitmaps.titles.get(note_id, "")}
+        for note_id in bitmaps.select(query, exact=exact)
+    )
+
+    def table(notes):
+        for note in notes:
+            typer.echo(f"{note['id']}\t{note['title']}")
+
+    print_records(notes, format, fields, table)
+
+
 @tags_app.command("search")
-def search(query: str, tags: List[str] = typer.Option([], "--tag", "-t")):
-    # First, perform the normal search
-    search_results = search_notes(query)
+def search(
+    query: str,
+    tags: List[str] = typer.Option([], "--tag", "-t"),
+    where: str = typer.Option(
+        None, "--where", "-w", help="A tag expression, see `tags query`."
+    ),
+    exact: bool = typer.Option(False, help="Leave out the tags below each tag."),
+):
+    from notes import search_notes
+    from tag_query import TagBitmaps, TagQueryError, parse_tag_query
+    from tags import get_tag_closure, get_tags_with_notes
+    from utils import run_concurrently
 
-    if not tags:
+    if not tags and not where:
         # If no tags are specified, return all search results
-        df_print(search_results)
+        df_print(search_notes(query))
         return
 
-    # Get all tags with their associated notes
-    tags_with_notes = get_tags_with_notes()
-
-    # Create a set of note IDs that have all the specified tags
-    tagged_note_ids = set()
-    for tag_name in tags:
-        tag = next((t for t in tags_with_notes if t["name"] == tag_name), None)
-        if tag is None:
-            typer.echo(f"Warning: Tag '{tag_name}' not found.")
-            continue
-        if not tagged_note_ids:
-            tagged_note_ids = set(note["id"] for note in tag["notes"])
-        else:
-            tagged_note_ids &= set(note["id"] for note in tag["notes"])
+    # Every --tag and the --where expression must all match
+    operands = [("tag", tag_name) for tag_name in tags]
+    try:
+        if where:
+            operands.append(parse_tag_query(where))
+    except TagQueryError as e:
+        typer.echo(f"Error: {e}", err=True)
+        raise typer.Exit(1)
+    tag_query = operands[0] if len(operands) == 1 else ("and", operands)
+
+    # The search and the tags with their notes don't depend on each other
+    search_results, tags_with_notes, closure = run_concurrently(
+        lambda: search_notes(query), get_tags_with_notes, get_tag_closure
+    )
+    bitmaps = TagBitmaps(tags_with_notes, closure)
+    warn_unknown_tags(bitmaps, tag_query)
 
-    # Filter the search results to only include notes with all specified tags
-    filtered_results = [
-        note for note in search_results if note["id"] in tagged_note_ids
-    ]
+    # Filter the search results to only include notes matching the tags
+    matching = set(
+        bitmaps.select(tag_query, [note["id"] for note in search_results], exact)
+    )
+    filtered_results = [note for note in search_results if note["id"] in matching]
 
+    description = " & ".join([*tags, *([f"({where})"] if where else [])])
     if filtered_results:
-        typer.echo(f"Search results for query '{query}' with tags {', '.join(tags)}:")
+        typer.echo(f"Search results for query '{query}' with tags {description}:")
         df_print(filtered_results)
     else:
-        typer.echo(f"No results found for query '{query}' with tags {', '.join(tags)}.")
+        typer.echo(f"No results found for query '{query}' with tags {description}.")
 
 
 # Task Commands
@@ -402,6 +810,8 @@ def create_task_cli(
     priority: int = typer.Option(3, "--priority", "-p", min=1, max=5),
     goal_relationship: int = typer.Option(3, "--goal-relationship", "-g", min=1, max=5),
 ):
+    from tasks import create_task
+
     task_data = {
         "note_id": 3,
         "status": "todo",
@@ -420,14 +830,17 @@ def create_task_cli(
         typer.echo(f"Failed to create task. Error: {e}")
 
 
-def get_task_id(note_id: int) -> int:
+def get_task_id(note_id: int, tasks: List[dict] | None = None) -> int:
     """
-    Get a task id given a note id.
+    Get a task id given a note id, searching `tasks` when already fetched.
     """
-    tasks = get_tasks_details()
-    tasks = [task for task in tasks if task["note_id"] == id]
+    if tasks is None:
+        from tasks import get_tasks_details
+
+        tasks = get_tasks_details()
+    tasks = [task for task in tasks if task["note_id"] == note_id]
     if not tasks:
-        raise ValueError(f"No tasks found for note ID {id}.")
+        raise ValueError(f"No tasks found for note ID {note_id}.")
     # There should only be one task per note ID
     # So take the first task's ID
     task_id = tasks[0]["id"]
@@ -441,6 +854,8 @@ def task_delete_cli(id: int, use_note_id: bool = False):
 
     The `use_note_id` flag can be used to delete the task by note ID instead of task ID.
     """
+    from tasks import delete_task
+
     if use_note_id:
         id = get_task_id(id)
     response = delete_task(id)
@@ -449,6 +864,8 @@ def task_delete_cli(id: int, use_note_id: bool = False):
 
 @task_app.command("rename")
 def rename(task_id: int, new_title: str):
+    from tasks import update_task
+
     update_data = {"title": new_title}
     updated_task = update_task(task_id, update_data)
     if updated_task:
@@ -466,6 +883,8 @@ def update(
     due_date: str | None = None,
     priority: int | None = None,
 ):
+    from tasks import update_task
+
     update_data = {}
     if title is not None:
         update_data["title"] = title
@@ -490,6 +909,8 @@ def update(
 
 @task_app.command("schedule")
 def schedule(task_id: int, schedule_type: str, schedule_value: str):
+    from tasks import create_task_schedule
+
     schedule_data = {
         "task_id": task_id,
         "schedule_type": schedule_type,
@@ -505,16 +926,11 @@ def schedule(task_id: int, schedule_type: str, schedule_value: str):
 
 @task_clock_app.command("in")
 def clock_in(task_id: int):
-    current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    clock_data = {"task_id": task_id, "clock_in": current_time, "clock_out": None}
-    new_clock = create_task_clock(
-        task_id, clock_data["clock_in"], clock_data["clock_out"]
-    )
-    if new_clock:
-        typer.echo(f"Clocked in for task ID {task_id} at {current_time}")
-        df_print([new_clock])
-    else:
-        typer.echo(f"Failed to clock in for task ID {task_id}")
+    from task_clocks import clock_in as open_clock
+
+    new_clock = open_clock(task_id)
+    typer.echo(f"Clocked in for task ID {task_id} at {new_clock['clock_in']}")
+    df_print([new_clock])
 
 
 @task_clock_app.command("delete")
@@ -523,26 +939,36 @@ def delete_clock(task_id: int):
 
 
 @task_clock_app.command("list")
-def task_clock_list(id: int | None = None, use_note_id: bool = False):
-    tasks = get_tasks_details()
+def task_clock_list(
+    id: int | None = None,
+    use_note_id: bool = False,
+    offline: bool = OFFLINE_OPTION,
+    format: str = FORMAT_OPTION,
+    fields: str = FIELDS_OPTION,
+):
+    import polars as pl
+
+    if offline:
+        tasks = open_mirror().get_tasks_details()
+    else:
+        from tasks import get_tasks_details
+
+        tasks = get_tasks_details()
     if id:
-        task_id = get_task_id(id) if use_note_id else id
+        task_id = get_task_id(id, tasks) if use_note_id else id
         tasks = [i for i in tasks if i["id"] == task_id]
-    subset = [
-        {"task_id": s["id"], "clocks": s.get("clocks", [])} for s in tasks
-    ]
-    new_subset = []
-    for d in subset:
-        if clocks := d.get("clocks"):
-            for s in clocks:
-                s.update({"task_id": d["task_id"]})
-                new_subset.append(s)
-    # # print(json.dumps(new_subset, indent=2))
-    df = pl.DataFrame(new_subset)
-    cols = ["id", "task_id", "clock_in", "clock_out"]
-    df = df.select(cols)
-    print(df)
-    # print(json.dumps(new_subset, indent=2))
+    clocks = (
+        {**clock, "task_id": task["id"]}
+        for task in tasks
+        for clock in task.get("clocks") or []
+    )
+
+    def table(clocks):
+        df = pl.DataFrame(list(clocks))
+        cols = ["id", "task_id", "clock_in", "clock_out"]
+        print(df.select(cols) if len(df) else df)
+
+    print_records(clocks, format, fields, table)
 
 
 @task_clock_app.command("create")
@@ -559,6 +985,8 @@ def cli_task_clock_create(
     end_hour: int,
     end_minute: int,
 ):
+    from tasks import create_task_clock
+
     start = make_iso_datetimestamp(
         start_year, start_month, start_day, start_hour, start_minute
     )
@@ -569,30 +997,132 @@ def cli_task_clock_create(
 
 @task_clock_app.command("out")
 def clock_out(task_id: int):
-    current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    from task_clocks import clock_out as close_clock
+    from utils import parse_datetime
 
-    # Get the latest clock entry for the task
-    task_clocks = get_task_clocks(task_id)
-    if not task_clocks:
-        typer.echo(f"No active clock found for task ID {task_id}")
-        return
-
-    latest_clock = task_clocks[-1]
-    if latest_clock["clock_out"]:
+    closed_clock = close_clock(task_id)
+    if closed_clock is None:
         typer.echo(f"Task ID {task_id} is not currently clocked in")
         return
 
-    # Update the clock entry with the clock-out time
-    updated_clock = update_task_clock(latest_clock["id"], {"clock_out": current_time})
-    if updated_clock:
-        duration = datetime.strptime(
-            current_time, "%Y-%m-%d %H:%M:%S"
-        ) - datetime.strptime(latest_clock["clock_in"], "%Y-%m-%d %H:%M:%S")
-        typer.echo(f"Clocked out for task ID {task_id} at {current_time}")
-        typer.echo(f"Duration: {duration}")
-        df_print([updated_clock])
+    duration = parse_datetime(closed_clock["clock_out"]) - parse_datetime(
+        closed_clock["clock_in"]
+    )
+    typer.echo(f"Clocked out for task ID {task_id} at {closed_clock['clock_out']}")
+    typer.echo(f"Duration: {duration}")
+    df_print([closed_clock])
+
+
+@task_clock_app.command("report")
+def clock_report_cli(
+    by: List[str] = typer.Option(
+        ["task"], "--by", "-b", help="task, note, tag, day, week or month, repeatable."
+    ),
+    since: datetime = typer.Option(None, formats=["%Y-%m-%d"], help="First day."),
+    until: datetime = typer.Option(
+        None, formats=["%Y-%m-%d"], help="Day after the last."
+    ),
+    output: str = typer.Option(
+        None, "--output", "-o", help="Write a .csv or .parquet file instead."
+    ),
+    offline: bool = OFFLINE_OPTION,
+):
+    """
+    Total the time clocked over a date range, grouped by task, note, tag or period.
+    """
+    import polars as pl
+    from task_clocks import clock_report, clocks_frame, note_tags_frame
+
+    if offline:
+        store = open_mirror()
+        tasks = store.get_tasks_details()
+        get_tags = store.get_tags_with_notes
     else:
-        typer.echo(f"Failed to clock out for task ID {task_id}")
+        from tags import get_tags_with_notes as get_tags
+        from tasks import get_tasks_details
+
+        tasks = get_tasks_details()
+    note_tags = note_tags_frame(get_tags()) if "tag" in by else None
+    try:
+        report = clock_report(clocks_frame(tasks), by, since, until, note_tags)
+    except ValueError as e:
+        typer.echo(f"Error: {e}", err=True)
+        raise typer.Exit(1)
+
+    if output is None:
+        with pl.Config(tbl_rows=-1):
+            print(report)
+    elif output.endswith(".parquet"):
+        report.write_parquet(output)
+    elif output.endswith(".csv"):
+        report.write_csv(output)
+    else:
+        typer.echo("Error: --output must end in .csv or .parquet", err=True)
+        raise typer.Exit(1)
+
+
+@task_clock_app.command("status")
+def clock_status(
+    refresh: bool = typer.Option(
+        False, help="Rebuild the open clocks from the server first."
+    ),
+):
+    """
+    Show the tasks currently clocked in, from the local open-clock state.
+    """
+    from task_clocks import OpenClocks
+    from utils import parse_datetime
+
+    state = OpenClocks()
+    clocks = state.reconcile() if refresh else state.clocks
+    if not clocks:
+        typer.echo("No tasks are clocked in.")
+        return
+    now = datetime.now()
+    for task_id, clock in sorted(clocks.items()):
+        elapsed = now - parse_datetime(clock["clock_in"])
+        elapsed -= timedelta(microseconds=elapsed.microseconds)
+        typer.echo(
+            f"Task ID {task_id}: clocked in at {clock['clock_in']} ({elapsed} ago)"
+        )
+
+
+@task_clock_app.command("audit")
+def clock_audit(
+    max_open_hours: float = typer.Option(
+        12.0, "--max-open-hours", "-m", help="Hours after which an open clock is stale."
+    ),
+    fix: bool = typer.Option(False, "--fix", help="Correct the clocks on the server."),
+    workers: int = typer.Option(8, "--workers", "-w", help="Concurrent requests."),
+):
+    """
+    Find overlapping, inverted and stale clocks, and optionally correct them.
+    """
+    import polars as pl
+    from tasks import get_tasks_details
+    from task_clocks import OpenClocks, audit_clocks, clocks_frame, fix_clocks
+
+    issues = audit_clocks(clocks_frame(get_tasks_details()), max_open_hours)
+    if issues.is_empty():
+        typer.echo("No problems found.")
+        return
+    with pl.Config(tbl_rows=-1, tbl_cols=-1):
+        print(issues)
+    if not fix:
+        typer.echo(f"{len(issues)} clocks need correcting, rerun with --fix.")
+        return
+
+    result = fix_clocks(issues.to_dicts(), workers=workers)
+    # Stale clocks were closed, so the open clocks need rebuilding
+    OpenClocks().reconcile()
+    typer.echo(
+        f"Updated {result['updated']} clocks, deleted {result['deleted']},"
+        f" {result['failed']} failed."
+    )
+    for clock_id, error in result["errors"][:20]:
+        typer.echo(f"Failed to correct clock {clock_id}: {error}", err=True)
+    if result["failed"]:
+        raise typer.Exit(1)
 
 
 # Task Tree Commands
@@ -601,6 +1131,8 @@ task_app.add_typer(task_tree_app, name="tree")
 
 @task_tree_app.command("list")
 def tree_list():
+    from tasks import get_tasks_tree
+
     tasks_tree = get_tasks_tree()
     if tasks_tree:
 
@@ -617,26 +1149,40 @@ def tree_list():
 
 
 @task_app.command("list")
-def cli_task_list():
-    tasks = get_tasks_details()
-    if tasks:
-        typer.echo("Task List:")
-        for task in tasks:
-            status = task.get("status", "Unknown")
-            priority = task.get("priority", "N/A")
-            goal_relationship = task.get("goal_relationship", "N/A")
-            deadline = task.get("deadline", "Not set")
-            typer.echo(f"Task ID: {task['id']}")
-            typer.echo(f"Note ID: {task['note_id']}")
-            typer.echo(f"Title: {task.get('title', 'Untitled')}")
-            typer.echo(f"Status: {status}")
-            typer.echo(f"Priority: {priority}")
-            typer.echo(f"Goal Relationship: {goal_relationship}")
-            typer.echo(f"Deadline: {deadline}")
-            typer.echo(f"Description: {task.get('description', 'No description')}")
-            typer.echo("---")
+def cli_task_list(
+    offline: bool = OFFLINE_OPTION,
+    format: str = FORMAT_OPTION,
+    fields: str = FIELDS_OPTION,
+):
+    if offline:
+        tasks = open_mirror().get_tasks_details()
     else:
-        typer.echo("No tasks found or unable to retrieve task details.")
+        from tasks import iter_tasks_details
+
+        tasks = iter_tasks_details()
+
+    def table(tasks):
+        found = False
+        for task in tasks:
+            if not found:
+                typer.echo("Task List:")
+                found = True
+            # One write per task rather than one per line
+            typer.echo(
+                f"Task ID: {task['id']}\n"
+                f"Note ID: {task['note_id']}\n"
+                f"Title: {task.get('title', 'Untitled')}\n"
+                f"Status: {task.get('status', 'Unknown')}\n"
+                f"Priority: {task.get('priority', 'N/A')}\n"
+                f"Goal Relationship: {task.get('goal_relationship', 'N/A')}\n"
+                f"Deadline: {task.get('deadline', 'Not set')}\n"
+                f"Description: {task.get('description', 'No description')}\n"
+                "---"
+            )
+        if not found:
+            typer.echo("No tasks found or unable to retrieve task details.")
+
+    print_records(tasks, format, fields, table)
 
 
 @task_tree_app.command("add_parent")
@@ -647,6 +1193,8 @@ def add_parent(
     """
     Add a parent task to an existing task.
     """
+    from tasks import update_task_hierarchy
+
     try:
         response = update_task_hierarchy(child_id, {"parent_id": parent_id})
         if response.get("success"):
@@ -670,6 +1218,8 @@ def remove_child(
     """
     Remove a child task from its parent in the task hierarchy.
     """
+    from tasks import update_task_hierarchy
+
     try:
         response = update_task_hierarchy(child_id, {"parent_id": None})
         if response.get("success"):
@@ -688,7 +1238,7 @@ task_app.add_typer(task_clock_app, name="clocks")
 
 
 def make_iso_datetimestamp(year: int, month: int, day: int, hour: int, minute: int):
-    return f"{year}-{month}-{day}T{hour}:{minute}:00Z"
+    return f"{year:04d}-{month:02d}-{day:02d}T{hour:02d}:{minute:02d}:00Z"
 
 
 @task_schedule_app.command("create")
@@ -704,11 +1254,30 @@ def cli_schedule_create(
     end_day: int,
     end_hour: int,
     end_minute: int,
+    check: bool = typer.Option(
+        False, "--check", help="Refuse to create it if it overlaps another schedule"
+    ),
 ):
+    from tasks import create_task_schedule
+
     start = make_iso_datetimestamp(
         start_year, start_month, start_day, start_hour, start_minute
     )
     end = make_iso_datetimestamp(end_year, end_month, end_day, end_hour, end_minute)
+    if check:
+        from tasks import get_tasks_details
+        from task_schedules import ScheduleIndex, schedule_intervals
+        from utils import parse_datetime
+
+        index = ScheduleIndex(schedule_intervals(get_tasks_details()))
+        overlapping = index.overlapping(parse_datetime(start), parse_datetime(end))
+        if overlapping:
+            typer.echo("Error: The schedule overlaps:", err=True)
+            for s in overlapping:
+                typer.echo(
+                    f"  {s.id} (task {s.task_id}): {s.start} to {s.end}", err=True
+                )
+            raise typer.Exit(1)
     json_data = {"task_id": task_id, "start_datetime": start, "end_datetime": end}
     response = create_task_schedule(json_data)
     print(response)
@@ -717,6 +1286,8 @@ def cli_schedule_create(
 
 @task_schedule_app.command("update")
 def cli_task_schedule_update(schedule_id: int, start_datetime: str, end_datetime: str):
+    from tasks import update_task_schedule
+
     response = update_task_schedule(
         schedule_id, {"start_datetime": start_datetime, "end_datetime": end_datetime}
     )
@@ -725,30 +1296,94 @@ def cli_task_schedule_update(schedule_id: int, start_datetime: str, end_datetime
 
 @task_schedule_app.command("delete")
 def cli_task_schedule_delete(schedule_id: int):
+    from tasks import delete_task_schedule
+
     response = delete_task_schedule(schedule_id)
     typer.echo(response)
 
 
 @task_schedule_app.command("list")
-def schedule_list(id: int | None = None, use_note_id: bool = False):
-    schedule_list = get_tasks_details()
+def schedule_list(
+    id: int | None = None,
+    use_note_id: bool = False,
+    format: str = FORMAT_OPTION,
+    fields: str = FIELDS_OPTION,
+):
+    import polars as pl
+    from tasks import get_tasks_details
+
+    tasks = get_tasks_details()
     if id:
-        task_id = get_task_id(id) if use_note_id else id
-        schedule_list = [i for i in schedule_list if i["id"] == task_id]
-    subset = [
-        {"task_id": s["id"], "schedules": s.get("schedules", [])} for s in schedule_list
+        task_id = get_task_id(id, tasks) if use_note_id else id
+        tasks = [i for i in tasks if i["id"] == task_id]
+    schedules = (
+        {**schedule, "task_id": task["id"]}
+        for task in tasks
+        for schedule in task.get("schedules") or []
+    )
+
+    def table(schedules):
+        df = pl.DataFrame(list(schedules))
+        cols = ["id", "task_id", "start_datetime", "end_datetime"]
+        print(df.select(cols) if len(df) else df)
+
+    print_records(schedules, format, fields, table)
+
+
+@task_schedule_app.command("conflicts")
+def schedule_conflicts(
+    since: datetime = typer.Option(None, formats=["%Y-%m-%d"], help="First day."),
+    until: datetime = typer.Option(
+        None, formats=["%Y-%m-%d"], help="Day after the last."
+    ),
+):
+    """
+    List overlapping schedules, one numbered window per set of overlaps.
+    """
+    import polars as pl
+    from tasks import get_tasks_details
+    from task_schedules import find_conflicts, schedule_intervals
+
+    schedules = [
+        s
+        for s in schedule_intervals(get_tasks_details())
+        if (since is None or s.end > since) and (until is None or s.start < until)
+    ]
+    rows = [
+        {"window": window, **s._asdict()}
+        for window, conflict in enumerate(find_conflicts(schedules), start=1)
+        for s in conflict
     ]
-    new_subset = []
-    for d in subset:
-        if schedules := d.get("schedules"):
-            for s in d["schedules"]:
-                s.update({"task_id": d["task_id"]})
-                new_subset.append(s)
-    # print(json.dumps(new_subset, indent=2))
-    df = pl.DataFrame(new_subset)
-    cols = ["id", "task_id", "start_datetime", "end_datetime"]
-    df = df.select(cols)
-    print(df)
+    if not rows:
+        typer.echo("No conflicting schedules.")
+        return
+    with pl.Config(tbl_rows=-1):
+        print(pl.DataFrame(rows))
+
+
+@task_schedule_app.command("agenda")
+def schedule_agenda(
+    start: datetime = typer.Option(
+        None, formats=["%Y-%m-%d"], help="First day (default: today)."
+    ),
+    days: int = typer.Option(7, "--days", "-d", help="Number of days to show"),
+):
+    """
+    Show the schedules of the coming days, marking those that overlap another.
+    """
+    import polars as pl
+    from tasks import get_tasks_details
+    from task_schedules import agenda, schedule_intervals
+
+    start = start or datetime.combine(datetime.now().date(), datetime.min.time())
+    rows = agenda(
+        schedule_intervals(get_tasks_details()), start, start + timedelta(days=days)
+    )
+    if not rows:
+        typer.echo("Nothing scheduled.")
+        return
+    with pl.Config(tbl_rows=-1):
+        print(pl.DataFrame(rows))
 
 
 if __name__ == "__main__":
@@ -1,7 +1,20 @@
-import requests
-from typing import Dict, Any, List
+import time
+from api_client import get_client, parse_response
+from typing import Dict, Any, Generator, Iterator, List, Optional, Tuple
 from urllib.parse import quote
 
+# Seconds a note fetched by `get_note` is served from the cache
+NOTE_CACHE_TTL = 60.0
+# Without GET /notes/{id}, the least seconds between downloads of every note
+NOTE_INDEX_INTERVAL = 10.0
+
+# Notes fetched by ID and when, keyed by base URL and then note ID
+_note_cache: Dict[str, Dict[int, Tuple[Dict[str, Any], float]]] = {}
+# When each base URL's note cache was last filled with every note from get_notes
+_indexed_at: Dict[str, float] = {}
+# Base URLs whose server has no GET /notes/{id} endpoint
+_no_note_endpoint: set = set()
+
 
 # POST
 def create_note(url: str, note_data: Dict[str, str]) -> Dict[str, Any]:
@@ -24,16 +37,15 @@ def create_note(url: str, note_data: Dict[str, str]) -> Dict[str, Any]:
 
         {"id":4,"message":"Note created successfully"}
     """
-    headers = {"Content-Type": "application/json"}
-    response = requests.post(url, json=note_data, headers=headers)
-    return response.json()
+    response = get_client().post(url, json=note_data)
+    return parse_response(response)
 
 
 # PUT
 
 
 def update_note(
-    note_id: int, update_data: Dict[str, str], base_url: str = "http://localhost:37238"
+    note_id: int, update_data: Dict[str, str], base_url: Optional[str] = None
 ) -> Dict[str, Any]:
     """
     Update the details of a note by sending a PUT request.
@@ -41,7 +53,7 @@ def update_note(
     Args:
         note_id (int): The ID of the note to update.
         update_data (Dict[str, str]): A dictionary containing the data to update, e.g., {'title': 'New Title'}.
-        base_url (str): The base URL of the API (default: "http://localhost:37238").
+        base_url (Optional[str]): The base URL of the API (default: the shared client's base URL).
 
     Returns:
         Dict[str, Any]: The response from the server as a JSON object.
@@ -51,24 +63,22 @@ def update_note(
                 1, {"title": "New Title"})
         {"id": 1, "message": "Note updated successfully"}
     """
-    url = f"{base_url}/notes/{note_id}"
-    headers = {"Content-Type": "application/json"}
-    response = requests.put(url, json=update_data, headers=headers)
-    return response.json()
+    url = get_client().url(f"/notes/{note_id}", base_url)
+    response = get_client().put(url, json=update_data)
+    forget_note(note_id, base_url)
+    return parse_response(response)
 
 
 # DELETE
 
 
-def delete_note(
-    note_id: int, base_url: str = "http://localhost:37238"
-) -> Dict[str, str]:
+def delete_note(note_id: int, base_url: Optional[str] = None) -> Dict[str, str]:
     """
     Delete a note by sending a DELETE request.
 
     Args:
         note_id (int): The ID of the note to delete.
-        base_url (str): The base URL of the API (default: "http://localhost:37238").
+        base_url (Optional[str]): The base URL of the API (default: the shared client's base URL).
 
     Returns:
         Dict[str, str]: The response from the server as a JSON object indicating the result of the deletion.
@@ -78,18 +88,19 @@ def delete_note(
                 6)
         {"message": "Note deleted successfully"}
     """
-    url = f"{base_url}/notes/{note_id}"
-    response = requests.delete(url)
-    return response.json()
+    url = get_client().url(f"/notes/{note_id}", base_url)
+    response = get_client().delete(url)
+    forget_note(note_id, base_url)
+    return parse_response(response)
 
 
 # GET
-def get_notes(base_url: str = "http://localhost:37238") -> List[Dict[str, Any]]:
+def get_notes(base_url: Optional[str] = None) -> List[Dict[str, Any]]:
     """
     Retrieve a list of notes from the API.
 
     Args:
-        base_url (str): The base URL of the API (default: "http://localhost:37238").
+        base_url (Optional[str]): The base URL of the API (default: the shared client's base URL).
 
     Returns:
         List[Dict[str, Any]]: A list of notes, each represented as a dictionary.
@@ -114,20 +125,175 @@ def get_notes(base_url: str = "http://localhost:37238") -> List[Dict[str, Any]]:
           ...
         ]
     """
-    url = f"{base_url}/notes"
-    response = requests.get(url)
-    response.raise_for_status()  # Raise an error for bad responses
-    return response.json()
+    url = get_client().url("/notes", base_url)
+    return get_client().get_json(url, check=True)
+
+
+def iter_notes(base_url: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Stream the notes from the API, yielding one at a time.
+
+    Unlike `get_notes`, the response is decoded as it arrives, so memory use
+    does not grow with the number of notes. The response cache is bypassed.
+
+    Args:
+        base_url (Optional[str]): The base URL of the API (default: the shared client's base URL).
+
+    Yields:
+        Dict[str, Any]: The same records `get_notes` returns.
+
+    Example:
+        >>> for note in iter_notes():
+        ...     print(note["id"], note["title"])
+        1 First note
+        2 Foo
+    """
+    url = get_client().url("/notes", base_url)
+    return get_client().iter_json(url)
+
+
+def get_note(
+    note_id: int, base_url: Optional[str] = None, refresh: bool = False
+) -> Dict[str, Any]:
+    """
+    Retrieve a single note by its ID.
+
+    Notes are cached for `NOTE_CACHE_TTL` seconds after they are fetched.
+    When the server has no GET /notes/{id} endpoint, every note is fetched
+    with `get_notes` and indexed by ID, so later lookups are answered from
+    the local index. The index is downloaded again for a missing or expired
+    note, but at most once every `NOTE_INDEX_INTERVAL` seconds.
+
+    Args:
+        note_id (int): The ID of the note to retrieve.
+        base_url (Optional[str]): The base URL of the API (default: the shared client's base URL).
+        refresh (bool): Ignore any cached copy of the note.
+
+    Returns:
+        Dict[str, Any]: The note as a dictionary.
+
+    Raises:
+        ValueError: If no note exists with the given ID.
+
+    Example:
+        >>> get_note(1)
+        {
+          "id": 1,
+          "title": "First note",
+          "content": "This is the first note in the system.",
+          "created_at": "2024-10-20T05:04:42.709064Z",
+          "modified_at": "2024-10-20T05:04:42.709064Z"
+        }
+    """
+    client = get_client()
+    lookup = note_lookup(note_id, base_url or client.base_url, refresh)
+    try:
+        step = next(lookup)
+        while True:
+            if step == "note":
+                step = lookup.send(
+                    client.get(client.url(f"/notes/{note_id}", base_url))
+                )
+            else:
+                step = lookup.send(get_notes(base_url))
+    except StopIteration as done:
+        return done.value
+
+
+def note_lookup(
+    note_id: int, root: str, refresh: bool = False
+) -> Generator[str, Any, Dict[str, Any]]:
+    """
+    The steps of `get_note` without its requests, shared with the async client.
+
+    Yields "note" to be sent the response to GET /notes/{id}, or "notes" to
+    be sent every note from GET /notes, and returns the note.
+
+    Args:
+        note_id (int): The ID of the note to retrieve.
+        root (str): The base URL of the API the note is cached under.
+        refresh (bool): Ignore any cached copy of the note.
+
+    Raises:
+        ValueError: If no note exists with the given ID.
+
+    Example:
+        >>> lookup = note_lookup(1, "http://localhost:37238")
+        >>> next(lookup)
+        "note"
+    """
+    cache = _note_cache.setdefault(root, {})
+    now = time.monotonic()
+    if not refresh and note_id in cache and now - cache[note_id][1] <= NOTE_CACHE_TTL:
+        return cache[note_id][0]
+
+    if root not in _no_note_endpoint:
+        response = yield "note"
+        if 200 <= response.status_code < 300:
+            cache[note_id] = (parse_response(response), now)
+            return cache[note_id][0]
+        if response.status_code == 405:
+            _no_note_endpoint.add(root)
+        elif response.status_code != 404:
+            response.raise_for_status()  # Raise an error for bad responses
+
+    # Fall back to a locally indexed copy of every note, downloaded again
+    # at most every NOTE_INDEX_INTERVAL seconds however many lookups miss
+    if now - _indexed_at.get(root, float("-inf")) > NOTE_INDEX_INTERVAL:
+        notes = yield "notes"
+        cache.clear()
+        cache.update((note["id"], (note, now)) for note in notes)
+        _indexed_at[root] = now
+    if note_id not in cache:
+        raise ValueError(f"No note found with ID {note_id}.")
+    # The note exists, so a 404 above means the endpoint itself is missing
+    _no_note_endpoint.add(root)
+    return cache[note_id][0]
+
+
+def forget_note(note_id: int, base_url: Optional[str] = None) -> None:
+    """
+    Drop a note from the `get_note` cache so the next lookup refetches it.
+
+    Args:
+        note_id (int): The ID of the note to forget.
+        base_url (Optional[str]): The base URL of the API (default: the shared client's base URL).
+    """
+    root = base_url or get_client().base_url
+    _note_cache.get(root, {}).pop(note_id, None)
+
+
+def lacks_note_endpoint(base_url: Optional[str] = None) -> bool:
+    """
+    Whether `get_note` found the server has no GET /notes/{id} endpoint.
+
+    Each `get_note` on such a server downloads every note when the note is
+    not cached, so callers fetching many notes should stream `iter_notes`.
+    """
+    return (base_url or get_client().base_url) in _no_note_endpoint
+
+
+def clear_note_cache(forget_endpoints: bool = True) -> None:
+    """
+    Drop every cached note.
+
+    Args:
+        forget_endpoints (bool): Also forget which servers lack GET /notes/{id}.
+    """
+    _note_cache.clear()
+    _indexed_at.clear()
+    if forget_endpoints:
+        _no_note_endpoint.clear()
 
 
 def get_notes_no_content(
-    base_url: str = "http://localhost:37238",
+    base_url: Optional[str] = None,
 ) -> List[Dict[str, Any]]:
     """
     Retrieve notes without content by sending a GET request.
 
     Args:
-        base_url (str): The base URL of the API (default: "http://localhost:37238").
+        base_url (Optional[str]): The base URL of the API (default: the shared client's base URL).
 
     Returns:
         List[Dict[str, Any]]: A list of note metadata as JSON objects (excluding content).
@@ -144,21 +310,18 @@ def get_notes_no_content(
             ...
         ]
     """
-    url = f"{base_url}/notes/no-content"
-    response = requests.get(url)
-    response.raise_for_status()  # Raise an error for bad responses
-    return response.json()
+    url = get_client().url("/notes/no-content", base_url)
+    response = get_client().get(url)
+    return parse_response(response, check=True)
 
 
-def search_notes(
-    query: str, base_url: str = "http://localhost:37238"
-) -> List[Dict[str, Any]]:
+def search_notes(query: str, base_url: Optional[str] = None) -> List[Dict[str, Any]]:
     """
     Search for notes based on a query string by sending a GET request.
 
     Args:
         query (str): The search query string.
-        base_url (str): The base URL of the API (default: "http://localhost:37238").
+        base_url (Optional[str]): The base URL of the API (default: the shared client's base URL).
 
     Returns:
         List[Dict[str, Any]]: A list of notes that match the search criteria as JSON objects.
@@ -168,14 +331,13 @@ def search_notes(
         [{"id": 2, "title": "Foo"}]
     """
     encoded_query = quote(query)
-    url = f"{base_url}/notes/search?q={encoded_query}"
-    response = requests.get(url)
-    response.raise_for_status()  # Raise an error for bad responses
-    return response.json()
+    url = get_client().url(f"/notes/search?q={encoded_query}", base_url)
+    response = get_client().get(url)
+    return parse_response(response, check=True)
 
 
 def create_note_hierarchy(
-    hierarchy_data: Dict[str, int], base_url: str = "http://localhost:37238"
+    hierarchy_data: Dict[str, int], base_url: Optional[str] = None
 ) -> Dict[str, Any]:
     """
     Create a note hierarchy entry by sending a POST request.
@@ -183,7 +345,7 @@ def create_note_hierarchy(
     Args:
         hierarchy_data (Dict[str, int]): A dictionary containing 'parent_note_id', 'child_note_id',
                                          and 'hierarchy_type' keys.
-        base_url (str): The base URL of the API (default: "http://localhost:37238").
+        base_url (Optional[str]): The base URL of the API (default: the shared client's base URL).
 
     Returns:
         Dict[str, Any]: The response from the server as a JSON object.
@@ -193,17 +355,15 @@ def create_note_hierarchy(
                 {"parent_note_id": 1, "child_note_id": 2, "hierarchy_type": "subpage"})
         {"id": 2, "message": "Note hierarchy entry added successfully"}
     """
-    url = f"{base_url}/notes/hierarchy"
-    headers = {"Content-Type": "application/json"}
-    response = requests.post(url, json=hierarchy_data, headers=headers)
-    response.raise_for_status()
-    return response.json()
+    url = get_client().url("/notes/hierarchy", base_url)
+    response = get_client().post(url, json=hierarchy_data)
+    return parse_response(response, check=True)
 
 
 def update_note_hierarchy(
     note_id: int,
     hierarchy_data: Dict[str, Any],
-    base_url: str = "http://localhost:37238",
+    base_url: Optional[str] = None,
 ) -> Dict[str, Any]:
     """
     Update the hierarchy of a note by sending a PUT request.
@@ -211,7 +371,7 @@ def update_note_hierarchy(
     Args:
         note_id (int): The ID of the note to update hierarchy for.
         hierarchy_data (Dict[str, Any]): A dictionary containing the hierarchy details, e.g., {'parent_note_id': 2, 'hierarchy_type': 'subpage'}.
-        base_url (str): The base URL of the API (default: "http://localhost:37238").
+        base_url (Optional[str]): The base URL of the API (default: the shared client's base URL).
 
     Returns:
         Dict[str, Any]: The response from the server as a JSON object.
@@ -221,21 +381,20 @@ def update_note_hierarchy(
                 4, {"parent_note_id": 2, "hierarchy_type": "subpage"})
         {"message": "Note hierarchy entry updated successfully"}
     """
-    url = f"{base_url}/notes/hierarchy/{note_id}"
-    headers = {"Content-Type": "application/json"}
-    response = requests.put(url, json=hierarchy_data, headers=headers)
-    return response.json()
+    url = get_client().url(f"/notes/hierarchy/{note_id}", base_url)
+    response = get_client().put(url, json=hierarchy_data)
+    return parse_response(response)
 
 
 def delete_note_hierarchy(
-    note_id: int, base_url: str = "http://localhost:37238"
+    note_id: int, base_url: Optional[str] = None
 ) -> Dict[str, Any]:
     """
     Delete the hierarchy entry of a note by sending a DELETE request.
 
     Args:
         note_id (int): The ID of the note whose hierarchy is to be deleted.
-        base_url (str): The base URL of the API (default: "http://localhost:37238").
+        base_url (Optional[str]): The base URL of the API (default: the shared client's base URL).
 
     Returns:
         Dict[str, Any]: The response from the server as a JSON object.
@@ -244,17 +403,17 @@ def delete_note_hierarchy(
         >>> delete_note_hierarchy(2)
         {"message":"Note hierarchy entry deleted successfully"}
     """
-    url = f"{base_url}/notes/hierarchy/{note_id}"
-    response = requests.delete(url)
-    return response.json()
+    url = get_client().url(f"/notes/hierarchy/{note_id}", base_url)
+    response = get_client().delete(url)
+    return parse_response(response)
 
 
-def get_notes_tree(base_url: str = "http://localhost:37238") -> List[Dict[str, Any]]:
+def get_notes_tree(base_url: Optional[str] = None) -> List[Dict[str, Any]]:
     """
     Retrieve the notes tree by sending a GET request.
 
     Args:
-        base_url (str): The base URL of the API (default: "http://localhost:37238").
+        base_url (Optional[str]): The base URL of the API (default: the shared client's base URL).
 
     Returns:
         List[Dict[str, Any]]: The response from the server, representing the notes tree.
@@ -291,7 +450,5 @@ def get_notes_tree(base_url: str = "http://localhost:37238") -> List[Dict[str, A
           }
         ]
     """
-    url = f"{base_url}/notes/tree"
-    response = requests.get(url)
-    response.raise_for_status()  # Raise an error for bad responses
-    return response.json()
+    url = get_client().url("/notes/tree", base_url)
+    return get_client().get_json(url, check=True)
@@ -0,0 +1,172 @@
+import os
+import sys
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+import codec
+
+FORMATS = ("table", "ndjson", "tsv", "json")
+# Set by the global --format and --fields, for commands given neither
+_defaults: Dict[str, Any] = {"format": "table", "fields": None}
+
+
+def parse_fields(value: Optional[str]) -> Optional[List[str]]:
+    """
+    Split a comma separated --fields value.
+
+    Example:
+        >>> parse_fields("id, title")
+        ["id", "title"]
+    """
+    if not value:
+        return None
+    return [field.strip() for field in value.split(",") if field.strip()]
+
+
+def set_defaults(format: str = "table", fields: Optional[str] = None) -> None:
+    """
+    Set the format and fields used when a command is given neither.
+
+    Raises:
+        ValueError: If the format is unknown.
+    """
+    if format not in FORMATS:
+        raise ValueError(
+            f"Unknown format '{format}', expected one of {', '.join(FORMATS)}."
+        )
+    _defaults["format"] = format
+    _defaults["fields"] = parse_fields(fields)
+
+
+def resolve(
+    format: Optional[str] = None, fields: Optional[str] = None
+) -> Tuple[str, Optional[List[str]]]:
+    """
+    Return a command's format and fields, falling back to the global ones.
+
+    Raises:
+        ValueError: If the format is unknown.
+    """
+    format = format or _defaults["format"]
+    if format not in FORMATS:
+        raise ValueError(
+            f"Unknown format '{format}', expected one of {', '.join(FORMATS)}."
+        )
+    return format, parse_fields(fields) or _defaults["fields"]
+
+
+def project(record: Dict[str, Any], fields: Optional[Sequence[str]]) -> Dict[str, Any]:
+    """Return the given fields of a record, in order, None for those it lacks."""
+    if fields is None:
+        return record
+    return {field: record.get(field) for field in fields}
+
+
+def _tsv_value(value: Any) -> str:
+    # One record per line, so tabs and newlines inside values are escaped
+    if value is None:
+        return ""
+    if isinstance(value, (dict, list)):
+        value = codec.dumps(value).decode()
+    elif isinstance(value, bool):
+        value = "true" if value else "false"
+    return str(value).replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n")
+
+
+def _stdout_writer() -> Tuple[Callable[[bytes], Any], Callable[[], Any]]:
+    # The binary buffer under stdout, skipping the text layer, or the text
+    # stream itself when stdout has been redirected, as in the daemon
+    sys.stdout.flush()
+    buffer = getattr(sys.stdout, "buffer", None)
+    if buffer is not None:
+        return buffer.write, buffer.flush
+    return (lambda data: sys.stdout.write(data.decode())), sys.stdout.flush
+
+
+def stream_records(
+    records: Iterable[Dict[str, Any]],
+    format: str,
+    fields: Optional[Sequence[str]] = None,
+) -> int:
+    """
+    Write records to stdout as NDJSON, TSV or a JSON array, as they arrive.
+
+    Nothing is collected first, so the first record is written as soon as
+    it is read, and a large listing streamed from the server is written in
+    constant memory. Lines go through the buffered binary stdout rather than
+    an `echo` per line.
+
+    Args:
+        records (Iterable[Dict[str, Any]]): The records, e.g. from `iter_notes`.
+        format (str): "ndjson", "tsv" or "json".
+        fields (Optional[Sequence[str]]): The fields to write, in order (default: every field, TSV columns from the first record).
+
+    Returns:
+        int: The number of records written.
+
+    Example:
+        >>> stream_records(iter_notes(), "tsv", ["id", "title"])
+        id	title
+        1	First note
+        2	Foo
+    """
+    write, flush = _stdout_writer()
+    count = 0
+    if format == "json":
+        write(b"[")
+    for record in records:
+        record = project(record, fields)
+        if format == "tsv":
+            if count == 0:
+                fields = fields or list(record)
+                write("\t".join(fields).encode() + b"\n")
+            line = "\t".join(_tsv_value(record.get(field)) for field in fields)
+            write(line.encode() + b"\n")
+        elif format == "json":
+            write((b",\n" if count else b"\n") + codec.dumps(record))
+        else:
+            write(codec.dumps(record) + b"\n")
+        count += 1
+        if count == 1:
+            # Show the first record at once, buffer the rest
+            flush()
+    if format == "json":
+        write(b"\n]\n" if count else b"]\n")
+    flush()
+    return count
+
+
+def write_records(
+    records: Iterable[Dict[str, Any]],
+    table: Callable[[Iterable[Dict[str, Any]]], Any],
+    format: Optional[str] = None,
+    fields: Optional[str] = None,
+) -> None:
+    """
+    Write records in a command's format, see `resolve`.
+
+    When stdout is closed early, as by `| head`, the records stop being read,
+    which closes a response being streamed, and the process exits quietly.
+
+    Args:
+        records (Iterable[Dict[str, Any]]): The records.
+        table (Callable): Prints the records for the "table" format.
+        format (Optional[str]): The format given to the command (default: the global one).
+        fields (Optional[str]): Comma separated fields given to the command (default: the global ones).
+
+    Raises:
+        ValueError: If the format is unknown.
+    """
+    format, field_list = resolve(format, fields)
+    try:
+        if format == "table":
+            table(project(record, field_list) for record in records)
+        else:
+            stream_records(records, format, field_list)
+    except BrokenPipeError:
+        # Point stdout at /dev/null so the flush at exit does not fail again
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        os.dup2(devnull, sys.stdout.fileno())
+        raise SystemExit(1)
+    finally:
+        close = getattr(records, "close", None)
+        if close is not None:
+            close()
@@ -0,0 +1,248 @@
+import codec
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, NamedTuple, Optional
+import tracing
+
+# Bytes of response bodies kept in memory
+DEFAULT_MEMORY_LIMIT = 32 * 1024 * 1024
+# Seconds a response without validators is served without asking the server
+# again, 0 always asks. Overridden by $DRAFTSMITH_CACHE_TTL.
+DEFAULT_TTL = 0.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    url TEXT PRIMARY KEY,
+    body BLOB NOT NULL,
+    digest TEXT NOT NULL,
+    etag TEXT,
+    last_modified TEXT,
+    stored_at REAL NOT NULL
+);
+"""
+
+
+class CachedResponse(NamedTuple):
+    body: bytes
+    digest: str
+    etag: Optional[str]
+    last_modified: Optional[str]
+    stored_at: float
+
+    @property
+    def validated(self) -> bool:
+        """Whether the server gave a validator the response can be revalidated with."""
+        return bool(self.etag or self.last_modified)
+
+    def conditional_headers(self) -> Dict[str, str]:
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+def default_cache_path() -> Path:
+    from utils import cache_dir
+
+    return cache_dir() / "responses.sqlite3"
+
+
+class ResponseCache:
+    """
+    A two tier cache of JSON GET responses, revalidated with conditional requests.
+
+    Responses are kept in a size bounded LRU in memory and in a SQLite file
+    shared between CLI invocations. A cached response with an ETag or
+    Last-Modified is always revalidated with If-None-Match/If-Modified-Since,
+    so an unchanged payload costs a bodiless 304. A response without either
+    is served as is for `ttl` seconds, then fetched again and compared by
+    its SHA-256 digest.
+
+    Args:
+        path (Optional[Path]): The SQLite file (default: responses.sqlite3 in the cache directory).
+        memory_limit (int): The maximum bytes of bodies kept in memory.
+        ttl (Optional[float]): Seconds to serve responses without validators (default: $DRAFTSMITH_CACHE_TTL or 0).
+
+    Example:
+        >>> cache = ResponseCache(ttl=10)
+        >>> cache.fetch(url, lambda headers: session.get(url, headers=headers))
+        [{"id": 1, "title": "First note", ...}, ...]
+        >>> cache.stats
+        {"hits": 0, "not_modified": 1, "unchanged": 0, "misses": 1}
+    """
+
+    def __init__(
+        self,
+        path: Optional[Path] = None,
+        memory_limit: int = DEFAULT_MEMORY_LIMIT,
+        ttl: Optional[float] = None,
+    ):
+        self.path = Path(path) if path else None
+        self.memory_limit = memory_limit
+        if ttl is None:
+            ttl = float(os.environ.get("DRAFTSMITH_CACHE_TTL", DEFAULT_TTL))
+        self.ttl = ttl
+        self.stats = {"hits": 0, "not_modified": 0, "unchanged": 0, "misses": 0}
+        self._memory: "OrderedDict[str, CachedResponse]" = OrderedDict()
+        self._memory_size = 0
+        self._connection: Optional[sqlite3.Connection] = None
+        # Whether any stored response lacks validators, None until the file is checked
+        self._unvalidated: Optional[bool] = None
+        self._lock = threading.RLock()
+
+    # Storage
+
+    def _db(self) -> sqlite3.Connection:
+        # Opened on first use so building a client never touches the disk
+        if self._connection is None:
+            self.path = self.path or default_cache_path()
+            self._connection = sqlite3.connect(self.path, check_same_thread=False)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.executescript(SCHEMA)
+        return self._connection
+
+    def _remember(self, url: str, entry: CachedResponse) -> None:
+        previous = self._memory.pop(url, None)
+        if previous is not None:
+            self._memory_size -= len(previous.body)
+        if len(entry.body) > self.memory_limit:
+            return
+        self._memory[url] = entry
+        self._memory_size += len(entry.body)
+        while self._memory_size > self.memory_limit:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_size -= len(evicted.body)
+
+    def get(self, url: str) -> Optional[CachedResponse]:
+        """Return the cached response for a URL, from memory or else from disk."""
+        with self._lock:
+            entry = self._memory.get(url)
+            if entry is not None:
+                self._memory.move_to_end(url)
+                return entry
+            row = (
+                self._db()
+                .execute(
+                    "SELECT body, digest, etag, last_modified, stored_at"
+                    " FROM responses WHERE url = ?",
+                    (url,),
+                )
+                .fetchone()
+            )
+            if row is None:
+                return None
+            entry = CachedResponse(*row)
+            self._remember(url, entry)
+            return entry
+
+    def put(self, url: str, entry: CachedResponse, write_body: bool = True) -> None:
+        """Store a response in both tiers, only touching its timestamp when the body is unchanged."""
+        with self._lock:
+            self._remember(url, entry)
+            if write_body and not entry.validated:
+                self._unvalidated = True
+            with self._db() as db:
+                if write_body:
+                    db.execute(
+                        "INSERT OR REPLACE INTO responses"
+                        " (url, body, digest, etag, last_modified, stored_at)"
+                        " VALUES (?, ?, ?, ?, ?, ?)",
+                        (url, *entry),
+                    )
+                else:
+                    db.execute(
+                        "UPDATE responses SET stored_at = ? WHERE url = ?",
+                        (entry.stored_at, url),
+                    )
+
+    def invalidate(self) -> None:
+        """
+        Drop every response that has no validators.
+
+        Called after a write to the server, since those responses would
+        otherwise be served for up to `ttl` seconds without being checked.
+        Once the file has none left, later writes skip the DELETE entirely.
+        """
+        with self._lock:
+            if self._unvalidated is False:
+                return
+            for url in [url for url, e in self._memory.items() if not e.validated]:
+                self._memory_size -= len(self._memory.pop(url).body)
+            # Left by an earlier run, though this one has not opened the file yet
+            self.path = self.path or default_cache_path()
+            if self._connection is not None or self.path.exists():
+                with self._db() as db:
+                    db.execute(
+                        "DELETE FROM responses"
+                        " WHERE etag IS NULL AND last_modified IS NULL"
+                    )
+            self._unvalidated = False
+
+    def clear(self) -> None:
+        """Drop every cached response."""
+        with self._lock:
+            self._memory.clear()
+            self._memory_size = 0
+            self._unvalidated = False
+            with self._db() as db:
+                db.execute("DELETE FROM responses")
+
+    def close(self) -> None:
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    # Fetching
+
+    def fetch(
+        self, url: str, send: Callable[[Dict[str, str]], Any], check: bool = False
+    ) -> Any:
+        """
+        Return the decoded JSON body of a GET, from the cache when it is still current.
+
+        Args:
+            url (str): The full URL, used as the cache key.
+            send (Callable): Sends the GET with the given extra headers and returns the response.
+            check (bool): Raise an error for bad responses before decoding.
+
+        Returns:
+            Any: The decoded JSON body.
+        """
+        from api_client import parse_response
+
+        entry = self.get(url)
+        now = time.time()
+        if entry and not entry.validated and now - entry.stored_at < self.ttl:
+            self.stats["hits"] += 1
+            return codec.loads(entry.body)
+
+        response = send(entry.conditional_headers() if entry else {})
+        if response.status_code == 304 and entry:
+            self.stats["not_modified"] += 1
+            self.put(url, entry._replace(stored_at=now), write_body=False)
+            return tracing.loads(entry.body, response)
+        if not response.ok:
+            return parse_response(response, check)
+
+        body = response.content
+        digest = hashlib.sha256(body).hexdigest()
+        fresh = CachedResponse(
+            body,
+            digest,
+            response.headers.get("ETag"),
+            response.headers.get("Last-Modified"),
+            now,
+        )
+        unchanged = (
+            entry is not None and entry.digest == digest and entry[2:4] == fresh[2:4]
+        )
+        self.stats["unchanged" if unchanged else "misses"] += 1
+        self.put(url, fresh, write_body=not unchanged)
+        return tracing.loads(body, response)
@@ -0,0 +1,312 @@
+import re
+import sqlite3
+from typing import Dict, Any, Callable, Iterable, List, Optional, Tuple
+
+TOKEN_PATTERN = re.compile(r"\w+")
+QUERY_PATTERN = re.compile(r'"([^"]*)"|(\S+)')
+INDEX_VERSION = 3
+# A short prefix can match thousands of terms, only the first few are scored
+MAX_PREFIX_EXPANSIONS = 64
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    """
+    Split text into lowercase word tokens.
+
+    Example:
+        >>> tokenize("Hello, World!")
+        ["hello", "world"]
+    """
+    return TOKEN_PATTERN.findall((text or "").lower())
+
+
+# The notes' text is kept in an FTS5 table, which matches and ranks queries
+# itself, with prefix indexes so short prefixes need not scan every term.
+# Its 'row' vocabulary lists the indexed terms, for the snippets.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS search_version (
+    version INTEGER NOT NULL,
+    generation INTEGER
+);
+CREATE TABLE IF NOT EXISTS search_documents (
+    note_id INTEGER PRIMARY KEY,
+    modified_at TEXT
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS search_text USING fts5(
+    body,
+    tokenize = "unicode61 remove_diacritics 0 tokenchars '_'",
+    prefix = '1 2 3'
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS search_terms USING fts5vocab(search_text, 'row');
+"""
+# Dropped on a version mismatch, with those of earlier versions
+TABLES = (
+    "search_positions",
+    "search_terms",
+    "search_text",
+    "search_documents",
+    "search_version",
+)
+
+
+def _quote(text: str) -> str:
+    # An FTS5 string, tokenized by FTS5 itself so it matches the index
+    return '"' + text.replace('"', '""') + '"'
+
+
+class SearchIndex:
+    """
+    An inverted index over note titles and content with BM25 ranking.
+
+    Each note is indexed as its title followed by its content. The index
+    lives in SQLite, in an FTS5 table, which tokenizes queries the same way
+    as the notes and ranks matches with its `bm25` (k1 = 1.2, b = 0.75), so
+    a query only reads the postings of its own terms and opening the index
+    reads nothing. `open_search_index` keeps it in the local mirror's
+    database.
+
+    Query syntax:
+        - `word` ranks notes containing the word.
+        - `pre*` ranks notes containing any word starting with `pre`.
+        - `"exact phrase"` only keeps notes containing the phrase.
+
+    Args:
+        connection (Optional[sqlite3.Connection]): The database holding the index (default: a new in-memory one).
+
+    Example:
+        >>> index = SearchIndex()
+        >>> index.add_note({"id": 1, "title": "Foo", "content": "bar baz", "modified_at": "..."})
+        >>> index.search('"bar baz" fo*')
+        [(1, 0.57)]
+    """
+
+    def __init__(self, connection: Optional[sqlite3.Connection] = None):
+        self.connection = connection or sqlite3.connect(":memory:")
+        with self.connection:
+            self._create()
+
+    def _create(self) -> None:
+        # An index from another version of the client is rebuilt from scratch
+        self.connection.executescript(SCHEMA)
+        row = self.connection.execute("SELECT version FROM search_version").fetchone()
+        if row is not None and row[0] == INDEX_VERSION:
+            return
+        for table in TABLES:
+            self.connection.execute(f"DROP TABLE IF EXISTS {table}")
+        self.connection.executescript(SCHEMA)
+        self.connection.execute(
+            "INSERT INTO search_version (version) VALUES (?)", (INDEX_VERSION,)
+        )
+
+    def __len__(self) -> int:
+        return self.connection.execute(
+            "SELECT COUNT(*) FROM search_documents"
+        ).fetchone()[0]
+
+    @property
+    def generation(self) -> Optional[int]:
+        """The generation of the notes the index was last updated to, see `update`."""
+        return self.connection.execute(
+            "SELECT generation FROM search_version"
+        ).fetchone()[0]
+
+    # Updates
+
+    def add_note(self, note: Dict[str, Any]) -> None:
+        """Index a note, replacing any previous version of it."""
+        note_id = note["id"]
+        self.remove_note(note_id)
+        title, content = note.get("title") or "", note.get("content") or ""
+        self.connection.execute(
+            "INSERT INTO search_text (rowid, body) VALUES (?, ?)",
+            (note_id, f"{title}\n{content}"),
+        )
+        self.connection.execute(
+            "INSERT INTO search_documents (note_id, modified_at) VALUES (?, ?)",
+            (note_id, note.get("modified_at")),
+        )
+
+    def remove_note(self, note_id: int) -> None:
+        """Drop a note from the index."""
+        self.connection.execute("DELETE FROM search_text WHERE rowid = ?", (note_id,))
+        self.connection.execute(
+            "DELETE FROM search_documents WHERE note_id = ?", (note_id,)
+        )
+
+    def versions(self) -> Dict[int, Optional[str]]:
+        """Return the `modified_at` of every indexed note by ID."""
+        rows = self.connection.execute(
+            "SELECT note_id, modified_at FROM search_documents"
+        )
+        return dict(rows.fetchall())
+
+    def update(
+        self,
+        versions: Dict[int, Optional[str]],
+        fetch_notes: Callable[[List[int]], Iterable[Dict[str, Any]]],
+        generation: Optional[int] = None,
+    ) -> int:
+        """
+        Bring the index in line with a set of notes, reindexing only what changed.
+
+        The changes are committed as one transaction.
+
+        Args:
+            versions (Dict[int, Optional[str]]): The `modified_at` of every current note by ID.
+            fetch_notes (Callable): Returns the full notes for a list of changed IDs.
+            generation (Optional[int]): Identifies this set of notes, kept as `generation`.
+
+        Returns:
+            int: The number of notes added, reindexed or removed.
+        """
+        indexed = self.versions()
+        removed = [note_id for note_id in indexed if note_id not in versions]
+        changed = [
+            note_id
+            for note_id, modified_at in versions.items()
+            if note_id not in indexed or indexed[note_id] != modified_at
+        ]
+        with self.connection:
+            for note_id in removed:
+                self.remove_note(note_id)
+            if changed:
+                for note in fetch_notes(changed):
+                    self.add_note(note)
+            self.connection.execute(
+                "UPDATE search_version SET generation = ?", (generation,)
+            )
+        return len(removed) + len(changed)
+
+    # Queries
+
+    def _expand(self, term: str) -> List[str]:
+        if not term.endswith("*"):
+            return [term]
+        prefix = term[:-1]
+        rows = self.connection.execute(
+            "SELECT term FROM search_terms WHERE term >= ? AND term < ?"
+            " ORDER BY term LIMIT ?",
+            (prefix, prefix + "\U0010ffff", MAX_PREFIX_EXPANSIONS),
+        )
+        return [row[0] for row in rows]
+
+    def match_expression(self, query: str) -> Optional[str]:
+        """
+        Translate a query into an FTS5 MATCH expression, None if it has no terms.
+
+        Words and phrases are passed to FTS5 as strings, so they are split
+        and folded by the index's own tokenizer. Every phrase must match; the
+        words rank the notes that do.
+
+        Example:
+            >>> SearchIndex().match_expression('"make bread" salt*')
+            '"make bread" AND ("make bread" OR "salt" *)'
+        """
+        phrases, terms = [], []
+        for phrase, word in QUERY_PATTERN.findall(query):
+            if phrase:
+                phrases.append(_quote(phrase))
+            elif word.endswith("*") and word.rstrip("*"):
+                terms.append(_quote(word.rstrip("*")) + " *")
+            elif word.strip("*"):
+                terms.append(_quote(word))
+        if not phrases:
+            return " OR ".join(terms) or None
+        if not terms:
+            return " AND ".join(phrases)
+        # The first phrase is repeated so the words are optional
+        optional = " OR ".join(phrases[:1] + terms)
+        return " AND ".join(phrases) + f" AND ({optional})"
+
+    def parse_query(self, query: str) -> Tuple[List[List[str]], List[str]]:
+        """
+        Split a query into its phrases and its (possibly prefixed) terms.
+
+        Returns:
+            Tuple[List[List[str]], List[str]]: The tokenized phrases and the terms.
+        """
+        phrases, terms = [], []
+        for phrase, word in QUERY_PATTERN.findall(query):
+            if phrase:
+                phrases.append(tokenize(phrase))
+            elif word.endswith("*") and (tokens := tokenize(word[:-1])):
+                terms.extend(tokens[:-1] + [tokens[-1] + "*"])
+            else:
+                terms.extend(tokenize(word))
+        return phrases, terms
+
+    def search(self, query: str, limit: int = 10) -> List[Tuple[int, float]]:
+        """
+        Rank the notes matching a query.
+
+        Args:
+            query (str): The query, see the class docstring for the syntax.
+            limit (int): The maximum number of results.
+
+        Returns:
+            List[Tuple[int, float]]: Note IDs and their scores, best first.
+        """
+        expression = self.match_expression(query)
+        if expression is None:
+            return []
+        rows = self.connection.execute(
+            "SELECT rowid, -bm25(search_text) FROM search_text"
+            " WHERE search_text MATCH ? ORDER BY rank LIMIT ?",
+            (expression, limit),
+        )
+        return rows.fetchall()
+
+    def matched_terms(self, query: str) -> List[str]:
+        """Return every indexed term a query matches, used to build snippets."""
+        phrases, terms = self.parse_query(query)
+        matched = [token for phrase in phrases for token in phrase]
+        for term in terms:
+            matched.extend(self._expand(term))
+        return matched
+
+
+def snippet(content: Optional[str], terms: List[str], width: int = 80) -> str:
+    """
+    Return the part of a note's content around the first matched term.
+
+    Args:
+        content (Optional[str]): The content of the note.
+        terms (List[str]): The matched terms.
+        width (int): The approximate length of the snippet.
+
+    Returns:
+        str: The snippet on a single line, with ellipses where it was cut.
+    """
+    content = content or ""
+    lowered = content.lower()
+    positions = [
+        match.start()
+        for term in terms
+        if (match := re.search(rf"\b{re.escape(term)}", lowered))
+    ]
+    centre = min(positions) if positions else 0
+    start = max(0, centre - width // 3)
+    end = min(len(content), start + width)
+    text = " ".join(content[start:end].split())
+    return f"{'…' if start else ''}{text}{'…' if end < len(content) else ''}"
+
+
+def open_search_index(store: Any) -> SearchIndex:
+    """
+    Open the search index kept in the local mirror and bring it up to date.
+
+    The mirror's notes only change on `sync`, so nothing is compared until
+    a sync after the index was last updated. Then only notes whose
+    `modified_at` changed are reindexed.
+
+    Args:
+        store (LocalStore): The local mirror to index.
+
+    Returns:
+        SearchIndex: The up to date index.
+    """
+    index = SearchIndex(store.connection)
+    generation = (store.synced() or {}).get("generation")
+    if generation is None or generation != index.generation:
+        index.update(store.note_versions(), store.get_notes_by_id, generation)
+    return index
@@ -0,0 +1,395 @@
+import json
+import sqlite3
+import time
+from pathlib import Path
+from itertools import islice
+from typing import Dict, Any, Iterable, Iterator, List, Optional, Tuple
+from utils import cache_dir, map_concurrently, run_concurrently
+
+# Above this many changed notes one bulk get_notes beats fetching each note
+BULK_FETCH_THRESHOLD = 50
+# Streamed records are written in batches of this many
+WRITE_BATCH_SIZE = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS notes (
+    id INTEGER PRIMARY KEY,
+    title TEXT,
+    content TEXT,
+    created_at TEXT,
+    modified_at TEXT
+);
+CREATE TABLE IF NOT EXISTS tags (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS tags_name ON tags (name);
+CREATE TABLE IF NOT EXISTS note_tags (
+    note_id INTEGER NOT NULL,
+    tag_id INTEGER NOT NULL,
+    PRIMARY KEY (note_id, tag_id)
+);
+CREATE TABLE IF NOT EXISTS tasks (
+    id INTEGER PRIMARY KEY,
+    note_id INTEGER,
+    body TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS schedules (
+    id INTEGER PRIMARY KEY,
+    task_id INTEGER NOT NULL,
+    body TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS schedules_task ON schedules (task_id);
+CREATE TABLE IF NOT EXISTS clocks (
+    id INTEGER PRIMARY KEY,
+    task_id INTEGER NOT NULL,
+    body TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS clocks_task ON clocks (task_id);
+CREATE TABLE IF NOT EXISTS snapshots (
+    name TEXT PRIMARY KEY,
+    body TEXT NOT NULL
+);
+"""
+
+
+def fetch_notes(
+    note_ids: List[int], base_url: Optional[str] = None
+) -> Iterable[Dict[str, Any]]:
+    """
+    Download the current version of the notes with the given IDs.
+
+    Each note is fetched by ID, several at once. Past `BULK_FETCH_THRESHOLD`
+    notes, or when the server has no GET /notes/{id} and every `get_note`
+    would download all the notes, one `iter_notes` stream is filtered instead.
+
+    Args:
+        note_ids (List[int]): The IDs of the notes.
+        base_url (Optional[str]): The base URL of the API (default: the shared client's base URL).
+
+    Returns:
+        Iterable[Dict[str, Any]]: The notes, in no particular order.
+    """
+    from notes import get_note, iter_notes, lacks_note_endpoint
+
+    if not note_ids:
+        return []
+    if len(note_ids) > BULK_FETCH_THRESHOLD or lacks_note_endpoint(base_url):
+        wanted = set(note_ids)
+        return (note for note in iter_notes(base_url) if note["id"] in wanted)
+    # The first alone, to learn whether the endpoint exists before many
+    # requests at once each fall back to downloading every note
+    first = get_note(note_ids[0], base_url, refresh=True)
+    if lacks_note_endpoint(base_url):
+        # That fallback has just indexed every note
+        return [first] + [get_note(note_id, base_url) for note_id in note_ids[1:]]
+    return [first] + map_concurrently(
+        lambda note_id: get_note(note_id, base_url, refresh=True), note_ids[1:]
+    )
+
+
+def default_store_path() -> Path:
+    return cache_dir() / "mirror.sqlite3"
+
+
+class LocalStore:
+    """
+    A local SQLite mirror of the notes, tags, tasks, schedules and clocks on a server.
+
+    The database runs in WAL mode so reads are never blocked by a sync in
+    progress. Read methods return the same shapes as the matching functions
+    in notes.py, tags.py and tasks.py so callers can swap one for the other.
+
+    Args:
+        path (Optional[Path]): The database file (default: mirror.sqlite3 in the cache directory).
+
+    Example:
+        >>> store = LocalStore()
+        >>> store.sync()
+        {"notes_fetched": 3, "notes_deleted": 0, "tags": 5, "tasks": 2}
+        >>> store.get_notes()
+        [{"id": 1, "title": "First note", ...}, ...]
+    """
+
+    def __init__(self, path: Optional[Path] = None):
+        self.path = Path(path) if path else default_store_path()
+        self.connection = sqlite3.connect(self.path)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.executescript(SCHEMA)
+
+    def close(self) -> None:
+        self.connection.close()
+
+    # Sync
+
+    def sync(
+        self, base_url: Optional[str] = None, full: bool = False
+    ) -> Dict[str, int]:
+        """
+        Bring the mirror up to date with the server.
+
+        The first sync, or one with `full`, downloads every note. Later syncs
+        fetch `get_notes_no_content` and only download the content of notes
+        whose `modified_at` changed. Tags, tasks, schedules and clocks are
+        replaced on every sync.
+
+        Args:
+            base_url (Optional[str]): The base URL of the API (default: the shared client's base URL).
+            full (bool): Download every note even if the mirror has a copy.
+
+        Returns:
+            Dict[str, int]: Counts of the notes fetched and deleted, tags and tasks mirrored.
+        """
+        from api_client import get_client
+
+        started = time.time()
+        generation = (self.synced() or {}).get("generation", 0) + 1
+        with self.connection:
+            fetched, deleted = self._sync_notes(base_url, full)
+            tag_count = self._sync_tags(base_url)
+            task_count = self._sync_tasks(base_url)
+            root = (base_url or get_client().base_url).rstrip("/")
+            self._put_snapshot(
+                "synced", {"base_url": root, "at": started, "generation": generation}
+            )
+        return {
+            "notes_fetched": fetched,
+            "notes_deleted": deleted,
+            "tags": tag_count,
+            "tasks": task_count,
+        }
+
+    def _sync_notes(self, base_url: Optional[str], full: bool) -> Tuple[int, int]:
+        from notes import get_notes_no_content, iter_notes
+
+        local = {
+            row["id"]: row["modified_at"]
+            for row in self.connection.execute("SELECT id, modified_at FROM notes")
+        }
+        if full or not local:
+            self.connection.execute("DELETE FROM notes")
+            seen = set()
+
+            def listed() -> Iterator[Dict[str, Any]]:
+                for note in iter_notes(base_url):
+                    seen.add(note["id"])
+                    yield note
+
+            fetched = self._upsert_notes(listed())
+            return fetched, len(local.keys() - seen)
+
+        remote = get_notes_no_content(base_url)
+        remote_ids = {note["id"] for note in remote}
+        changed = [
+            note for note in remote if local.get(note["id"]) != note["modified_at"]
+        ]
+        deleted = [note_id for note_id in local if note_id not in remote_ids]
+
+        notes = fetch_notes([note["id"] for note in changed], base_url)
+        fetched = self._upsert_notes(notes)
+        self.connection.executemany(
+            "DELETE FROM notes WHERE id = ?", [(note_id,) for note_id in deleted]
+        )
+        return fetched, len(deleted)
+
+    def _upsert_notes(self, notes: Iterable[Dict[str, Any]]) -> int:
+        notes = iter(notes)
+        count = 0
+        while batch := list(islice(notes, WRITE_BATCH_SIZE)):
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO notes"
+                " (id, title, content, created_at, modified_at)"
+                " VALUES (:id, :title, :content, :created_at, :modified_at)",
+                [
+                    {
+                        "id": note["id"],
+                        "title": note.get("title"),
+                        "content": note.get("content"),
+                        "created_at": note.get("created_at"),
+                        "modified_at": note.get("modified_at"),
+                    }
+                    for note in batch
+                ],
+            )
+            count += len(batch)
+        return count
+
+    def _sync_tags(self, base_url: Optional[str]) -> int:
+        from tags import get_tags_with_notes, list_tags_with_notes
+
+        tags, tree = run_concurrently(
+            lambda: get_tags_with_notes(base_url),
+            lambda: list_tags_with_notes(base_url),
+        )
+        self.connection.execute("DELETE FROM tags")
+        self.connection.execute("DELETE FROM note_tags")
+        for tag in tags:
+            tag_id = tag.get("tag_id", tag.get("id"))
+            name = tag.get("tag_name", tag.get("name"))
+            self.connection.execute(
+                "INSERT OR REPLACE INTO tags (id, name) VALUES (?, ?)", (tag_id, name)
+            )
+            self.connection.executemany(
+                "INSERT OR IGNORE INTO note_tags (note_id, tag_id) VALUES (?, ?)",
+                [(note["id"], tag_id) for note in tag.get("notes") or []],
+            )
+        self._put_snapshot("tags_tree", tree)
+        return len(tags)
+
+    def _sync_tasks(self, base_url: Optional[str]) -> int:
+        from tasks import iter_tasks_details
+
+        for table in ("tasks", "schedules", "clocks"):
+            self.connection.execute(f"DELETE FROM {table}")
+        count = 0
+        for task in iter_tasks_details(base_url):
+            count += 1
+            body = {k: v for k, v in task.items() if k not in ("schedules", "clocks")}
+            self.connection.execute(
+                "INSERT INTO tasks (id, note_id, body) VALUES (?, ?, ?)",
+                (task["id"], task.get("note_id"), json.dumps(body)),
+            )
+            for table in ("schedules", "clocks"):
+                self.connection.executemany(
+                    f"INSERT OR REPLACE INTO {table} (id, task_id, body) VALUES (?, ?, ?)",
+                    [
+                        (row["id"], task["id"], json.dumps(row))
+                        for row in task.get(table) or []
+                    ],
+                )
+        return count
+
+    def _put_snapshot(self, name: str, body: Any) -> None:
+        self.connection.execute(
+            "INSERT OR REPLACE INTO snapshots (name, body) VALUES (?, ?)",
+            (name, json.dumps(body)),
+        )
+
+    # Reads
+
+    def get_notes(self) -> List[Dict[str, Any]]:
+        """Mirror of `notes.get_notes`."""
+        return list(self.iter_notes())
+
+    def iter_notes(self) -> Iterator[Dict[str, Any]]:
+        """Mirror of `notes.iter_notes`."""
+        for row in self.connection.execute("SELECT * FROM notes ORDER BY id"):
+            yield dict(row)
+
+    def get_note(self, note_id: int) -> Dict[str, Any]:
+        """Mirror of `notes.get_note`."""
+        row = self.connection.execute(
+            "SELECT * FROM notes WHERE id = ?", (note_id,)
+        ).fetchone()
+        if row is None:
+            raise ValueError(f"No note found with ID {note_id}.")
+        return dict(row)
+
+    def note_versions(self) -> Dict[int, Optional[str]]:
+        """Return the `modified_at` of every mirrored note by ID."""
+        rows = self.connection.execute("SELECT id, modified_at FROM notes")
+        return {row["id"]: row["modified_at"] for row in rows}
+
+    def get_notes_by_id(self, note_ids: List[int]) -> List[Dict[str, Any]]:
+        """Return the mirrored notes with the given IDs."""
+        notes = []
+        # Stay below SQLite's limit on the number of bound parameters
+        for start in range(0, len(note_ids), 500):
+            chunk = note_ids[start : start + 500]
+            placeholders = ", ".join("?" * len(chunk))
+            rows = self.connection.execute(
+                f"SELECT * FROM notes WHERE id IN ({placeholders})", chunk
+            )
+            notes.extend(dict(row) for row in rows)
+        return notes
+
+    def search_notes(self, query: str) -> List[Dict[str, Any]]:
+        """Mirror of `notes.search_notes`, matching the query against titles and content."""
+        pattern = f"%{query}%"
+        rows = self.connection.execute(
+            "SELECT id, title FROM notes WHERE title LIKE ? OR content LIKE ? ORDER BY id",
+            (pattern, pattern),
+        )
+        return [dict(row) for row in rows]
+
+    def get_tags_with_notes(self) -> List[Dict[str, Any]]:
+        """Mirror of `tags.get_tags_with_notes`."""
+        tags = []
+        for tag in self.connection.execute("SELECT id, name FROM tags ORDER BY id"):
+            notes = [
+                dict(row)
+                for row in self.connection.execute(
+                    "SELECT notes.id, notes.title FROM note_tags"
+                    " JOIN notes ON notes.id = note_tags.note_id"
+                    " WHERE note_tags.tag_id = ? ORDER BY notes.id",
+                    (tag["id"],),
+                )
+            ]
+            tags.append(
+                {"tag_id": tag["id"], "tag_name": tag["name"], "notes": notes or None}
+            )
+        return tags
+
+    def list_tags_with_notes(self) -> List[Dict[str, Any]]:
+        """Mirror of `tags.list_tags_with_notes`."""
+        row = self.connection.execute(
+            "SELECT body FROM snapshots WHERE name = 'tags_tree'"
+        ).fetchone()
+        return json.loads(row["body"]) if row else []
+
+    def synced(self) -> Optional[Dict[str, Any]]:
+        """
+        The 'base_url' last synced from, the Unix time that sync started 'at'
+        and its 'generation', counting syncs, if the mirror was ever synced.
+        """
+        row = self.connection.execute(
+            "SELECT body FROM snapshots WHERE name = 'synced'"
+        ).fetchone()
+        return json.loads(row["body"]) if row else None
+
+    def get_clock(self, clock_id: int) -> Optional[Dict[str, Any]]:
+        row = self.connection.execute(
+            "SELECT body FROM clocks WHERE id = ?", (clock_id,)
+        ).fetchone()
+        return json.loads(row["body"]) if row else None
+
+    def get_tasks_details(self) -> List[Dict[str, Any]]:
+        """Mirror of `tasks.get_tasks_details`."""
+        children: Dict[str, Dict[int, List[Dict[str, Any]]]] = {}
+        for table in ("schedules", "clocks"):
+            children[table] = {}
+            for row in self.connection.execute(
+                f"SELECT task_id, body FROM {table} ORDER BY id"
+            ):
+                children[table].setdefault(row["task_id"], []).append(
+                    json.loads(row["body"])
+                )
+        tasks = []
+        for row in self.connection.execute("SELECT id, body FROM tasks ORDER BY id"):
+            task = json.loads(row["body"])
+            task["schedules"] = children["schedules"].get(row["id"], [])
+            task["clocks"] = children["clocks"].get(row["id"], [])
+            tasks.append(task)
+        return tasks
+
+
+def open_store(path: Optional[Path] = None) -> LocalStore:
+    """
+    Open the local mirror, failing if it has never been synced.
+
+    Args:
+        path (Optional[Path]): The database file (default: mirror.sqlite3 in the cache directory).
+
+    Returns:
+        LocalStore: The opened mirror.
+
+    Raises:
+        FileNotFoundError: If the mirror does not exist yet.
+    """
+    path = Path(path) if path else default_store_path()
+    if not path.exists():
+        raise FileNotFoundError(
+            f"No local mirror at {path}, run `draftsmith sync` first."
+        )
+    return LocalStore(path)
@@ -0,0 +1,617 @@
+import hashlib
+import os
+import re
+import time
+import requests
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+import codec
+from api_client import get_client
+from bulk import markdown_record, split_front_matter
+from notes import (
+    create_note,
+    create_note_hierarchy,
+    delete_note,
+    delete_note_hierarchy,
+    get_notes_no_content,
+    get_notes_tree,
+    update_note,
+    update_note_hierarchy,
+)
+from store import fetch_notes
+from utils import map_concurrently, run_concurrently
+
+STATE_FILE = ".draftsmith-sync.json"
+# Seconds between looks at the directory, and at the server, in watch mode
+DEFAULT_POLL_INTERVAL = 1.0
+DEFAULT_REMOTE_INTERVAL = 30.0
+# Characters some file systems do not allow in a file name
+UNSAFE_CHARACTERS = re.compile(r'[\\/:*?"<>|\x00-\x1f]+')
+MAX_STEM_LENGTH = 100
+
+
+def render_note(note: Dict[str, Any]) -> str:
+    """
+    Return the Markdown file of a note, its ID and title as front matter.
+
+    Example:
+        >>> print(render_note({"id": 4, "title": "Foo", "content": "Bar"}))
+        ---
+        id: 4
+        title: Foo
+        ---
+
+        Bar
+    """
+    title = " ".join(str(note.get("title") or "").split())
+    return f"---\nid: {note['id']}\ntitle: {title}\n---\n\n{note.get('content') or ''}"
+
+
+def note_stem(title: str, note_id: int) -> str:
+    """Return the file name, without `.md`, of a new note's file."""
+    stem = UNSAFE_CHARACTERS.sub("-", " ".join(title.split())).strip(" .-")
+    return stem[:MAX_STEM_LENGTH].rstrip(" .-") or f"note-{note_id}"
+
+
+def tree_parents(tree: List[Dict[str, Any]]) -> Dict[int, Optional[int]]:
+    """
+    Return the parent of every note in a `get_notes_tree` tree, None for the roots.
+
+    A note listed under more than one parent is kept under the first.
+    """
+    parents: Dict[int, Optional[int]] = {}
+    stack = [(node, None) for node in reversed(tree)]
+    while stack:
+        node, parent = stack.pop()
+        if node["id"] in parents:
+            continue
+        parents[node["id"]] = parent
+        children = node.get("children") or []
+        stack.extend((child, node["id"]) for child in reversed(children))
+    return parents
+
+
+def plan_paths(
+    parents: Dict[int, Optional[int]],
+    titles: Dict[int, str],
+    stems: Dict[int, str],
+    reserved: Iterable[str] = (),
+) -> Dict[int, str]:
+    """
+    Lay the notes out as files, the children of `a.md` in the directory `a/`.
+
+    This is the layout `markdown_record` reads, so a synced directory can
+    also be imported.
+
+    Args:
+        parents (Dict[int, Optional[int]]): The parent of every note, see `tree_parents`.
+        titles (Dict[int, str]): Titles, naming the files of notes without a stem.
+        stems (Dict[int, str]): File names, without `.md`, notes already have.
+        reserved (Iterable[str]): Paths no note may be given.
+
+    Returns:
+        Dict[int, str]: The path of every note's file, relative to the directory.
+
+    Example:
+        >>> plan_paths({1: None, 2: 1}, {1: "Foo", 2: "Bar"}, {})
+        {1: "Foo.md", 2: "Foo/Bar.md"}
+    """
+    children: Dict[Optional[int], List[int]] = {}
+    for note_id, parent in parents.items():
+        children.setdefault(parent if parent in parents else None, []).append(note_id)
+    taken = {path.lower() for path in reserved}
+    paths: Dict[int, str] = {}
+    stack: List[Tuple[Optional[int], str]] = [(None, "")]
+    while stack:
+        parent, directory = stack.pop()
+        # Notes with a file keep its name, new notes are fitted around them
+        siblings = sorted(children.get(parent, []), key=lambda i: (i not in stems, i))
+        for note_id in siblings:
+            stem = stems.get(note_id) or note_stem(titles.get(note_id, ""), note_id)
+            if f"{directory}{stem}.md".lower() in taken:
+                stem = f"{stem}-{note_id}"
+            taken.add(f"{directory}{stem}.md".lower())
+            paths[note_id] = f"{directory}{stem}.md"
+            stack.append((note_id, f"{directory}{stem}/"))
+    # Notes moved under their own descendants are unreachable, put them at the top
+    stranded = {note_id: None for note_id in parents if note_id not in paths}
+    if stranded:
+        return plan_paths({**parents, **stranded}, titles, stems, reserved)
+    return paths
+
+
+def _hash(data: bytes) -> str:
+    return hashlib.sha1(data).hexdigest()
+
+
+def _parse_id(value: Optional[str]) -> Optional[int]:
+    try:
+        return int(value) if value else None
+    except ValueError:
+        return None
+
+
+def _parent_path(relative: str) -> Optional[str]:
+    # The file whose folder a file is in, as `markdown_record` reads it
+    parent = Path(relative).parent
+    return parent.with_suffix(".md").as_posix() if parent.name else None
+
+
+def _moving_path(path: Path) -> Path:
+    # The hidden name a file is given while files are moved
+    return path.with_name(f".{path.name}.moving")
+
+
+def _error(result: Any) -> Optional[str]:
+    # The note endpoints answer most errors with a JSON body rather than a status
+    if isinstance(result, dict) and "error" in result:
+        return str(result["error"])
+    return None
+
+
+class DirectorySync:
+    """
+    Two-way sync between the notes on a server and a directory of Markdown files.
+
+    Every note is a file with its ID and title as front matter, in folders
+    following the notes tree, see `plan_paths`. A state file in the
+    directory keeps each note's path, the hash, size and mtime of its file,
+    and its `modified_at` on the server as of the last sync. A sync:
+
+    - stats every file, and only reads those whose size or mtime changed,
+    - lists the notes without content, and the notes tree,
+    - pushes each edited file with one `update_note`, and creates a note for
+      each new file, writing its ID into the front matter,
+    - pulls only the notes whose `modified_at` changed,
+    - deletes a file when its note was deleted, and a note when its file was,
+    - moves a note in the tree when its file was moved to another folder,
+      and moves files to follow notes moved on the server.
+
+    A note changed on both sides keeps the file's version, and the server's
+    is saved next to it as `<file>.conflict`.
+
+    Args:
+        directory (Path): The directory, created if needed.
+        base_url (Optional[str]): The base URL of the API (default: the shared client's base URL).
+
+    Raises:
+        ValueError: If the directory is synced with another server.
+
+    Example:
+        >>> DirectorySync(Path("~/notes").expanduser()).sync()
+        {"pushed": 1, "created": 0, "pulled": 2, ..., "errors": []}
+    """
+
+    def __init__(self, directory: Path, base_url: Optional[str] = None):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.base_url = base_url
+        self.state_path = self.directory / STATE_FILE
+        # The state as last written, so an unchanged state is not written again
+        self._saved = self.state_path.read_bytes() if self.state_path.exists() else b""
+        state = codec.loads(self._saved) if self._saved else {}
+        server = base_url or get_client().base_url
+        if state.get("base_url", server) != server:
+            raise ValueError(
+                f"{self.directory} is synced with {state['base_url']}, not {server}."
+            )
+        self.server = server
+        self.notes: Dict[int, Dict[str, Any]] = {
+            int(note_id): entry for note_id, entry in state.get("notes", {}).items()
+        }
+        # The note ID, path and new path of the files being moved, kept in
+        # the state until every move is done
+        self.moving: List[List[Any]] = state.get("moving", [])
+
+    def _save(self) -> None:
+        notes = {str(note_id): entry for note_id, entry in self.notes.items()}
+        state: Dict[str, Any] = {"base_url": self.server, "notes": notes}
+        if self.moving:
+            state["moving"] = self.moving
+        data = codec.dumps(state)
+        if data != self._saved:
+            temporary = self.state_path.with_suffix(".tmp")
+            temporary.write_bytes(data)
+            temporary.replace(self.state_path)
+            self._saved = data
+
+    # Files
+
+    def _walk(self) -> Iterator[Tuple[str, os.DirEntry]]:
+        # Every Markdown file and its relative path. Plain strings and
+        # scandir, since building Path objects costs more than the stat calls.
+        stack = [(str(self.directory), "")]
+        while stack:
+            folder, prefix = stack.pop()
+            with os.scandir(folder) as entries:
+                for entry in sorted(entries, key=lambda entry: entry.name):
+                    if entry.name.startswith("."):
+                        continue
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append((entry.path, f"{prefix}{entry.name}/"))
+                    elif entry.name.endswith(".md"):
+                        yield f"{prefix}{entry.name}", entry
+
+    def snapshot(self) -> Dict[str, Tuple[int, int]]:
+        """Return the mtime and size of every Markdown file, to notice changes."""
+        snapshot = {}
+        for relative, entry in self._walk():
+            stat = entry.stat()
+            snapshot[relative] = (stat.st_mtime_ns, stat.st_size)
+        return snapshot
+
+    def _scan(self) -> Dict[str, Dict[str, Any]]:
+        # The note ID and hash of every file, reading only those that changed
+        by_path = {entry["path"]: note_id for note_id, entry in self.notes.items()}
+        files = {}
+        for relative, file in self._walk():
+            stat = file.stat()
+            note_id = by_path.get(relative)
+            entry = self.notes.get(note_id) if note_id is not None else None
+            if entry and (entry["mtime"], entry["size"]) == (
+                stat.st_mtime_ns,
+                stat.st_size,
+            ):
+                files[relative] = {"id": note_id, "hash": entry["hash"]}
+                continue
+            with open(file.path, "rb") as f:
+                data = f.read()
+            meta, _ = split_front_matter(data.decode("utf-8", errors="replace"))
+            files[relative] = {
+                "id": _parse_id(meta.get("id")) or note_id,
+                "hash": _hash(data),
+                "read": True,
+            }
+        return files
+
+    def _write(self, relative: str, text: str) -> str:
+        # Written aside and renamed, so an editor never reads half a file
+        path = self.directory / relative
+        path.parent.mkdir(parents=True, exist_ok=True)
+        data = text.encode("utf-8")
+        temporary = path.with_name(f".{path.name}.tmp")
+        temporary.write_bytes(data)
+        temporary.replace(path)
+        return _hash(data)
+
+    def _finish_moves(self) -> None:
+        # Put back the files a sync set aside and stopped before moving, as
+        # hidden files they would be taken for deleted. The file goes back
+        # where it was, or on to where it was going if that is taken.
+        for note_id, source, target in self.moving:
+            temporary = _moving_path(self.directory / source)
+            if not temporary.exists():
+                continue
+            stem = Path(source).with_suffix("").as_posix()
+            for relative in (source, target, f"{stem}-{note_id}.md"):
+                path = self.directory / relative
+                if not path.exists():
+                    path.parent.mkdir(parents=True, exist_ok=True)
+                    temporary.replace(path)
+                    break
+        # Whatever file is at each path now is read again
+        for note_id, _, _ in self.moving:
+            if note_id in self.notes:
+                self.notes[note_id]["mtime"] = None
+        self.moving = []
+        self._save()
+
+    def _prune(self, relatives: Iterable[str]) -> None:
+        # Remove the folders left empty by deleting or moving these files
+        for relative in relatives:
+            folder = (self.directory / relative).parent
+            while (
+                folder != self.directory
+                and folder.is_dir()
+                and not any(folder.iterdir())
+            ):
+                folder.rmdir()
+                folder = folder.parent
+
+    # Server
+
+    def _fetch(self, note_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+        return {note["id"]: note for note in fetch_notes(note_ids, self.base_url)}
+
+    def _push(self, note_id: int, relative: str) -> Optional[str]:
+        record = markdown_record(self.directory / relative, self.directory)
+        try:
+            result = update_note(
+                note_id,
+                {"title": record["title"], "content": record["content"]},
+                self.base_url,
+            )
+        except Exception as e:
+            return str(e)
+        return _error(result)
+
+    def _delete(self, note_id: int) -> Optional[str]:
+        try:
+            return _error(delete_note(note_id, self.base_url))
+        except Exception as e:
+            return str(e)
+
+    def _link(
+        self, note_id: int, parent: Optional[int], previous: Optional[int]
+    ) -> Optional[str]:
+        hierarchy = {"parent_note_id": parent, "hierarchy_type": "subpage"}
+        try:
+            if parent is None:
+                result = delete_note_hierarchy(note_id, self.base_url)
+            elif previous is None:
+                result = create_note_hierarchy(
+                    {**hierarchy, "child_note_id": note_id}, self.base_url
+                )
+            else:
+                result = update_note_hierarchy(note_id, hierarchy, self.base_url)
+        except Exception as e:
+            return str(e)
+        return _error(result)
+
+    # Sync
+
+    def sync(self) -> Dict[str, Any]:
+        """
+        Push the files changed since the last sync, and pull the notes changed on the server.
+
+        A note that fails to push is left as it was, and retried by the next sync.
+
+        Returns:
+            Dict[str, Any]: How many notes were pushed, created, pulled,
+            deleted on the server or here, moved and in conflict, and the errors.
+
+        Raises:
+            ValueError: If every file is gone from a directory synced before, rather than delete every note.
+        """
+        stats: Dict[str, Any] = {
+            "pushed": 0,
+            "created": 0,
+            "pulled": 0,
+            "deleted_remote": 0,
+            "deleted_local": 0,
+            "moved": 0,
+            "conflicts": 0,
+            "errors": [],
+        }
+        if self.moving:
+            self._finish_moves()
+        files = self._scan()
+        if self.notes and not files:
+            raise ValueError(
+                f"Every file is gone from {self.directory}, so no note was deleted. "
+                f"Delete {self.state_path} to download the notes again."
+            )
+        listing, tree = run_concurrently(
+            lambda: get_notes_no_content(self.base_url),
+            lambda: get_notes_tree(self.base_url),
+        )
+        remote = {note["id"]: note for note in listing}
+        titles = {note_id: note["title"] for note_id, note in remote.items()}
+        server_parents = tree_parents(tree)
+        parents = {note_id: server_parents.get(note_id) for note_id in remote}
+        # Notes whose state must not advance, so the next sync retries them
+        unsettled = set()
+        # Notes pushed, created or moved, whose modified_at changed
+        sent = set()
+        removed: List[str] = []
+
+        def fail(key: Any, error: str) -> None:
+            stats["errors"].append(f"{key}: {error}")
+            unsettled.add(key)
+
+        # The file of every note, and the files without a note
+        local: Dict[int, str] = {}
+        new_files: List[str] = []
+        for relative, file in files.items():
+            if file["id"] is None or file["id"] in local:
+                new_files.append(relative)
+            else:
+                local[file["id"]] = relative
+        hashes = {
+            note_id: files[relative]["hash"] for note_id, relative in local.items()
+        }
+        # Notes whose file is as the state has it, unless moved or pulled below
+        unread = {
+            note_id
+            for note_id, relative in local.items()
+            if "read" not in files[relative]
+        }
+
+        push, pull, conflicts, delete_remote = [], [], [], []
+        for note_id in set(self.notes) | set(local) | set(remote):
+            entry = self.notes.get(note_id)
+            relative = local.get(note_id)
+            note = remote.get(note_id)
+            local_changed = relative is not None and (
+                entry is None or hashes[note_id] != entry["hash"]
+            )
+            remote_changed = note is not None and (
+                entry is None or note["modified_at"] != entry["modified_at"]
+            )
+            if relative is not None and note is not None:
+                if local_changed and remote_changed:
+                    conflicts.append(note_id)
+                elif local_changed:
+                    push.append(note_id)
+                elif remote_changed:
+                    pull.append(note_id)
+            elif relative is not None:
+                del local[note_id]
+                if local_changed:
+                    # Deleted on the server but edited here, so it comes back
+                    new_files.append(relative)
+                else:
+                    (self.directory / relative).unlink()
+                    removed.append(relative)
+                    stats["deleted_local"] += 1
+            elif note is not None:
+                if remote_changed:
+                    pull.append(note_id)
+                else:
+                    delete_remote.append(note_id)
+            if note is None:
+                self.notes.pop(note_id, None)
+
+        # Changed on both sides, unless to the same thing
+        fetched = self._fetch(pull + conflicts)
+        for note_id in list(conflicts):
+            text = render_note(fetched[note_id])
+            if _hash(text.encode()) == hashes[note_id]:
+                conflicts.remove(note_id)
+            else:
+                self._write(f"{local[note_id]}.conflict", text)
+                stats["conflicts"] += 1
+
+        push += conflicts
+        errors = map_concurrently(lambda i: self._push(i, local[i]), push)
+        for note_id, error in zip(push, errors):
+            if error:
+                fail(note_id, error)
+            else:
+                sent.add(note_id)
+                stats["pushed"] += 1
+
+        errors = map_concurrently(self._delete, delete_remote)
+        for note_id, error in zip(delete_remote, errors):
+            if error:
+                fail(note_id, error)
+            else:
+                del parents[note_id]
+                del self.notes[note_id]
+                stats["deleted_remote"] += 1
+
+        # Parents before their children, so each can be linked as it is created
+        by_path = {relative: note_id for note_id, relative in local.items()}
+        notes_url = get_client().url("/notes", self.base_url)
+        failed_files = []
+        for relative in sorted(new_files, key=lambda relative: relative.count("/")):
+            record = markdown_record(self.directory / relative, self.directory)
+            note = {"title": record["title"], "content": record["content"]}
+            try:
+                result = create_note(notes_url, note)
+                if "id" not in result:
+                    raise ValueError(f"Note was not created: {result}")
+            except Exception as e:
+                stats["errors"].append(f"{relative}: {e}")
+                failed_files.append(relative)
+                continue
+            note_id = result["id"]
+            hashes[note_id] = self._write(
+                relative, render_note({**note, "id": note_id})
+            )
+            local[note_id] = relative
+            by_path[relative] = note_id
+            titles[note_id] = record["title"]
+            parents[note_id] = by_path.get(_parent_path(relative))
+            sent.add(note_id)
+            stats["created"] += 1
+            if parents[note_id] is not None:
+                error = self._link(note_id, parents[note_id], None)
+                if error:
+                    stats["errors"].append(f"{relative}: {error}")
+
+        # A file moved to another folder moves its note, see `markdown_record`.
+        # After the new files are created, as a file may be moved under one.
+        for note_id, relative in local.items():
+            entry = self.notes.get(note_id)
+            if entry is None or entry["path"] == relative:
+                continue
+            parent = by_path.get(_parent_path(relative))
+            if parent != parents[note_id]:
+                error = self._link(note_id, parent, parents[note_id])
+                if error:
+                    fail(note_id, error)
+                    continue
+                sent.add(note_id)
+                stats["moved"] += 1
+            parents[note_id] = parent
+
+        # Lay every note out, and bring the files in line
+        stems = {note_id: Path(relative).stem for note_id, relative in local.items()}
+        paths = plan_paths(parents, titles, stems, failed_files)
+        moving = [
+            note_id
+            for note_id, relative in local.items()
+            if paths.get(note_id, relative) != relative and note_id not in unsettled
+        ]
+        # Through a temporary name, so two files can swap names. The moves
+        # are saved first, for the next sync to finish should this one stop.
+        self.moving = [[note_id, local[note_id], paths[note_id]] for note_id in moving]
+        if moving:
+            self._save()
+        for note_id in moving:
+            source = self.directory / local[note_id]
+            source.replace(_moving_path(source))
+        for note_id in moving:
+            target = self.directory / paths[note_id]
+            target.parent.mkdir(parents=True, exist_ok=True)
+            _moving_path(self.directory / local[note_id]).replace(target)
+            removed.append(local[note_id])
+            local[note_id] = paths[note_id]
+        self.moving = []
+
+        for note_id in pull:
+            local[note_id] = paths[note_id]
+            hashes[note_id] = self._write(paths[note_id], render_note(fetched[note_id]))
+            stats["pulled"] += 1
+
+        # What was sent changed modified_at, one more listing saves pulling it back
+        if sent:
+            listing = get_notes_no_content(self.base_url)
+            remote.update((note["id"], note) for note in listing if note["id"] in sent)
+        unread -= set(moving) | set(pull)
+        for note_id, relative in local.items():
+            if note_id in unsettled or note_id not in remote:
+                continue
+            entry = self.notes.get(note_id)
+            if note_id in unread and entry is not None:
+                entry["modified_at"] = remote[note_id]["modified_at"]
+                continue
+            stat = os.stat(self.directory / relative)
+            self.notes[note_id] = {
+                "path": relative,
+                "hash": hashes[note_id],
+                "mtime": stat.st_mtime_ns,
+                "size": stat.st_size,
+                "modified_at": remote[note_id]["modified_at"],
+            }
+        self._prune(removed)
+        self._save()
+        return stats
+
+    def watch(
+        self,
+        interval: float = DEFAULT_POLL_INTERVAL,
+        remote_interval: float = DEFAULT_REMOTE_INTERVAL,
+        report: Optional[Callable[[Dict[str, Any]], None]] = None,
+    ) -> None:
+        """
+        Sync whenever a file changes, and at least every `remote_interval` seconds.
+
+        The directory is polled with `snapshot`, which only stats the files,
+        so watching costs no requests until something changes. A sync that
+        fails to reach the server is reported and tried again later. Runs
+        until interrupted.
+
+        Args:
+            interval (float): Seconds between looks at the directory.
+            remote_interval (float): Seconds between syncs when no file changes, to pull.
+            report (Optional[Callable]): Called with the stats of every sync.
+        """
+        last_sync = float("-inf")
+        snapshot = None
+        while True:
+            current = self.snapshot()
+            if current != snapshot or time.monotonic() - last_sync >= remote_interval:
+                # Let an editor finish saving before reading the files
+                if snapshot is not None and current != snapshot:
+                    time.sleep(interval)
+                try:
+                    stats = self.sync()
+                except requests.RequestException as e:
+                    stats = {"errors": [f"sync failed: {e}"]}
+                last_sync = time.monotonic()
+                snapshot = self.snapshot()
+                if report:
+                    report(stats)
+            time.sleep(interval)
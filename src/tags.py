@@ -1,17 +1,18 @@
-import requests
-from typing import Dict, Any, List
+import time
+from api_client import get_client, parse_response
+from typing import Dict, Any, FrozenSet, List, Optional, Set, Tuple
 from urllib.parse import quote
 
+DEFAULT_TAG_INDEX_TTL = 60.0
 
-def create_tag(
-    tag_name: str, base_url: str = "http://localhost:37238"
-) -> Dict[str, Any]:
+
+def create_tag(tag_name: str, base_url: Optional[str] = None) -> Dict[str, Any]:
     """
     Create a new tag by sending a POST request.
 
     Args:
         tag_name (str): The name of the tag to create.
-        base_url (str): The base URL of the API (default: "http://localhost:37238").
+        base_url (Optional[str]): The base URL of the API (default: the shared client's base URL).
 
     Returns:
         Dict[str, Any]: The response from the server as a JSON object.
@@ -20,15 +21,18 @@ def create_tag(
         >>> create_tag("important")
         {"id": 7, "message": "Tag created successfully"}
     """
-    url = f"{base_url}/tags"
-    headers = {"Content-Type": "application/json"}
+    url = get_client().url("/tags", base_url)
     tag_data = {"name": tag_name}
-    response = requests.post(url, json=tag_data, headers=headers)
-    return response.json()
+    response = get_client().post(url, json=tag_data)
+    result = parse_response(response)
+    index = _tag_indexes.get(base_url or get_client().base_url)
+    if index is not None and "id" in result:
+        index.add(result["id"], tag_name)
+    return result
 
 
 def assign_tag_to_note(
-    note_id: int, tag_id: int, base_url: str = "http://localhost:37238"
+    note_id: int, tag_id: int, base_url: Optional[str] = None
 ) -> Dict[str, Any]:
     """
     Assign a tag to a note by sending a POST request.
@@ -36,7 +40,7 @@ def assign_tag_to_note(
     Args:
         note_id (int): The ID of the note to which the tag should be assigned.
         tag_id (int): The ID of the tag to assign.
-        base_url (str): The base URL of the API (default: "http://localhost:37238").
+        base_url (Optional[str]): The base URL of the API (default: the shared client's base URL).
 
     Returns:
         Dict[str, Any]: The response from the server as a JSON object.
@@ -45,15 +49,15 @@ def assign_tag_to_note(
         >>> assign_tag_to_note(2, 3)
         {"note_id": 2, "tag_id": 3, "message": "Tag assigned successfully"}
     """
-    url = f"{base_url}/notes/{note_id}/tags"
-    headers = {"Content-Type": "application/json"}
+    url = get_client().url(f"/notes/{note_id}/tags", base_url)
     tag_data = {"tag_id": tag_id}
-    response = requests.post(url, json=tag_data, headers=headers)
-    return response.json()
+    response = get_client().post(url, json=tag_data)
+    _forget_tag_closure(base_url)
+    return parse_response(response)
 
 
 def update_tag(
-    tag_id: int, new_name: str, base_url: str = "http://localhost:37238"
+    tag_id: int, new_name: str, base_url: Optional[str] = None
 ) -> Dict[str, Any]:
     """
     Update the name of a tag by sending a PUT request.
@@ -61,7 +65,7 @@ def update_tag(
     Args:
         tag_id (int): The ID of the tag to update.
         new_name (str): The new name for the tag.
-        base_url (str): The base URL of the API (default: "http://localhost:37238").
+        base_url (Optional[str]): The base URL of the API (default: the shared client's base URL).
 
     Returns:
         Dict[str, Any]: The response from the server as a JSON object.
@@ -70,20 +74,23 @@ def update_tag(
         >>> update_tag(1, "New Tag Name")
         {"message": "Tag updated successfully"}
     """
-    url = f"{base_url}/tags/{tag_id}"
-    headers = {"Content-Type": "application/json"}
+    url = get_client().url(f"/tags/{tag_id}", base_url)
     tag_data = {"name": new_name}
-    response = requests.put(url, json=tag_data, headers=headers)
-    return response.json()
+    response = get_client().put(url, json=tag_data)
+    result = parse_response(response)
+    index = _tag_indexes.get(base_url or get_client().base_url)
+    if index is not None and response.ok:
+        index.add(tag_id, new_name)
+    return result
 
 
-def delete_tag(tag_id: int, base_url: str = "http://localhost:37238") -> Dict[str, Any]:
+def delete_tag(tag_id: int, base_url: Optional[str] = None) -> Dict[str, Any]:
     """
     Delete a tag by sending a DELETE request.
 
     Args:
         tag_id (int): The ID of the tag to delete.
-        base_url (str): The base URL of the API (default: "http://localhost:37238").
+        base_url (Optional[str]): The base URL of the API (default: the shared client's base URL).
 
     Returns:
         Dict[str, Any]: The response from the server as a JSON object.
@@ -92,19 +99,24 @@ def delete_tag(tag_id: int, base_url: str = "http://localhost:37238") -> Dict[st
         >>> delete_tag(5)
         {"message": "Tag deleted successfully"}
     """
-    url = f"{base_url}/tags/{tag_id}"
-    response = requests.delete(url)
-    return response.json()
+    url = get_client().url(f"/tags/{tag_id}", base_url)
+    response = get_client().delete(url)
+    result = parse_response(response)
+    index = _tag_indexes.get(base_url or get_client().base_url)
+    if index is not None and response.ok:
+        index.remove(tag_id)
+    _forget_tag_closure(base_url)
+    return result
 
 
 def get_tags_with_notes(
-    base_url: str = "http://localhost:37238",
+    base_url: Optional[str] = None,
 ) -> List[Dict[str, Any]]:
     """
     Retrieve a list of tags along with their associated notes.
 
     Args:
-        base_url (str): The base URL of the API (default: "http://localhost:37238").
+        base_url (Optional[str]): The base URL of the API (default: the shared client's base URL).
 
     Returns:
         List[Dict[str, Any]]: A list of tags and their associated notes.
@@ -149,17 +161,36 @@ def get_tags_with_notes(
           }
         ]
     """
-    url = f"{base_url}/tags/with-notes"
-    response = requests.get(url)
-    return response.json()
+    url = get_client().url("/tags/with-notes", base_url)
+    response = get_client().get(url)
+    return parse_response(response)
+
+
+def get_tags(base_url: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    Get a list of tags, without their notes, from the API.
+
+    Args:
+        base_url (Optional[str]): The base URL of the API (default: the shared client's base URL).
+
+    Returns:
+        List[Dict[str, Any]]: A list of tags, each with an 'id' and a 'name'.
+
+    Example:
+        >>> get_tags()
+        [{"id": 4, "name": "done"}, {"id": 1, "name": "important"}, ...]
+    """
+    url = get_client().url("/tags", base_url)
+    response = get_client().get(url)
+    return parse_response(response, check=True)
 
 
-def get_tag_names(base_url: str = "http://localhost:37238") -> List[str]:
+def get_tag_names(base_url: Optional[str] = None) -> List[str]:
     """
     Get a list of tag names from the API.
 
     Args:
-        base_url (str): The base URL of the API (default: "http://localhost:37238").
+        base_url (Optional[str]): The base URL of the API (default: the shared client's base URL).
 
     Returns:
         List[str]: A list containing the names of all the tags.
@@ -168,17 +199,14 @@ def get_tag_names(base_url: str = "http://localhost:37238") -> List[str]:
         >>> get_tag_names()
         ["done", "important", "important", "todo", "urgent"]
     """
-    url = f"{base_url}/tags"
-    response = requests.get(url)
-    response.raise_for_status()  # Raise an exception for HTTP errors
-    tags = response.json()
+    tags = get_tags(base_url)
 
     # Extract the 'name' from each tag into a list
     return [tag["name"] for tag in tags]
 
 
 def create_tag_hierarchy(
-    parent_tag_id: int, child_tag_id: int, base_url: str = "http://localhost:37238"
+    parent_tag_id: int, child_tag_id: int, base_url: Optional[str] = None
 ) -> Dict[str, Any]:
     """
     Create a tag hierarchy by sending a POST request.
@@ -186,7 +214,7 @@ def create_tag_hierarchy(
     Args:
         parent_tag_id (int): The ID of the parent tag.
         child_tag_id (int): The ID of the child tag.
-        base_url (str): The base URL of the API (default: "http://localhost:37238").
+        base_url (Optional[str]): The base URL of the API (default: the shared client's base URL).
 
     Returns:
         Dict[str, Any]: The response from the server as a JSON object.
@@ -195,15 +223,15 @@ def create_tag_hierarchy(
         >>> create_tag_hierarchy(10, 5)
         {"message": "Tag hierarchy entry added successfully"}
     """
-    url = f"{base_url}/tags/hierarchy"
-    headers = {"Content-Type": "application/json"}
+    url = get_client().url("/tags/hierarchy", base_url)
     hierarchy_data = {"parent_tag_id": parent_tag_id, "child_tag_id": child_tag_id}
-    response = requests.post(url, json=hierarchy_data, headers=headers)
-    return response.json()
+    response = get_client().post(url, json=hierarchy_data)
+    _forget_tag_closure(base_url)
+    return parse_response(response)
 
 
 def update_tag_hierarchy(
-    tag_id: int, parent_tag_id: int, base_url: str = "http://localhost:37238"
+    tag_id: int, parent_tag_id: int, base_url: Optional[str] = None
 ) -> Dict[str, Any]:
     """
     Update the hierarchy of a tag by sending a PUT request.
@@ -211,7 +239,7 @@ def update_tag_hierarchy(
     Args:
         tag_id (int): The ID of the tag to update.
         parent_tag_id (int): The ID of the parent tag to associate.
-        base_url (str): The base URL of the API (default: "http://localhost:37238").
+        base_url (Optional[str]): The base URL of the API (default: the shared client's base URL).
 
     Returns:
         Dict[str, Any]: The response from the server as a JSON object.
@@ -220,22 +248,22 @@ def update_tag_hierarchy(
         >>> update_tag_hierarchy(5, 4)
         {"message": "Tag hierarchy entry updated successfully"}
     """
-    url = f"{base_url}/tags/hierarchy/{tag_id}"
-    headers = {"Content-Type": "application/json"}
+    url = get_client().url(f"/tags/hierarchy/{tag_id}", base_url)
     hierarchy_data = {"parent_tag_id": parent_tag_id}
-    response = requests.put(url, json=hierarchy_data, headers=headers)
-    return response.json()
+    response = get_client().put(url, json=hierarchy_data)
+    _forget_tag_closure(base_url)
+    return parse_response(response)
 
 
 def delete_tag_hierarchy_entry(
-    tag_hierarchy_id: int, base_url: str = "http://localhost:37238"
+    tag_hierarchy_id: int, base_url: Optional[str] = None
 ) -> Dict[str, str]:
     """
     Delete a tag hierarchy entry by sending a DELETE request.
 
     Args:
         tag_hierarchy_id (int): The ID of the tag hierarchy entry to delete.
-        base_url (str): The base URL of the API (default: "http://localhost:37238").
+        base_url (Optional[str]): The base URL of the API (default: the shared client's base URL).
 
     Returns:
         Dict[str, str]: The response from the server as a JSON object.
@@ -244,19 +272,20 @@ def delete_tag_hierarchy_entry(
         >>> delete_tag_hierarchy_entry(3)
         {"message": "Tag hierarchy entry deleted successfully"}
     """
-    url = f"{base_url}/tags/hierarchy/{tag_hierarchy_id}"
-    response = requests.delete(url)
-    return response.json()
+    url = get_client().url(f"/tags/hierarchy/{tag_hierarchy_id}", base_url)
+    response = get_client().delete(url)
+    _forget_tag_closure(base_url)
+    return parse_response(response)
 
 
 def list_tags_with_notes(
-    base_url: str = "http://localhost:37238",
+    base_url: Optional[str] = None,
 ) -> List[Dict[str, Any]]:
     """
     List the tags and the notes they contain by sending a GET request.
 
     Args:
-        base_url (str): The base URL of the API (default: "http://localhost:37238").
+        base_url (Optional[str]): The base URL of the API (default: the shared client's base URL).
 
     Returns:
         List[Dict[str, Any]]: A list of tags with their associated notes as a JSON object.
@@ -273,8 +302,287 @@ def list_tags_with_notes(
             ...
         ]
     """
-    url = f"{base_url}/tags/tree"
-    response = requests.get(url)
-    return response.json()
+    url = get_client().url("/tags/tree", base_url)
+    return get_client().get_json(url)
+
+
+class TagIndex:
+    """
+    A name to ID lookup for tags, built from a single `get_tags` request.
+
+    Tag names are not unique, so each name maps to every ID carrying it. The
+    index is refreshed when it is older than `ttl` seconds or when a lookup
+    misses, and `create_tag`, `update_tag` and `delete_tag` update it in place.
+
+    Args:
+        base_url (Optional[str]): The base URL of the API (default: the shared client's base URL).
+        ttl (float): Seconds before the index is considered stale.
+
+    Example:
+        >>> index = TagIndex()
+        >>> index.resolve("important")
+        1
+        >>> index.ids("important")
+        [1, 5]
+    """
+
+    def __init__(
+        self, base_url: Optional[str] = None, ttl: float = DEFAULT_TAG_INDEX_TTL
+    ):
+        self.base_url = base_url
+        self.ttl = ttl
+        self._ids: Dict[str, List[int]] = {}
+        self._names: Dict[int, str] = {}
+        self._loaded_at: Optional[float] = None
+
+    def refresh(self) -> None:
+        """Rebuild the index from the server."""
+        self._ids.clear()
+        self._names.clear()
+        for tag in get_tags(self.base_url):
+            self.add(tag["id"], tag["name"])
+        self._loaded_at = time.monotonic()
+
+    def _is_stale(self) -> bool:
+        return self._loaded_at is None or time.monotonic() - self._loaded_at > self.ttl
+
+    def ids(self, name: str) -> List[int]:
+        """
+        Return the IDs of every tag with the given name.
+
+        Args:
+            name (str): The name of the tag.
+
+        Returns:
+            List[int]: The matching tag IDs, empty if no tag has the name.
+        """
+        if self._is_stale() or name not in self._ids:
+            self.refresh()
+        return list(self._ids.get(name, []))
+
+    def resolve(self, name: str) -> Optional[int]:
+        """
+        Return the ID of the first tag with the given name.
+
+        Args:
+            name (str): The name of the tag.
+
+        Returns:
+            Optional[int]: The tag ID, or None if no tag has the name.
+        """
+        ids = self.ids(name)
+        return ids[0] if ids else None
+
+    def name(self, tag_id: int) -> Optional[str]:
+        """
+        Return the name of the tag with the given ID.
+
+        Args:
+            tag_id (int): The ID of the tag.
+
+        Returns:
+            Optional[str]: The tag name, or None if no tag has the ID.
+        """
+        if self._is_stale() or tag_id not in self._names:
+            self.refresh()
+        return self._names.get(tag_id)
+
+    def add(self, tag_id: int, name: str) -> None:
+        """Record a tag, replacing any previous name for its ID."""
+        self.remove(tag_id)
+        self._names[tag_id] = name
+        self._ids.setdefault(name, []).append(tag_id)
+
+    def remove(self, tag_id: int) -> None:
+        """Forget a tag by its ID."""
+        name = self._names.pop(tag_id, None)
+        if name is None:
+            return
+        self._ids[name].remove(tag_id)
+        if not self._ids[name]:
+            del self._ids[name]
+
+
+_tag_indexes: Dict[str, TagIndex] = {}
+
+
+def get_tag_index(base_url: Optional[str] = None) -> TagIndex:
+    """
+    Return the shared tag index for a server, creating it on first use.
+
+    Args:
+        base_url (Optional[str]): The base URL of the API (default: the shared client's base URL).
+
+    Returns:
+        TagIndex: The shared index.
+    """
+    root = base_url or get_client().base_url
+    if root not in _tag_indexes:
+        _tag_indexes[root] = TagIndex(base_url)
+    return _tag_indexes[root]
+
+
+def ensure_tag(tag_name: str, base_url: Optional[str] = None) -> int:
+    """
+    Return the ID of the tag with the given name, creating the tag if there is none.
+
+    Args:
+        tag_name (str): The name of the tag.
+        base_url (Optional[str]): The base URL of the API (default: the shared client's base URL).
+
+    Returns:
+        int: The ID of the existing or new tag.
+
+    Example:
+        >>> ensure_tag("important")
+        1
+    """
+    tag_id = get_tag_index(base_url).resolve(tag_name)
+    if tag_id is None:
+        tag_id = create_tag(tag_name, base_url)["id"]
+    return tag_id
+
+
+class TagClosure:
+    """
+    Every tag's descendants, precomputed from the tag tree.
+
+    One pass over `list_tags_with_notes` (/tags/tree) records, for each tag,
+    the set of tags at or below it, so matching a tag together with all of
+    its descendants is a dictionary lookup rather than a walk of the tree on
+    every query. A tag placed under several parents is merged into one
+    entry, and its descendants count towards each of them.
+
+    Args:
+        tree (List[Dict[str, Any]]): The tag tree, as returned by `list_tags_with_notes`.
+
+    Example:
+        >>> closure = TagClosure(list_tags_with_notes())
+        >>> closure.descendants(1)
+        frozenset({1, 2, 3})
+        >>> closure.note_ids("project")
+        {2, 4, 9}
+    """
+
+    def __init__(self, tree: List[Dict[str, Any]]):
+        self._ids: Dict[str, List[int]] = {}
+        self._notes: Dict[int, Set[int]] = {}
+        self._titles: Dict[int, str] = {}
+        children: Dict[int, Set[int]] = {}
+
+        stack = [(node, None) for node in tree]
+        while stack:
+            node, parent = stack.pop()
+            tag_id = node["id"]
+            if tag_id not in self._notes:
+                self._ids.setdefault(node["name"], []).append(tag_id)
+                self._notes[tag_id] = set()
+                children[tag_id] = set()
+            for note in node.get("notes") or []:
+                self._notes[tag_id].add(note["id"])
+                self._titles[note["id"]] = note["title"]
+            if parent is not None:
+                children[parent].add(tag_id)
+            stack.extend((child, tag_id) for child in node.get("children") or [])
+
+        # Children before parents, so each tag's descendants are the union of
+        # its children's, already complete
+        self._descendants: Dict[int, FrozenSet[int]] = {}
+        for tag_id in _post_order(children):
+            below = {tag_id}
+            for child in children[tag_id]:
+                below |= self._descendants.get(child, frozenset())
+            self._descendants[tag_id] = frozenset(below)
+
+    def ids(self, name: str) -> List[int]:
+        """Return the IDs of every tag with the given name."""
+        return list(self._ids.get(name, []))
+
+    def descendants(self, tag_id: int) -> FrozenSet[int]:
+        """Return the tag and every tag below it, empty if the tag is unknown."""
+        return self._descendants.get(tag_id, frozenset())
+
+    def expand(self, name: str, exact: bool = False) -> Set[int]:
+        """
+        Return the IDs of the tags a query for a name matches.
+
+        Args:
+            name (str): The name of the tag.
+            exact (bool): Only match tags with the name, not their descendants.
+
+        Returns:
+            Set[int]: The matching tag IDs, empty if no tag has the name.
+        """
+        if exact:
+            return set(self._ids.get(name, []))
+        tags: Set[int] = set()
+        for tag_id in self._ids.get(name, []):
+            tags |= self._descendants[tag_id]
+        return tags
+
+    def note_ids(self, name: str, exact: bool = False) -> Set[int]:
+        """Return the IDs of the notes tagged with the name, or with any tag below it."""
+        notes: Set[int] = set()
+        for tag_id in self.expand(name, exact):
+            notes |= self._notes[tag_id]
+        return notes
+
+    def notes(self, name: str, exact: bool = False) -> List[Dict[str, Any]]:
+        """Like `note_ids`, as 'id' and 'title' dictionaries sorted by ID."""
+        return [
+            {"id": note_id, "title": self._titles[note_id]}
+            for note_id in sorted(self.note_ids(name, exact))
+        ]
+
+
+def _post_order(children: Dict[int, Set[int]]) -> List[int]:
+    # Iterative, a deep hierarchy would otherwise hit the recursion limit.
+    # A cycle is cut where it closes rather than looping forever.
+    order: List[int] = []
+    visited: Set[int] = set()
+    for root in children:
+        if root in visited:
+            continue
+        visited.add(root)
+        stack = [(root, iter(children[root]))]
+        while stack:
+            tag_id, remaining = stack[-1]
+            child = next(remaining, None)
+            if child is None:
+                stack.pop()
+                order.append(tag_id)
+            elif child not in visited:
+                visited.add(child)
+                stack.append((child, iter(children[child])))
+    return order
+
+
+_tag_closures: Dict[str, Tuple[TagClosure, float]] = {}
+
+
+def _forget_tag_closure(base_url: Optional[str]) -> None:
+    _tag_closures.pop(base_url or get_client().base_url, None)
+
+
+def get_tag_closure(
+    base_url: Optional[str] = None, ttl: float = DEFAULT_TAG_INDEX_TTL
+) -> TagClosure:
+    """
+    Return the shared tag closure for a server, rebuilding it when older than `ttl` seconds.
 
+    Changing the hierarchy or assigning a tag through this module drops it,
+    so the next call sees the change.
 
+    Args:
+        base_url (Optional[str]): The base URL of the API (default: the shared client's base URL).
+        ttl (float): Seconds before the closure is rebuilt.
+
+    Returns:
+        TagClosure: The shared closure.
+    """
+    root = base_url or get_client().base_url
+    closure, built_at = _tag_closures.get(root, (None, 0.0))
+    if closure is None or time.monotonic() - built_at > ttl:
+        closure = TagClosure(list_tags_with_notes(base_url))
+        _tag_closures[root] = (closure, time.monotonic())
+    return closure
@@ -0,0 +1,576 @@
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Dict, Any, Iterable, List, Optional
+import requests
+from api_client import get_client
+from tasks import (
+    create_task_clock,
+    delete_task_clock,
+    get_tasks_details,
+    update_task_clock,
+)
+from utils import cache_dir
+
+# The format `clocks in` and `clocks out` send timestamps in
+CLOCK_FORMAT = "%Y-%m-%d %H:%M:%S"
+# Open clocks older than this are reported as left running by `audit_clocks`
+DEFAULT_MAX_OPEN_HOURS = 12.0
+ISSUES = ("inverted", "stale", "overlap")
+
+
+def default_state_path() -> Path:
+    return cache_dir() / "open_clocks.json"
+
+
+class OpenClocks:
+    """
+    The clocks currently open on a server, by task ID, kept in a small JSON file.
+
+    `clock_in` and `clock_out` keep the file up to date, so clocking out and
+    asking what is clocked in never download the task table. The file is
+    rebuilt from `get_tasks_details` by `reconcile`, which `clock_out` calls
+    when a task is missing from it, its clock was removed on the server, or
+    a later `sync` mirrored it closed elsewhere.
+
+    Args:
+        base_url (Optional[str]): The base URL of the API (default: the shared client's base URL).
+        path (Optional[Path]): The state file (default: open_clocks.json in the cache directory).
+
+    Example:
+        >>> OpenClocks().clocks
+        {3: {"clock_id": 12, "clock_in": "2024-10-21 09:00:00"}}
+    """
+
+    def __init__(self, base_url: Optional[str] = None, path: Optional[Path] = None):
+        self.base_url = base_url
+        self.path = Path(path) if path else default_state_path()
+        self._server = (base_url or get_client().base_url).rstrip("/")
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                self._state = json.load(f)
+        except (OSError, ValueError):
+            self._state = {}
+
+    @property
+    def clocks(self) -> Dict[int, Dict[str, Any]]:
+        """The open clocks on this server, by task ID."""
+        clocks = self._state.get(self._server, {}).get("clocks", {})
+        return {int(task_id): clock for task_id, clock in clocks.items()}
+
+    def get(self, task_id: int) -> Optional[Dict[str, Any]]:
+        return self.clocks.get(task_id)
+
+    def recorded_at(self, task_id: int) -> float:
+        """When the task's clock was last known to be open, as a Unix time."""
+        recorded = self._state.get(self._server, {}).get("recorded_at", {})
+        return recorded.get(str(task_id), 0.0)
+
+    def _save(
+        self, clocks: Dict[int, Dict[str, Any]], seen: Iterable[int] = ()
+    ) -> None:
+        # `seen` are the tasks whose clocks were just confirmed open
+        server = self._state.setdefault(self._server, {})
+        server["clocks"] = {str(task_id): clock for task_id, clock in clocks.items()}
+        now = time.time()
+        seen = {str(task_id) for task_id in seen}
+        server["recorded_at"] = {
+            key: now if key in seen else server.get("recorded_at", {}).get(key, 0.0)
+            for key in server["clocks"]
+        }
+        # Write then rename, so a hook running at the same time never reads
+        # a half written file
+        temporary = self.path.with_suffix(f".{os.getpid()}.tmp")
+        with open(temporary, "w", encoding="utf-8") as f:
+            json.dump(self._state, f)
+        os.replace(temporary, self.path)
+
+    def open(self, task_id: int, clock_id: int, clock_in: str) -> None:
+        clocks = self.clocks
+        clocks[task_id] = {"clock_id": clock_id, "clock_in": clock_in}
+        self._save(clocks, [task_id])
+
+    def close(self, task_id: int) -> None:
+        clocks = self.clocks
+        clocks.pop(task_id, None)
+        self._save(clocks)
+
+    def reconcile(self) -> Dict[int, Dict[str, Any]]:
+        """
+        Rebuild the open clocks from the server.
+
+        A task's clock is open when its latest clock has no clock out.
+
+        Returns:
+            Dict[int, Dict[str, Any]]: The open clocks, by task ID.
+        """
+        clocks = {}
+        for task in get_tasks_details(self.base_url):
+            task_clocks = task.get("clocks") or []
+            if task_clocks and not task_clocks[-1].get("clock_out"):
+                latest = task_clocks[-1]
+                clocks[task["id"]] = {
+                    "clock_id": latest["id"],
+                    "clock_in": latest["clock_in"],
+                }
+        self._save(clocks, clocks)
+        return clocks
+
+    def closed_since(self, task_id: int) -> bool:
+        """
+        Whether the local mirror, synced since the task's clock was recorded, has it closed.
+
+        The clock may have been closed on another machine or in the web UI,
+        which this file never hears about.
+        """
+        from store import LocalStore, default_store_path
+
+        clock = self.get(task_id)
+        path = default_store_path()
+        if clock is None or not path.exists():
+            return False
+        store = LocalStore(path)
+        try:
+            synced = store.synced()
+            if synced is None or synced["base_url"] != self._server:
+                return False
+            if synced["at"] <= self.recorded_at(task_id):
+                return False
+            mirrored = store.get_clock(clock["clock_id"])
+        finally:
+            store.close()
+        return mirrored is None or bool(mirrored.get("clock_out"))
+
+
+def clock_in(
+    task_id: int, base_url: Optional[str] = None, state: Optional[OpenClocks] = None
+) -> Dict[str, Any]:
+    """
+    Open a clock on a task now and record it as open.
+
+    Args:
+        task_id (int): The ID of the task.
+        base_url (Optional[str]): The base URL of the API (default: the shared client's base URL).
+        state (Optional[OpenClocks]): The open clocks (default: those in the cache directory).
+
+    Returns:
+        Dict[str, Any]: The new clock with its 'id', 'task_id', 'clock_in' and 'clock_out'.
+
+    Example:
+        >>> clock_in(3)
+        {"id": 12, "task_id": 3, "clock_in": "2024-10-21 09:00:00", "clock_out": None}
+    """
+    state = state or OpenClocks(base_url)
+    now = datetime.now().strftime(CLOCK_FORMAT)
+    result = create_task_clock(task_id, now, None, base_url)
+    state.open(task_id, result["id"], now)
+    return {"id": result["id"], "task_id": task_id, "clock_in": now, "clock_out": None}
+
+
+def clock_out(
+    task_id: int, base_url: Optional[str] = None, state: Optional[OpenClocks] = None
+) -> Optional[Dict[str, Any]]:
+    """
+    Close the open clock on a task now.
+
+    The clock is looked up in the local state, so this is a single PUT. Only
+    when the task has no open clock there, the server no longer has that
+    clock, or a `sync` since it was recorded mirrored it closed, are the open
+    clocks reconciled with the server, so a clock closed elsewhere is never
+    given a second clock out.
+
+    Args:
+        task_id (int): The ID of the task.
+        base_url (Optional[str]): The base URL of the API (default: the shared client's base URL).
+        state (Optional[OpenClocks]): The open clocks (default: those in the cache directory).
+
+    Returns:
+        Optional[Dict[str, Any]]: The closed clock, or None if the task is not clocked in.
+
+    Example:
+        >>> clock_out(3)
+        {"id": 12, "task_id": 3, "clock_in": "2024-10-21 09:00:00", "clock_out": "2024-10-21 10:30:00"}
+    """
+    state = state or OpenClocks(base_url)
+    now = datetime.now().strftime(CLOCK_FORMAT)
+    for attempt in ("local", "reconciled"):
+        if attempt == "local":
+            clock = None if state.closed_since(task_id) else state.get(task_id)
+        else:
+            clock = state.reconcile().get(task_id)
+        if clock is None:
+            continue
+        try:
+            update_task_clock(
+                clock["clock_id"], {"clock_out": now}, base_url, check=True
+            )
+        except requests.HTTPError as e:
+            if attempt == "reconciled" or e.response.status_code != 404:
+                raise
+            continue
+        state.close(task_id)
+        return {
+            "id": clock["clock_id"],
+            "task_id": task_id,
+            "clock_in": clock["clock_in"],
+            "clock_out": now,
+        }
+    return None
+
+
+# Reports
+
+REPORT_GROUPS = ("task", "note", "tag", "day", "week", "month")
+
+
+def _local_offsets(epochs: Any) -> Any:
+    import polars as pl
+
+    # The local UTC offset, in seconds, at each Unix time. Zones only change
+    # offset on a quarter hour, so it is looked up once per quarter hour.
+    quarters = epochs // 900
+    offsets = {
+        quarter: int(
+            datetime.fromtimestamp(quarter * 900, timezone.utc)
+            .astimezone()
+            .utcoffset()
+            .total_seconds()
+        )
+        for quarter in quarters.drop_nulls().unique()
+    }
+    return quarters.replace_strict(offsets, default=None, return_dtype=pl.Int64)
+
+
+def _parse_timestamp(column: str) -> Any:
+    import polars as pl
+
+    # Clocks hold both ISO 8601 timestamps and the CLI's own format. Cutting
+    # both down to whole seconds lets one fixed format parse them, which is
+    # about three times faster than matching fractions and suffixes.
+    moment = (
+        pl.col(column)
+        .str.slice(0, 19)
+        .str.replace("T", " ", literal=True)
+        .str.to_datetime("%Y-%m-%d %H:%M:%S", time_unit="us", strict=False)
+    )
+    # A time zone after the seconds is converted to local time, as
+    # `utils.parse_datetime` does, and a timestamp without one is left as is
+    zone = (
+        pl.col(column)
+        .str.slice(19)
+        .str.extract_groups(r"^(?:\.\d+)?(?:(Z)|([+-])(\d{2}):?(\d{2}))$")
+    )
+    offset = (
+        pl.when(zone.struct[0] == "Z")
+        .then(0)
+        .when(zone.struct[1].is_not_null())
+        .then(
+            pl.when(zone.struct[1] == "-").then(-1).otherwise(1)
+            * (
+                zone.struct[2].cast(pl.Int64) * 3600
+                + zone.struct[3].cast(pl.Int64) * 60
+            )
+        )
+    )
+    utc = moment.dt.epoch("s") - offset
+    local = utc + utc.map_batches(_local_offsets, return_dtype=pl.Int64)
+    return (
+        pl.when(offset.is_null())
+        .then(moment)
+        .otherwise(pl.from_epoch(local, time_unit="s").cast(pl.Datetime("us")))
+        .alias(column)
+    )
+
+
+def clocks_frame(tasks: List[Dict[str, Any]]) -> Any:
+    """
+    Flatten the clocks of every task into a lazy frame, one row per clock.
+
+    Args:
+        tasks (List[Dict[str, Any]]): Tasks as returned by `get_tasks_details`.
+
+    Returns:
+        pl.LazyFrame: Columns 'task_id', 'note_id', 'id', 'clock_in' and 'clock_out',
+        the timestamps parsed as datetimes.
+    """
+    import polars as pl
+
+    clock = pl.Struct({"id": pl.Int64, "clock_in": pl.String, "clock_out": pl.String})
+    schema = {"id": pl.Int64, "note_id": pl.Int64, "clocks": pl.List(clock)}
+    return (
+        pl.LazyFrame(tasks, schema=schema)
+        .rename({"id": "task_id"})
+        .explode("clocks")
+        .drop_nulls("clocks")
+        .unnest("clocks")
+        .with_columns(_parse_timestamp("clock_in"), _parse_timestamp("clock_out"))
+    )
+
+
+def note_tags_frame(tags_with_notes: List[Dict[str, Any]]) -> Any:
+    """
+    Flatten `get_tags_with_notes` into a lazy frame of 'note_id' and 'tag' pairs.
+    """
+    import polars as pl
+
+    rows = [
+        {"note_id": note["id"], "tag": tag.get("tag_name", tag.get("name"))}
+        for tag in tags_with_notes
+        for note in tag.get("notes") or []
+    ]
+    return pl.LazyFrame(rows, schema={"note_id": pl.Int64, "tag": pl.String})
+
+
+def clock_report(
+    clocks: Any,
+    by: List[str],
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    note_tags: Optional[Any] = None,
+    now: Optional[datetime] = None,
+) -> Any:
+    """
+    Total the time clocked, grouped by task, note, tag, day, ISO week or month.
+
+    The date range is applied to the clock-in times before anything else, so
+    later steps only see the clocks in range. Open clocks count up to `now`.
+    A clock on a note with several tags counts towards each of them.
+
+    Args:
+        clocks (pl.LazyFrame): Clocks as built by `clocks_frame`.
+        by (List[str]): The groups, any of `REPORT_GROUPS`, e.g. ["week", "task"].
+        since (Optional[datetime]): Only count clocks in at or after this time.
+        until (Optional[datetime]): Only count clocks in before this time.
+        note_tags (Optional[pl.LazyFrame]): Pairs from `note_tags_frame`, needed to group by tag.
+        now (Optional[datetime]): The end of open clocks (default: the current time).
+
+    Returns:
+        pl.DataFrame: The group columns followed by 'clocks' and 'hours', sorted by the groups.
+
+    Example:
+        >>> clock_report(clocks_frame(get_tasks_details()), ["month"])
+        shape: (2, 3)
+        ┌─────────┬────────┬───────┐
+        │ month   ┆ clocks ┆ hours │
+        ╞═════════╪════════╪═══════╡
+        │ 2024-09 ┆ 41     ┆ 62.5  │
+        │ 2024-10 ┆ 37     ┆ 58.25 │
+        └─────────┴────────┴───────┘
+    """
+    import polars as pl
+
+    unknown = [group for group in by if group not in REPORT_GROUPS]
+    if unknown:
+        raise ValueError(f"Cannot group clocks by {', '.join(unknown)}.")
+    if "tag" in by and note_tags is None:
+        raise ValueError("Grouping by tag needs the tags of each note.")
+
+    if since is not None:
+        clocks = clocks.filter(pl.col("clock_in") >= since)
+    if until is not None:
+        clocks = clocks.filter(pl.col("clock_in") < until)
+    end = pl.col("clock_out").fill_null(pl.lit(now or datetime.now()))
+    clocks = clocks.with_columns(
+        ((end - pl.col("clock_in")).dt.total_seconds() / 3600).alias("hours")
+    )
+    if "tag" in by:
+        clocks = clocks.join(note_tags, on="note_id", how="left")
+
+    # Periods are grouped on truncated datetimes and only labelled once
+    # aggregated, formatting every clock is far slower
+    keys = {
+        "task": pl.col("task_id"),
+        "note": pl.col("note_id"),
+        "tag": pl.col("tag"),
+        "day": pl.col("clock_in").dt.date().alias("day"),
+        "week": pl.col("clock_in").dt.truncate("1w").alias("week"),
+        "month": pl.col("clock_in").dt.truncate("1mo").alias("month"),
+    }
+    labels = {
+        "week": pl.col("week").dt.strftime("%G-W%V"),
+        "month": pl.col("month").dt.strftime("%Y-%m"),
+    }
+    names = ["task_id" if g == "task" else "note_id" if g == "note" else g for g in by]
+    if not by:
+        report = clocks.select(pl.len().alias("clocks"), pl.col("hours").sum())
+    else:
+        report = (
+            clocks.group_by([keys[group] for group in by])
+            .agg(pl.len().alias("clocks"), pl.col("hours").sum())
+            .sort(names)
+            .with_columns([labels[group] for group in by if group in labels])
+        )
+    return report.with_columns(pl.col("hours").round(2)).collect()
+
+
+# Audit
+
+
+def audit_clocks(
+    clocks: Any,
+    max_open_hours: float = DEFAULT_MAX_OPEN_HOURS,
+    now: Optional[datetime] = None,
+) -> Any:
+    """
+    Find the clocks that inflate reports and work out how to correct each of them.
+
+    Three kinds of problem are found, and corrected in this order so the
+    corrections build on each other:
+
+    - 'inverted': the clock out is before the clock in, the two are swapped.
+    - 'stale': the clock was left open for more than `max_open_hours`, it is
+      closed after `max_open_hours` or when the task is next clocked in.
+    - 'overlap': the clock starts before an earlier clock, on any task, ends.
+      A clock entirely inside another is deleted, otherwise its clock in is
+      moved to where the earlier clock ends. The time covered stays the
+      same, but is no longer counted twice.
+
+    Overlaps are found by one sweep over the clocks sorted by clock in,
+    comparing each with the latest clock out before it, so auditing n clocks
+    is O(n log n) and runs as a single lazy query. Clocks still running are
+    swept up to `now`, and are only ever moved, never deleted or closed. No
+    clock is ever closed after `now`, and clocks starting after it are left
+    alone.
+
+    Args:
+        clocks (pl.LazyFrame): Clocks as built by `clocks_frame`.
+        max_open_hours (float): How long a clock may stay open before it is stale.
+        now (Optional[datetime]): The current time (default: the current time).
+
+    Returns:
+        pl.DataFrame: One row per clock with a problem, sorted by clock in, with
+        'clock_id', 'task_id', 'issues', 'clock_in', 'clock_out', then the
+        correction as 'action' ("update" or "delete"), 'new_clock_in' and
+        'new_clock_out', the last two null when unchanged.
+
+    Example:
+        >>> audit_clocks(clocks_frame(get_tasks_details()))
+        shape: (1, 8)
+        ┌──────────┬─────────┬──────────┬─────────────────────┬─────┬────────┬─────────────────────┬─────────────────────┐
+        │ clock_id ┆ task_id ┆ issues   ┆ clock_in            ┆ ... ┆ action ┆ new_clock_in        ┆ new_clock_out       │
+        ╞══════════╪═════════╪══════════╪═════════════════════╪═════╪════════╪═════════════════════╪═════════════════════╡
+        │ 12       ┆ 3       ┆ inverted ┆ 2024-10-21 10:00:00 ┆ ... ┆ update ┆ 2024-10-21 09:00:00 ┆ 2024-10-21 10:00:00 │
+        └──────────┴─────────┴──────────┴─────────────────────┴─────┴────────┴─────────────────────┴─────────────────────┘
+    """
+    import polars as pl
+
+    now = now or datetime.now()
+    limit = timedelta(hours=max_open_hours)
+    start, end = pl.col("start"), pl.col("end")
+    inverted = pl.col("clock_out") < pl.col("clock_in")
+    is_open = pl.col("clock_out").is_null()
+    running = is_open & (pl.lit(now) - start <= limit)
+    stale = is_open & ~running
+    # The latest clock out of every clock sorted before this one
+    covered = end.cum_max().shift(1)
+
+    frame = (
+        clocks.drop_nulls("clock_in")
+        .with_columns(
+            inverted.fill_null(False).alias("inverted"),
+            pl.min_horizontal("clock_in", "clock_out").alias("start"),
+            pl.max_horizontal("clock_in", "clock_out").alias("end"),
+        )
+        .with_columns(running.alias("running"), stale.alias("stale"))
+        # Nothing is known yet of a clock that starts after now
+        .filter(start <= now)
+        .sort("start")
+        .with_columns(start.shift(-1).over("task_id").alias("next_start"))
+        .with_columns(
+            pl.when("running")
+            .then(pl.max_horizontal(pl.lit(now), start))
+            .when("stale")
+            .then(pl.min_horizontal(start + limit, "next_start", pl.lit(now)))
+            .otherwise(pl.min_horizontal(end, pl.lit(now)))
+            .alias("end")
+        )
+        .sort("start", "end")
+        .with_columns(covered.alias("covered"))
+        .with_columns(
+            (start < pl.col("covered")).fill_null(False).alias("overlap"),
+            (end <= pl.col("covered")).fill_null(False).alias("inside"),
+        )
+        # A running clock inside another is left alone
+        .filter(~(pl.col("running") & pl.col("inside")))
+        .with_columns(
+            (pl.col("overlap") & pl.col("inside")).alias("delete"),
+            pl.when("overlap").then("covered").otherwise(start).alias("start"),
+        )
+        .filter(pl.col("inverted") | pl.col("stale") | pl.col("overlap"))
+    )
+    issues = pl.concat_list(
+        pl.when(pl.col(issue)).then(pl.lit(issue)) for issue in ISSUES
+    ).list.drop_nulls()
+    moved_in = ~pl.col("delete") & start.ne_missing(pl.col("clock_in"))
+    moved_out = ~pl.col("delete") & ~pl.col("running")
+    moved_out &= end.ne_missing(pl.col("clock_out"))
+    return frame.select(
+        pl.col("id").alias("clock_id"),
+        "task_id",
+        issues.list.join(", ").alias("issues"),
+        "clock_in",
+        "clock_out",
+        pl.when("delete")
+        .then(pl.lit("delete"))
+        .otherwise(pl.lit("update"))
+        .alias("action"),
+        pl.when(moved_in).then(start.dt.strftime(CLOCK_FORMAT)).alias("new_clock_in"),
+        pl.when(moved_out).then(end.dt.strftime(CLOCK_FORMAT)).alias("new_clock_out"),
+    ).collect()
+
+
+def fix_clocks(
+    issues: List[Dict[str, Any]], base_url: Optional[str] = None, workers: int = 8
+) -> Dict[str, Any]:
+    """
+    Apply the corrections found by `audit_clocks`, running up to `workers` requests at once.
+
+    Args:
+        issues (List[Dict[str, Any]]): Rows returned by `audit_clocks`.
+        base_url (Optional[str]): The base URL of the API (default: the shared client's base URL).
+        workers (int): The maximum number of concurrent requests.
+
+    Returns:
+        Dict[str, Any]: Counts of the clocks 'updated', 'deleted' and 'failed',
+        and the 'errors' as (clock ID, error) tuples.
+
+    Example:
+        >>> fix_clocks(audit_clocks(get_tasks_details()))
+        {"updated": 41, "deleted": 3, "failed": 0, "errors": []}
+    """
+    from bulk import ensure_pool_size
+
+    def fix(issue: Dict[str, Any]) -> Optional[str]:
+        changes = {
+            key: issue[f"new_{key}"]
+            for key in ("clock_in", "clock_out")
+            if issue[f"new_{key}"] is not None
+        }
+        try:
+            if issue["action"] == "delete":
+                response = delete_task_clock(issue["clock_id"], base_url)
+            elif changes:
+                response = update_task_clock(issue["clock_id"], changes, base_url)
+            else:
+                return None
+        except Exception as e:
+            return str(e)
+        return response.get("error") if isinstance(response, dict) else None
+
+    result = {"updated": 0, "deleted": 0, "failed": 0, "errors": []}
+    if not issues:
+        return result
+    ensure_pool_size(workers)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for issue, error in zip(issues, executor.map(fix, issues)):
+            if error:
+                result["failed"] += 1
+                result["errors"].append((issue["clock_id"], error))
+            elif issue["action"] == "delete":
+                result["deleted"] += 1
+            else:
+                result["updated"] += 1
+    return result
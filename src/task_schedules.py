@@ -0,0 +1,175 @@
+from datetime import datetime
+from typing import Any, Dict, List, NamedTuple, Optional
+from utils import parse_datetime
+
+
+class Schedule(NamedTuple):
+    id: Optional[int]
+    task_id: int
+    start: datetime
+    end: datetime
+
+    def overlaps(self, start: datetime, end: datetime) -> bool:
+        # Schedules that only touch, one ending as the next starts, do not overlap
+        return self.start < end and start < self.end
+
+
+def schedule_intervals(tasks: List[Dict[str, Any]]) -> List[Schedule]:
+    """
+    Flatten the schedules of every task, sorted by start.
+
+    Args:
+        tasks (List[Dict[str, Any]]): Tasks as returned by `get_tasks_details`.
+
+    Returns:
+        List[Schedule]: Every schedule with its task ID and parsed start and end.
+
+    Example:
+        >>> schedule_intervals(get_tasks_details())
+        [Schedule(id=1, task_id=3, start=datetime(2023, 6, 1, 9, 0), end=datetime(2023, 6, 1, 17, 0))]
+    """
+    schedules = [
+        Schedule(
+            s.get("id"),
+            task["id"],
+            parse_datetime(s["start_datetime"]),
+            parse_datetime(s["end_datetime"]),
+        )
+        for task in tasks
+        for s in task.get("schedules") or []
+        if s.get("start_datetime") and s.get("end_datetime")
+    ]
+    schedules.sort(key=lambda s: (s.start, s.end))
+    return schedules
+
+
+def find_conflicts(schedules: List[Schedule]) -> List[List[Schedule]]:
+    """
+    Group schedules into windows of overlapping schedules.
+
+    A single sweep over the schedules sorted by start, so this is O(n log n)
+    rather than comparing every pair. A window is a maximal run of schedules
+    each starting before the latest end seen so far; every schedule in it
+    overlaps at least one other.
+
+    Args:
+        schedules (List[Schedule]): The schedules, in any order.
+
+    Returns:
+        List[List[Schedule]]: The windows with two or more schedules, in time order.
+
+    Example:
+        >>> find_conflicts(schedule_intervals(get_tasks_details()))
+        [[Schedule(id=1, task_id=3, ...), Schedule(id=4, task_id=7, ...)]]
+    """
+    conflicts = []
+    window: List[Schedule] = []
+    window_end: Optional[datetime] = None
+    for schedule in sorted(schedules, key=lambda s: (s.start, s.end)):
+        if window_end is not None and schedule.start < window_end:
+            window.append(schedule)
+            window_end = max(window_end, schedule.end)
+            continue
+        if len(window) > 1:
+            conflicts.append(window)
+        window, window_end = [schedule], schedule.end
+    if len(window) > 1:
+        conflicts.append(window)
+    return conflicts
+
+
+class ScheduleIndex:
+    """
+    Schedules sorted by start, read as a balanced interval tree, for overlap queries.
+
+    The sorted list is taken as a binary search tree rooted at its middle,
+    each node keeping the latest end in its subtree. Building the index is
+    O(n log n). A query skips every subtree that ends by its start or starts
+    after its end, so it costs O(log n + k log n) for k overlapping
+    schedules however long the others are.
+
+    Args:
+        schedules (List[Schedule]): The schedules, in any order.
+
+    Example:
+        >>> index = ScheduleIndex(schedule_intervals(get_tasks_details()))
+        >>> index.overlapping(datetime(2023, 6, 1, 12), datetime(2023, 6, 1, 13))
+        [Schedule(id=1, task_id=3, start=datetime(2023, 6, 1, 9, 0), end=datetime(2023, 6, 1, 17, 0))]
+    """
+
+    def __init__(self, schedules: List[Schedule]):
+        self.schedules = sorted(schedules, key=lambda s: (s.start, s.end))
+        # The latest end in the subtree rooted at each position
+        self._max_ends = [s.end for s in self.schedules]
+        self._build(0, len(self.schedules))
+
+    def _build(self, lo: int, hi: int) -> Optional[datetime]:
+        if lo >= hi:
+            return None
+        mid = (lo + hi) // 2
+        for latest in (self._build(lo, mid), self._build(mid + 1, hi)):
+            if latest is not None and latest > self._max_ends[mid]:
+                self._max_ends[mid] = latest
+        return self._max_ends[mid]
+
+    def __len__(self) -> int:
+        return len(self.schedules)
+
+    def overlapping(self, start: datetime, end: datetime) -> List[Schedule]:
+        """
+        Return the schedules overlapping the interval from start to end, sorted by start.
+        """
+        found: List[Schedule] = []
+        self._collect(0, len(self.schedules), start, end, found)
+        return found
+
+    def _collect(
+        self, lo: int, hi: int, start: datetime, end: datetime, found: List[Schedule]
+    ) -> None:
+        # In order, so the schedules are found sorted by start
+        if lo >= hi:
+            return
+        mid = (lo + hi) // 2
+        if self._max_ends[mid] <= start:
+            return
+        self._collect(lo, mid, start, end, found)
+        schedule = self.schedules[mid]
+        if schedule.start < end:
+            if schedule.overlaps(start, end):
+                found.append(schedule)
+            self._collect(mid + 1, hi, start, end, found)
+
+
+def agenda(
+    schedules: List[Schedule], start: datetime, end: datetime
+) -> List[Dict[str, Any]]:
+    """
+    List the schedules between two times, flagging those that conflict.
+
+    A schedule conflicts when it overlaps any other schedule, including
+    ones that fall partly outside the agenda.
+
+    Args:
+        schedules (List[Schedule]): The schedules, in any order.
+        start (datetime): The start of the agenda.
+        end (datetime): The end of the agenda.
+
+    Returns:
+        List[Dict[str, Any]]: 'id', 'task_id', 'start', 'end' and 'conflict' for
+        each schedule overlapping the agenda, sorted by start.
+
+    Example:
+        >>> agenda(schedules, datetime(2023, 6, 1), datetime(2023, 6, 8))
+        [{"id": 1, "task_id": 3, "start": datetime(2023, 6, 1, 9, 0), "end": ..., "conflict": False}]
+    """
+    index = ScheduleIndex(schedules)
+    return [
+        {
+            **schedule._asdict(),
+            "conflict": any(
+                other is not schedule
+                for other in index.overlapping(schedule.start, schedule.end)
+            ),
+        }
+        for schedule in index.overlapping(start, end)
+    ]
@@ -1,17 +1,18 @@
 import requests
-from typing import Dict, Any, List
+from api_client import get_client, parse_response
+from typing import Dict, Any, Iterator, List, Optional
 from urllib.parse import quote
 
 
 def create_task(
-    task_data: Dict[str, Any], base_url: str = "http://localhost:37238"
+    task_data: Dict[str, Any], base_url: Optional[str] = None
 ) -> Dict[str, Any]:
     """
     Create a new task by sending a POST request to the specified endpoint.
 
     Args:
         task_data (Dict[str, Any]): A dictionary containing the task details.
-        base_url (str): The base URL of the API (default: "http://localhost:37238").
+        base_url (Optional[str]): The base URL of the API (default: the shared client's base URL).
 
     Returns:
         Dict[str, Any]: The response from the server as a JSON object.
@@ -29,19 +30,18 @@ def create_task(
             })
         {"id": 2, "message": "Task created successfully"}
     """
-    url = f"{base_url}/tasks"
-    headers = {"Content-Type": "application/json"}
-    response = requests.post(url, json=task_data, headers=headers)
+    url = get_client().url("/tasks", base_url)
+    response = get_client().post(url, json=task_data)
     try:
         response.raise_for_status()
     except requests.exceptions.HTTPError as e:
         print(f"Error response content: {response.content}")
         raise
-    return response.json()
+    return parse_response(response)
 
 
 def update_task(
-    task_id: int, update_data: Dict[str, Any], base_url: str = "http://localhost:37238"
+    task_id: int, update_data: Dict[str, Any], base_url: Optional[str] = None
 ) -> Dict[str, Any]:
     """
     Update a task by its ID by sending a PUT request to the specified endpoint.
@@ -49,7 +49,7 @@ def update_task(
     Args:
         task_id (int): The ID of the task to update.
         update_data (Dict[str, Any]): A dictionary containing the fields to update.
-        base_url (str): The base URL of the API (default: "http://localhost:37238").
+        base_url (Optional[str]): The base URL of the API (default: the shared client's base URL).
 
     Returns:
         Dict[str, Any]: The response from the server as a JSON object.
@@ -59,22 +59,18 @@ def update_task(
             1, {"status": "done", "actual_effort": 3.5, "priority": 4})
         {"id": 1, "message": "Task updated successfully"}
     """
-    url = f"{base_url}/tasks/{task_id}"
-    headers = {"Content-Type": "application/json"}
-    response = requests.put(url, json=update_data, headers=headers)
-    response.raise_for_status()  # Raise an exception for HTTP errors
-    return response.json()
+    url = get_client().url(f"/tasks/{task_id}", base_url)
+    response = get_client().put(url, json=update_data)
+    return parse_response(response, check=True)
 
 
-def delete_task(
-    task_id: int, base_url: str = "http://localhost:37238"
-) -> Dict[str, str]:
+def delete_task(task_id: int, base_url: Optional[str] = None) -> Dict[str, str]:
     """
     Delete a task by sending a DELETE request to the specified endpoint.
 
     Args:
         task_id (int): The ID of the task to delete.
-        base_url (str): The base URL of the API (default: "http://localhost:37238").
+        base_url (Optional[str]): The base URL of the API (default: the shared client's base URL).
 
     Returns:
         Dict[str, str]: The response from the server as a JSON object.
@@ -83,18 +79,17 @@ def delete_task(
         >>> delete_task(1)
         {"message": "Task deleted successfully"}
     """
-    url = f"{base_url}/tasks/{task_id}"
-    response = requests.delete(url)
-    response.raise_for_status()  # Raise an exception for HTTP errors
-    return response.json()
+    url = get_client().url(f"/tasks/{task_id}", base_url)
+    response = get_client().delete(url)
+    return parse_response(response, check=True)
 
 
-def get_tasks_details(base_url: str = "http://localhost:37238") -> List[Dict[str, Any]]:
+def get_tasks_details(base_url: Optional[str] = None) -> List[Dict[str, Any]]:
     """
     Retrieve the details of all tasks by sending a GET request to the specified endpoint.
 
     Args:
-        base_url (str): The base URL of the API (default: "http://localhost:37238").
+        base_url (Optional[str]): The base URL of the API (default: the shared client's base URL).
 
     Returns:
         List[Dict[str, Any]]: A list of task details as a JSON object.
@@ -111,18 +106,37 @@ def get_tasks_details(base_url: str = "http://localhost:37238") -> List[Dict[str
             ...
         ]
     """
-    url = f"{base_url}/tasks/details"
-    response = requests.get(url)
-    response.raise_for_status()  # Raise an exception for HTTP errors
-    return response.json()
+    url = get_client().url("/tasks/details", base_url)
+    return get_client().get_json(url, check=True)
 
 
-def get_tasks_tree(base_url: str = "http://localhost:37238") -> List[Dict[str, Any]]:
+def iter_tasks_details(base_url: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Stream the tasks with their schedules and clocks from the API, yielding one at a time.
+
+    Unlike `get_tasks_details`, the response is decoded as it arrives, so memory use
+    does not grow with the number of tasks. The response cache is bypassed.
+
+    Args:
+        base_url (Optional[str]): The base URL of the API (default: the shared client's base URL).
+
+    Yields:
+        Dict[str, Any]: The same records `get_tasks_details` returns.
+
+    Example:
+        >>> next(iter_tasks_details())
+        {"id": 2, "note_id": 1, "status": "todo", ..., "schedules": [...], "clocks": [...]}
+    """
+    url = get_client().url("/tasks/details", base_url)
+    return get_client().iter_json(url)
+
+
+def get_tasks_tree(base_url: Optional[str] = None) -> List[Dict[str, Any]]:
     """
     Retrieve the hierarchical structure of tasks by sending a GET request to the specified endpoint.
 
     Args:
-        base_url (str): The base URL of the API (default: "http://localhost:37238").
+        base_url (Optional[str]): The base URL of the API (default: the shared client's base URL).
 
     Returns:
         List[Dict[str, Any]]: A tree structure of tasks as a list of JSON objects.
@@ -151,14 +165,13 @@ def get_tasks_tree(base_url: str = "http://localhost:37238") -> List[Dict[str, A
             }
         ]
     """
-    url = f"{base_url}/tasks/tree"
-    response = requests.get(url)
-    response.raise_for_status()  # Raise an exception for HTTP errors
-    return response.json()
+    url = get_client().url("/tasks/tree", base_url)
+    response = get_client().get(url)
+    return parse_response(response, check=True)
 
 
 def create_task_schedule(
-    task_schedule_data: Dict[str, str], base_url: str = "http://localhost:37238"
+    task_schedule_data: Dict[str, str], base_url: Optional[str] = None
 ) -> Dict[str, Any]:
     """
     Create a new task schedule by sending a POST request to the API.
@@ -166,7 +179,7 @@ def create_task_schedule(
     Args:
         task_schedule_data (Dict[str, str]): A dictionary containing the task schedule data,
                                              e.g., {'task_id': 2, 'start_datetime': '2023-06-01T09:00:00Z', 'end_datetime': '2023-06-01T17:00:00Z'}.
-        base_url (str): The base URL of the API (default: "http://localhost:37238").
+        base_url (Optional[str]): The base URL of the API (default: the shared client's base URL).
 
     Returns:
         Dict[str, Any]: The response from the server as a JSON object.
@@ -179,16 +192,15 @@ def create_task_schedule(
             })
         {"id": 5, "message": "Task schedule created successfully"}
     """
-    url = f"{base_url}/task_schedules"
-    headers = {"Content-Type": "application/json"}
-    response = requests.post(url, json=task_schedule_data, headers=headers)
-    return response.json()
+    url = get_client().url("/task_schedules", base_url)
+    response = get_client().post(url, json=task_schedule_data)
+    return parse_response(response)
 
 
 def update_task_schedule(
     schedule_id: int,
     update_data: Dict[str, str],
-    base_url: str = "http://localhost:37238",
+    base_url: Optional[str] = None,
 ) -> Dict[str, Any]:
     """
     Update the details of a task schedule by sending a PUT request.
@@ -196,7 +208,7 @@ def update_task_schedule(
     Args:
         schedule_id (int): The ID of the task schedule to update.
         update_data (Dict[str, str]): A dictionary containing the data to update, e.g., {'start_datetime': '2022-06-02T10:00:00Z', 'end_datetime': '2022-06-02T18:00:00Z'}.
-        base_url (str): The base URL of the API (default: "http://localhost:37238").
+        base_url (Optional[str]): The base URL of the API (default: the shared client's base URL).
 
     Returns:
         Dict[str, Any]: The response from the server as a JSON object.
@@ -207,21 +219,20 @@ def update_task_schedule(
                     "end_datetime": "2022-06-02T18:00:00Z"})
         {"message": "Task schedule updated successfully"}
     """
-    url = f"{base_url}/task_schedules/{schedule_id}"
-    headers = {"Content-Type": "application/json"}
-    response = requests.put(url, json=update_data, headers=headers)
-    return response.json()
+    url = get_client().url(f"/task_schedules/{schedule_id}", base_url)
+    response = get_client().put(url, json=update_data)
+    return parse_response(response)
 
 
 def delete_task_schedule(
-    schedule_id: int, base_url: str = "http://localhost:37238"
+    schedule_id: int, base_url: Optional[str] = None
 ) -> Dict[str, Any]:
     """
     Delete a task schedule by sending a DELETE request.
 
     Args:
         schedule_id (int): The ID of the task schedule to delete.
-        base_url (str): The base URL of the API (default: "http://localhost:37238").
+        base_url (Optional[str]): The base URL of the API (default: the shared client's base URL).
 
     Returns:
         Dict[str, Any]: The response from the server as a JSON object.
@@ -230,16 +241,16 @@ def delete_task_schedule(
         >>> delete_task_schedule(1)
         {"message":"Task schedule deleted successfully"}
     """
-    url = f"{base_url}/task_schedules/{schedule_id}"
-    response = requests.delete(url)
-    return response.json()
+    url = get_client().url(f"/task_schedules/{schedule_id}", base_url)
+    response = get_client().delete(url)
+    return parse_response(response)
 
 
 def create_task_clock(
     task_id: int,
     clock_in: str,
     clock_out: str,
-    base_url: str = "http://localhost:37238",
+    base_url: Optional[str] = None,
 ) -> Dict[str, Any]:
     """
     Create a task clock entry by sending a POST request.
@@ -248,7 +259,7 @@ def create_task_clock(
         task_id (int): The ID of the task to create a clock entry for.
         clock_in (str): ISO 8601 formatted string representing the clock-in time.
         clock_out (str): ISO 8601 formatted string representing the clock-out time.
-        base_url (str): The base URL of the API (default: "http://localhost:37238").
+        base_url (Optional[str]): The base URL of the API (default: the shared client's base URL).
 
     Returns:
         Dict[str, Any]: The response from the server as a JSON object.
@@ -261,18 +272,17 @@ def create_task_clock(
         )
         {"id": 2, "message": "Task clock entry created successfully"}
     """
-    url = f"{base_url}/task_clocks"
-    headers = {"Content-Type": "application/json"}
+    url = get_client().url("/task_clocks", base_url)
     data = {"task_id": task_id, "clock_in": clock_in, "clock_out": clock_out}
-    response = requests.post(url, json=data, headers=headers)
-    response.raise_for_status()  # Raise an error if the response is not successful
-    return response.json()
+    response = get_client().post(url, json=data)
+    return parse_response(response, check=True)
 
 
 def update_task_clock(
     task_clock_id: int,
     update_data: Dict[str, str],
-    base_url: str = "http://localhost:37238",
+    base_url: Optional[str] = None,
+    check: bool = False,
 ) -> Dict[str, Any]:
     """
     Update a task clock entry by sending a PUT request.
@@ -281,7 +291,8 @@ def update_task_clock(
         task_clock_id (int): The ID of the task clock to update.
         update_data (Dict[str, str]): A dictionary containing the data to update,
                                        e.g., {'clock_in': '2023-05-20T09:00:00Z', 'clock_out': '2023-05-20T17:00:00Z'}.
-        base_url (str): The base URL of the API (default: "http://localhost:37238").
+        base_url (Optional[str]): The base URL of the API (default: the shared client's base URL).
+        check (bool): Raise an error if the server rejects the update.
 
     Returns:
         Dict[str, Any]: The response from the server as a JSON object.
@@ -291,21 +302,20 @@ def update_task_clock(
                 1, {"clock_in": "2023-05-20T09:00:00Z", "clock_out": "2023-05-20T17:00:00Z"})
         {"message": "Task clock entry updated successfully"}
     """
-    url = f"{base_url}/task_clocks/{task_clock_id}"
-    headers = {"Content-Type": "application/json"}
-    response = requests.put(url, json=update_data, headers=headers)
-    return response.json()
+    url = get_client().url(f"/task_clocks/{task_clock_id}", base_url)
+    response = get_client().put(url, json=update_data)
+    return parse_response(response, check)
 
 
 def delete_task_clock(
-    task_clock_id: int, base_url: str = "http://localhost:37238"
+    task_clock_id: int, base_url: Optional[str] = None
 ) -> Dict[str, Any]:
     """
     Delete a task clock entry by sending a DELETE request.
 
     Args:
         task_clock_id (int): The ID of the task clock to delete.
-        base_url (str): The base URL of the API (default: "http://localhost:37238").
+        base_url (Optional[str]): The base URL of the API (default: the shared client's base URL).
 
     Returns:
         Dict[str, Any]: The response from the server as a JSON object.
@@ -314,20 +324,20 @@ def delete_task_clock(
         >>> delete_task_clock(1)
         {"message": "Task clock entry deleted successfully"}
     """
-    url = f"{base_url}/task_clocks/{task_clock_id}"
-    response = requests.delete(url)
-    return response.json()
+    url = get_client().url(f"/task_clocks/{task_clock_id}", base_url)
+    response = get_client().delete(url)
+    return parse_response(response)
 
 
 def get_task_clocks(
-    task_id: int, base_url: str = "http://localhost:37238"
+    task_id: int, base_url: Optional[str] = None
 ) -> List[Dict[str, Any]]:
     """
     Retrieve clock entries for a specific task.
 
     Args:
         task_id (int): The ID of the task to get clock entries for.
-        base_url (str): The base URL of the API (default: "http://localhost:37238").
+        base_url (Optional[str]): The base URL of the API (default: the shared client's base URL).
 
     Returns:
         List[Dict[str, Any]]: A list of clock entries for the specified task.
@@ -344,7 +354,7 @@ def get_task_clocks(
 def update_task_hierarchy(
     child_id: int,
     hierarchy_data: Dict[str, Any],
-    base_url: str = "http://localhost:37238",
+    base_url: Optional[str] = None,
 ) -> Dict[str, Any]:
     """
     Update the hierarchy of a task.
@@ -352,13 +362,11 @@ def update_task_hierarchy(
     Args:
         child_id (int): The ID of the child task.
         hierarchy_data (Dict[str, Any]): A dictionary containing the hierarchy data to update.
-        base_url (str): The base URL of the API.
+        base_url (Optional[str]): The base URL of the API (default: the shared client's base URL).
 
     Returns:
         Dict[str, Any]: The response from the server as a JSON object.
     """
-    url = f"{base_url}/tasks/{child_id}/hierarchy"
-    headers = {"Content-Type": "application/json"}
-    response = requests.put(url, json=hierarchy_data, headers=headers)
-    response.raise_for_status()
-    return response.json()
+    url = get_client().url(f"/tasks/{child_id}/hierarchy", base_url)
+    response = get_client().put(url, json=hierarchy_data)
+    return parse_response(response, check=True)
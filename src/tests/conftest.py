@@ -0,0 +1,6 @@
+import os
+import tempfile
+
+# Keep the response cache, mirror and search index of test runs out of the
+# user's cache directory
+os.environ.setdefault("DRAFTSMITH_CACHE_DIR", tempfile.mkdtemp(prefix="draftsmith-"))
@@ -0,0 +1,64 @@
+import json
+import pytest
+import requests_mock
+from api_client import ApiClient, configure_client, get_client, iter_json_array
+from notes import get_notes
+
+
+def test_client_url():
+    client = ApiClient("http://localhost:37238/", pool_size=2)
+    assert client.url("/notes") == "http://localhost:37238/notes"
+    assert client.url("/notes", "http://example.com") == "http://example.com/notes"
+
+
+def test_client_pool_size():
+    client = ApiClient(pool_size=25)
+    adapter = client.session.get_adapter("http://localhost:37238")
+    assert adapter._pool_maxsize == 25
+    assert client.session.headers["Connection"] == "keep-alive"
+
+
+def test_client_post_sends_json():
+    client = ApiClient()
+    url = client.url("/tags")
+
+    with requests_mock.Mocker() as m:
+        m.post(url, json={"id": 1})
+        response = client.post(url, json={"name": "todo"})
+        assert response.json() == {"id": 1}
+        assert m.last_request.json() == {"name": "todo"}
+        assert m.last_request.headers["Content-Type"] == "application/json"
+
+
+def test_endpoints_use_shared_client():
+    client = configure_client("http://example.com:8080")
+    try:
+        assert get_client() is client
+        with requests_mock.Mocker() as m:
+            m.get("http://example.com:8080/notes", json=[])
+            assert get_notes() == []
+    finally:
+        configure_client()
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 4096])
+def test_iter_json_array_across_chunks(chunk_size):
+    data = [
+        {"id": i, "title": f"Nöte {i}", "tags": [1.5, None, True]} for i in range(50)
+    ]
+    data += [123456, "end"]
+    body = json.dumps(data, ensure_ascii=False).encode()
+    chunks = [body[i : i + chunk_size] for i in range(0, len(body), chunk_size)]
+
+    assert list(iter_json_array(chunks)) == data
+
+
+def test_iter_json_array_rejects_non_arrays():
+    with pytest.raises(ValueError):
+        list(iter_json_array([b'{"id": 1}']))
+    with pytest.raises(ValueError):
+        list(iter_json_array([b'[{"id": 1},']))
+
+
+if __name__ == "__main__":
+    pytest.main()
@@ -0,0 +1,204 @@
+import asyncio
+import json
+import httpx
+import pytest
+from async_client import (
+    AsyncApiClient,
+    configure_async_client,
+    create_note,
+    delete_note,
+    get_async_client,
+    get_note,
+    get_tasks_details,
+    assign_tag_to_note,
+    get_tag_names,
+    iter_notes,
+    iter_tasks_details,
+    update_note,
+)
+from notes import clear_note_cache
+
+
+class Chunks(httpx.AsyncByteStream):
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+    async def __aiter__(self):
+        for chunk in self.chunks:
+            yield chunk
+
+
+def run_with_transport(handler, coroutine_factory):
+    async def run():
+        client = configure_async_client(transport=httpx.MockTransport(handler))
+        try:
+            return await coroutine_factory()
+        finally:
+            await client.aclose()
+
+    return asyncio.run(run())
+
+
+def test_create_note():
+    url = "http://localhost:37238/notes"
+    note_data = {"title": "New Note Title", "content": "Content"}
+    expected_response = {"id": 4, "message": "Note created successfully"}
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        assert request.method == "POST"
+        assert str(request.url) == url
+        assert json.loads(request.content) == note_data
+        return httpx.Response(200, json=expected_response)
+
+    response = run_with_transport(handler, lambda: create_note(url, note_data))
+    assert response == expected_response
+
+
+def test_get_tasks_details_raises_for_status():
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(500, json={"error": "boom"})
+
+    with pytest.raises(httpx.HTTPStatusError):
+        run_with_transport(handler, lambda: get_tasks_details())
+
+
+def test_assign_tag_to_note():
+    expected_response = {"note_id": 2, "tag_id": 3, "message": "Tag assigned"}
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        assert request.url.path == "/notes/2/tags"
+        assert json.loads(request.content) == {"tag_id": 3}
+        return httpx.Response(200, json=expected_response)
+
+    response = run_with_transport(handler, lambda: assign_tag_to_note(2, 3))
+    assert response == expected_response
+
+
+def test_get_tag_names():
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, json=[{"id": 1, "name": "done"}])
+
+    assert run_with_transport(handler, lambda: get_tag_names()) == ["done"]
+
+
+def test_concurrency_is_bounded():
+    in_flight = 0
+    peak = 0
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        return httpx.Response(200, json=[])
+
+    async def run():
+        transport = httpx.MockTransport(handler)
+        async with AsyncApiClient(max_concurrency=3, transport=transport) as client:
+            url = client.url("/notes")
+            await asyncio.gather(*(client.get(url) for _ in range(12)))
+
+    asyncio.run(run())
+    assert peak == 3
+
+
+def test_client_is_closed_with_its_loop():
+    async def client():
+        return get_async_client()
+
+    first = asyncio.run(client())
+    assert first.client.is_closed
+    second = asyncio.run(client())
+    assert second is not first and second.client.is_closed
+
+
+def test_configure_closes_the_previous_client():
+    async def run():
+        first = configure_async_client()
+        second = configure_async_client()
+        await asyncio.sleep(0)
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert first.client.is_closed and second.client.is_closed
+
+
+def test_iter_notes_and_tasks_stream_the_array():
+    notes = [{"id": i, "title": f"Note {i}", "content": "x" * 50} for i in range(2000)]
+    tasks = [{"id": i, "note_id": i} for i in range(3)]
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        body = json.dumps(notes if request.url.path == "/notes" else tasks).encode()
+        # Sent in small pieces and read in larger ones, so elements are split
+        chunks = [body[i : i + 7] for i in range(0, len(body), 7)]
+        return httpx.Response(200, stream=Chunks(chunks))
+
+    async def collect():
+        return [n async for n in iter_notes()], [t async for t in iter_tasks_details()]
+
+    assert run_with_transport(handler, collect) == (notes, tasks)
+
+
+def test_get_note_falls_back_to_the_note_list():
+    clear_note_cache()
+    notes = [{"id": 1, "title": "First"}, {"id": 2, "title": "Second"}]
+    paths = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        paths.append(request.url.path)
+        if request.url.path == "/notes":
+            return httpx.Response(200, json=notes)
+        return httpx.Response(404, json={"error": "Not found"})
+
+    async def fetch():
+        return [await get_note(2), await get_note(1)]
+
+    try:
+        assert run_with_transport(handler, fetch) == [notes[1], notes[0]]
+        # The list is downloaded once, and the missing endpoint remembered
+        assert paths == ["/notes/2", "/notes"]
+        with pytest.raises(ValueError):
+            run_with_transport(handler, lambda: get_note(3))
+    finally:
+        clear_note_cache()
+
+
+def test_writes_evict_the_cached_note():
+    clear_note_cache()
+    note = {"id": 1, "title": "First"}
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.method == "PUT":
+            note.update(json.loads(request.content))
+            return httpx.Response(200, json={"id": 1, "message": "Updated"})
+        if request.method == "DELETE":
+            note.clear()
+            return httpx.Response(200, json={"message": "Deleted"})
+        if request.url.path == "/notes":
+            return httpx.Response(200, json=[dict(note)] if note else [])
+        if not note:
+            return httpx.Response(404, json={"error": "Not found"})
+        return httpx.Response(200, json=dict(note))
+
+    async def run():
+        first = await get_note(1)
+        await update_note(1, {"title": "Renamed"})
+        renamed = await get_note(1)
+        await delete_note(1)
+        try:
+            await get_note(1)
+        except ValueError:
+            return first, renamed, None
+        return first, renamed, "still cached"
+
+    try:
+        first, renamed, deleted = run_with_transport(handler, run)
+    finally:
+        clear_note_cache()
+    assert first["title"] == "First" and renamed["title"] == "Renamed"
+    assert deleted is None
+
+
+if __name__ == "__main__":
+    pytest.main()
@@ -0,0 +1,204 @@
+import itertools
+import json
+import re
+import threading
+import pytest
+import requests_mock
+from bulk import (
+    assign_tags_bulk,
+    ImportCheckpoint,
+    import_notes,
+    iter_jsonl_records,
+    iter_markdown_records,
+)
+from tags import get_tag_index
+
+base_url = "http://localhost:37238"
+
+
+def mock_server(m, fail_titles=()):
+    """Mock note creation with increasing IDs, failing the given titles."""
+    ids = itertools.count(100)
+    lock = threading.Lock()
+    created = {}
+
+    def create_note(request, context):
+        title = request.json()["title"]
+        if title in fail_titles:
+            context.status_code = 500
+            return {"error": "Internal Server Error"}
+        with lock:
+            note_id = next(ids)
+        created[title] = note_id
+        return {"id": note_id, "message": "Note created successfully"}
+
+    m.post(f"{base_url}/notes", json=create_note)
+    m.post(f"{base_url}/notes/hierarchy", json={"message": "ok"})
+    m.get(f"{base_url}/tags", json=[{"id": 1, "name": "important"}])
+    m.post(f"{base_url}/tags", json={"id": 2, "message": "Tag created successfully"})
+    m.post(
+        re.compile(r"/notes/\d+/tags$"), json={"message": "Tag assigned successfully"}
+    )
+    return created
+
+
+def requests_to(m, path):
+    return [
+        r.json() for r in m.request_history if r.method == "POST" and r.path == path
+    ]
+
+
+def test_iter_markdown_records(tmp_path):
+    (tmp_path / "a.md").write_text("---\ntitle: Alpha\ntags: [x, 'y']\n---\nBody")
+    (tmp_path / "a").mkdir()
+    (tmp_path / "a" / "b.md").write_text("# Beta\n\nText")
+    (tmp_path / "a" / "notes.txt").write_text("ignored")
+
+    records = list(iter_markdown_records(tmp_path))
+
+    assert records == [
+        {
+            "key": "a.md",
+            "title": "Alpha",
+            "content": "Body",
+            "parent": None,
+            "tags": ["x", "y"],
+        },
+        {
+            "key": "a/b.md",
+            "title": "Beta",
+            "content": "# Beta\n\nText",
+            "parent": "a.md",
+            "tags": [],
+        },
+    ]
+
+
+def test_import_links_children_listed_before_parents():
+    lines = [
+        json.dumps(
+            {
+                "key": "child",
+                "title": "Child",
+                "content": "",
+                "parent": "root",
+                "tags": ["important", "new"],
+            }
+        ),
+        json.dumps({"key": "root", "title": "Root", "content": ""}),
+        json.dumps({"key": "other", "title": "Other", "content": "", "parent": 7}),
+    ]
+
+    with requests_mock.Mocker() as m:
+        created = mock_server(m)
+        get_tag_index(base_url).refresh()
+        stats = import_notes(iter_jsonl_records(lines), base_url, workers=4)
+        links = requests_to(m, "/notes/hierarchy")
+        new_tags = requests_to(m, "/tags")
+
+    assert (stats.created, stats.linked, stats.failed) == (3, 2, 0)
+    assert sorted(links, key=lambda link: link["parent_note_id"]) == [
+        {
+            "parent_note_id": 7,
+            "child_note_id": created["Other"],
+            "hierarchy_type": "subpage",
+        },
+        {
+            "parent_note_id": created["Root"],
+            "child_note_id": created["Child"],
+            "hierarchy_type": "subpage",
+        },
+    ]
+    assert new_tags == [{"name": "new"}]
+
+
+def test_import_resumes_from_checkpoint(tmp_path):
+    lines = [json.dumps({"title": f"Note {i}", "content": ""}) for i in range(10)]
+    checkpoint_path = tmp_path / "checkpoint.jsonl"
+
+    with requests_mock.Mocker() as m:
+        mock_server(m, fail_titles={"Note 3"})
+        checkpoint = ImportCheckpoint(checkpoint_path)
+        stats = import_notes(iter_jsonl_records(lines), base_url, checkpoint=checkpoint)
+        checkpoint.close()
+    assert (stats.created, stats.failed) == (9, 1)
+    assert stats.errors[0][0] == "4"
+
+    with requests_mock.Mocker() as m:
+        mock_server(m)
+        checkpoint = ImportCheckpoint(checkpoint_path)
+        stats = import_notes(iter_jsonl_records(lines), base_url, checkpoint=checkpoint)
+        checkpoint.close()
+        assert requests_to(m, "/notes") == [{"title": "Note 3", "content": ""}]
+    assert (stats.created, stats.skipped, stats.failed) == (1, 9, 0)
+    assert len(ImportCheckpoint(checkpoint_path).ids) == 10
+
+
+@pytest.mark.parametrize(
+    "failure",
+    [{"status_code": 500}, {"json": {"error": "Tag could not be assigned"}}],
+)
+def test_import_retries_only_failed_tags(tmp_path, failure):
+    lines = [
+        json.dumps({"key": "a", "title": "A", "content": "", "tags": ["important"]})
+    ]
+    checkpoint_path = tmp_path / "checkpoint.jsonl"
+
+    with requests_mock.Mocker() as m:
+        created = mock_server(m)
+        m.post(re.compile(r"/notes/\d+/tags$"), **failure)
+        get_tag_index(base_url).refresh()
+        checkpoint = ImportCheckpoint(checkpoint_path)
+        stats = import_notes(iter_jsonl_records(lines), base_url, checkpoint=checkpoint)
+        checkpoint.close()
+    assert (stats.created, stats.failed) == (1, 1)
+    assert ImportCheckpoint(checkpoint_path).untagged == {"a": ["important"]}
+
+    with requests_mock.Mocker() as m:
+        mock_server(m)
+        checkpoint = ImportCheckpoint(checkpoint_path)
+        stats = import_notes(iter_jsonl_records(lines), base_url, checkpoint=checkpoint)
+        checkpoint.close()
+        assert requests_to(m, "/notes") == []
+        assert requests_to(m, f"/notes/{created['A']}/tags") == [{"tag_id": 1}]
+    assert (stats.skipped, stats.failed) == (1, 0)
+    assert ImportCheckpoint(checkpoint_path).untagged == {"a": []}
+
+
+def test_assign_tags_bulk_skips_existing_pairs():
+    with requests_mock.Mocker() as m:
+        m.get(f"{base_url}/tags", json=[{"id": 1, "name": "important"}])
+        m.post(
+            f"{base_url}/tags", json={"id": 2, "message": "Tag created successfully"}
+        )
+        m.get(
+            f"{base_url}/tags/with-notes",
+            json=[
+                {
+                    "tag_id": 1,
+                    "tag_name": "important",
+                    "notes": [{"id": 2, "title": "Foo"}],
+                }
+            ],
+        )
+        m.post(
+            re.compile(r"/notes/\d+/tags$"),
+            json={"message": "Tag assigned successfully"},
+        )
+        get_tag_index(base_url).refresh()
+
+        result = assign_tags_bulk([1, 2, 3, 2], ["important", "new"], base_url)
+
+        assigned = sorted(
+            (int(r.path.split("/")[2]), r.json()["tag_id"])
+            for r in m.request_history
+            if r.path.endswith("/tags") and r.path.startswith("/notes/")
+        )
+        assert requests_to(m, "/tags") == [{"name": "new"}]
+
+    assert result == {"assigned": 5, "skipped": 1, "failed": 0, "errors": []}
+    assert assigned == [(1, 1), (1, 2), (2, 2), (3, 1), (3, 2)]
+
+
+if __name__ == "__main__":
+    pytest.main()
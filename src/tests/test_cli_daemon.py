@@ -0,0 +1,123 @@
+import json
+import socket
+import threading
+import time
+import pytest
+import requests_mock
+from cli_daemon import _send, execute, forward, forward_command, runs_directly, serve
+
+
+@pytest.fixture
+def daemon(tmp_path):
+    path = tmp_path / "daemon.sock"
+    thread = threading.Thread(target=serve, args=(path,), daemon=True)
+    thread.start()
+    for _ in range(100):
+        if forward_command("ping", path):
+            break
+        time.sleep(0.05)
+    yield path
+    forward_command("stop", path)
+    thread.join(timeout=5)
+
+
+def test_forward_without_daemon(tmp_path):
+    assert forward(["--help"], tmp_path / "missing.sock") is None
+    assert forward_command("ping", tmp_path / "missing.sock") is None
+
+
+def test_execute_captures_output():
+    result = execute(["--help"])
+    assert result["exit_code"] == 0
+    assert "notes" in result["stdout"]
+
+    result = execute(["no-such-command"])
+    assert result["exit_code"] == 2
+    assert "No such command" in result["stderr"]
+
+
+def test_forward_runs_command_in_daemon(daemon):
+    note = {"id": 1, "title": "First note", "content": "Hello from the daemon"}
+
+    with requests_mock.Mocker() as m:
+        m.get("http://localhost:37238/notes/1", json=note)
+        result = forward(["notes", "get", "1"], daemon)
+
+    assert result["exit_code"] == 0
+    assert result["stdout"].strip() == "Hello from the daemon"
+
+
+def test_forward_sends_the_environment(daemon, monkeypatch, tmp_path):
+    trace = tmp_path / "trace.jsonl"
+    monkeypatch.setenv("DRAFTSMITH_TRACE_FILE", str(trace))
+
+    with requests_mock.Mocker() as m:
+        m.get("http://localhost:37238/notes/1", json={"id": 1, "content": "Hi"})
+        assert forward(["notes", "get", "1"], daemon)["exit_code"] == 0
+
+    (record,) = [json.loads(line) for line in trace.read_text().splitlines()]
+    assert record["path"] == "/notes/1"
+    # From the forwarded command line, not the daemon's own
+    assert record["command"] == "notes get 1"
+
+
+def test_execute_resets_the_output_defaults():
+    import output
+
+    output.set_defaults("ndjson", "id")
+    # --help exits before the global options are applied
+    assert execute(["--help"])["exit_code"] == 0
+    assert output.resolve() == ("table", None)
+
+
+def test_daemon_declines_other_settings(daemon):
+    # Settings read at startup, so the command should run in its own process
+    request = {"argv": ["--help"], "env": {"DRAFTSMITH_CACHE_TTL": "12345"}}
+    assert "refused" in _send(daemon, request)
+
+
+def test_forward_when_the_daemon_stops_before_answering(tmp_path):
+    path = tmp_path / "daemon.sock"
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(str(path))
+    server.listen()
+
+    def hang_up():
+        connection, _ = server.accept()
+        connection.recv(65536)
+        connection.sendall(b'{"stdout": "Half')
+        connection.close()
+
+    threading.Thread(target=hang_up, daemon=True).start()
+    try:
+        assert forward(["notes", "list"], path) is None
+    finally:
+        server.close()
+
+
+def test_runs_directly(monkeypatch):
+    monkeypatch.delenv("DRAFTSMITH_NO_DAEMON", raising=False)
+    assert not runs_directly(["notes", "list"])
+    assert not runs_directly(["notes", "list", "--format", "table"])
+    assert not runs_directly(["sync-dir", "notes"])
+    assert runs_directly(["notes", "list", "--format", "ndjson"])
+    assert runs_directly(["--format=json", "tags", "list"])
+    assert runs_directly(["sync-dir", "notes", "--watch"])
+    assert runs_directly(["notes", "import", "notes"])
+    assert runs_directly(["export", "notes.parquet"])
+    assert runs_directly(["daemon", "status"])
+    monkeypatch.setenv("DRAFTSMITH_NO_DAEMON", "1")
+    assert runs_directly(["notes", "list"])
+
+
+def test_stop(daemon):
+    assert forward_command("stop", daemon)["exit_code"] == 0
+    for _ in range(100):
+        if not daemon.exists():
+            break
+        time.sleep(0.05)
+    assert forward(["--help"], daemon) is None
+
+
+if __name__ == "__main__":
+    pytest.main()
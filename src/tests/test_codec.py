@@ -0,0 +1,24 @@
+import pytest
+import codec
+
+payload = [
+    {"id": 1, "title": "Nöte", "content": "Hello\nWorld", "tags": None},
+    {"id": 2, "effort_estimate": 2.5, "all_day": False, "schedules": []},
+]
+
+
+@pytest.mark.parametrize("use_orjson", [True, False])
+def test_round_trip(monkeypatch, use_orjson):
+    if not use_orjson:
+        monkeypatch.setattr(codec, "orjson", None)
+    elif codec.orjson is None:
+        pytest.skip("orjson is not installed")
+
+    encoded = codec.dumps(payload)
+    assert isinstance(encoded, bytes)
+    assert codec.loads(encoded) == payload
+    assert codec.loads(encoded.decode()) == payload
+
+
+if __name__ == "__main__":
+    pytest.main()
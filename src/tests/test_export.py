@@ -0,0 +1,187 @@
+import json
+import polars as pl
+import pytest
+import requests_mock
+from export import STATE_FILE, export
+
+base_url = "http://localhost:37238"
+
+
+def note(id, modified_at):
+    return {
+        "id": id,
+        "title": f"Note {id}",
+        "content": "",
+        "created_at": "2024-10-20T05:04:42Z",
+        "modified_at": modified_at,
+    }
+
+
+def task(id, modified_at, clocks=()):
+    return {
+        "id": id,
+        "note_id": 1,
+        "status": "todo",
+        "priority": 2,
+        "all_day": False,
+        "created_at": "2024-10-20T05:04:42Z",
+        "modified_at": modified_at,
+        "schedules": [
+            {
+                "id": id,
+                "start_datetime": "2024-10-21T09:00:00Z",
+                "end_datetime": "2024-10-21T10:00:00Z",
+            }
+        ],
+        "clocks": [{"id": c, "clock_in": "2024-10-21T09:00:00Z"} for c in clocks],
+    }
+
+
+def mock_server(m, notes, tasks):
+    m.get(f"{base_url}/notes", json=notes)
+    m.get(
+        f"{base_url}/tags/with-notes",
+        json=[
+            {"tag_id": 1, "tag_name": "project", "notes": [{"id": 1, "title": ""}]},
+            {"tag_id": 2, "tag_name": "project/alpha", "notes": None},
+        ],
+    )
+    m.get(
+        f"{base_url}/tags/tree",
+        json=[{"id": 1, "name": "project", "children": [{"id": 2, "name": "alpha"}]}],
+    )
+    m.get(
+        f"{base_url}/notes/tree",
+        json=[
+            {"id": 1, "title": "", "type": "", "children": [{"id": 2, "type": "page"}]}
+        ],
+    )
+    m.get(f"{base_url}/tasks/details", json=tasks)
+
+
+def read(directory, table, ext="parquet"):
+    scan = pl.scan_parquet if ext == "parquet" else pl.scan_ipc
+    return scan(directory / table / f"*.{ext}").collect()
+
+
+def test_export(tmp_path):
+    with requests_mock.Mocker() as m:
+        mock_server(
+            m,
+            [note(1, "2024-10-20"), note(2, "2024-10-21")],
+            [task(5, "2024-10-20", [7, 8])],
+        )
+        rows = export(tmp_path, base_url=base_url)
+
+    assert rows == {
+        "notes": 2,
+        "tags": 2,
+        "note_tags": 1,
+        "tag_hierarchy": 1,
+        "note_hierarchy": 1,
+        "tasks": 1,
+        "schedules": 1,
+        "clocks": 2,
+    }
+    assert read(tmp_path, "notes")["id"].to_list() == [1, 2]
+    assert read(tmp_path, "note_hierarchy").row(0) == (1, 2, "page")
+    clocks = read(tmp_path, "clocks")
+    assert clocks["task_id"].to_list() == [5, 5]
+    assert clocks["clock_out"].null_count() == 2
+    assert read(tmp_path, "tasks").schema["effort_estimate"] == pl.Float64
+
+
+def test_export_in_batches(tmp_path):
+    notes = [note(i, "2024-10-20") for i in range(1, 8)]
+    with requests_mock.Mocker() as m:
+        mock_server(m, notes, [task(5, "2024-10-20")])
+        export(tmp_path, "ipc", base_url=base_url, batch_size=3)
+
+    assert len(list((tmp_path / "notes").glob("*.arrow"))) == 3
+    assert read(tmp_path, "notes", "arrow")["id"].to_list() == list(range(1, 8))
+
+
+def test_export_append_adds_changed_records(tmp_path):
+    with requests_mock.Mocker() as m:
+        mock_server(
+            m, [note(1, "2024-10-20"), note(2, "2024-10-21")], [task(5, "2024-10-20")]
+        )
+        export(tmp_path, base_url=base_url)
+    assert json.loads((tmp_path / STATE_FILE).read_text())["watermarks"] == {
+        "notes": "2024-10-21",
+        "tasks": "2024-10-20",
+    }
+
+    with requests_mock.Mocker() as m:
+        notes = [note(1, "2024-10-20"), note(2, "2024-10-22"), note(3, "2024-10-22")]
+        mock_server(m, notes, [task(5, "2024-10-20"), task(6, "2024-10-23")])
+        rows = export(tmp_path, append=True, base_url=base_url)
+
+    assert rows["notes"] == 2 and rows["tasks"] == 1
+    assert sorted(read(tmp_path, "notes")["id"].to_list()) == [1, 2, 2, 3]
+    latest = (
+        read(tmp_path, "notes").sort("modified_at").unique("id", keep="last").sort("id")
+    )
+    assert latest["modified_at"].to_list() == ["2024-10-20", "2024-10-22", "2024-10-22"]
+    # The small tables are rewritten, not appended to
+    assert read(tmp_path, "schedules")["id"].to_list() == [5, 6]
+
+
+def test_export_append_compares_times_not_strings(tmp_path):
+    with requests_mock.Mocker() as m:
+        mock_server(m, [note(1, "2024-10-21T10:00:00+02:00")], [])
+        export(tmp_path, base_url=base_url)
+
+    with requests_mock.Mocker() as m:
+        # Later, though it sorts first as a string
+        notes = [note(1, "2024-10-21T10:00:00+02:00"), note(2, "2024-10-21T09:00:00Z")]
+        mock_server(m, notes, [])
+        rows = export(tmp_path, append=True, base_url=base_url)
+
+    assert rows["notes"] == 1
+    state = json.loads((tmp_path / STATE_FILE).read_text())
+    assert state["watermarks"]["notes"] == "2024-10-21T09:00:00Z"
+
+
+def test_export_append_adds_records_arriving_at_the_watermark(tmp_path):
+    with requests_mock.Mocker() as m:
+        mock_server(m, [note(1, "2024-10-21T09:00:00Z")], [])
+        export(tmp_path, base_url=base_url)
+
+    with requests_mock.Mocker() as m:
+        # Written in the same second, after the first export read the notes
+        notes = [note(1, "2024-10-21T09:00:00Z"), note(2, "2024-10-21T11:00:00+02:00")]
+        mock_server(m, notes, [])
+        rows = export(tmp_path, append=True, base_url=base_url)
+
+    assert rows["notes"] == 1
+    assert sorted(read(tmp_path, "notes")["id"].to_list()) == [1, 2]
+    state = json.loads((tmp_path / STATE_FILE).read_text())
+    assert state["watermark_ids"]["notes"] == [1, 2]
+
+    with requests_mock.Mocker() as m:
+        mock_server(m, notes, [])
+        assert export(tmp_path, append=True, base_url=base_url)["notes"] == 0
+
+
+def test_export_tags_named_either_way(tmp_path):
+    with requests_mock.Mocker() as m:
+        mock_server(m, [], [])
+        m.get(
+            f"{base_url}/tags/with-notes",
+            json=[{"id": 1, "name": "project", "notes": None}],
+        )
+        export(tmp_path, base_url=base_url)
+
+    assert read(tmp_path, "tags").row(0) == (1, "project")
+
+
+def test_export_append_rejects_another_format(tmp_path):
+    with requests_mock.Mocker() as m:
+        mock_server(m, [], [])
+        export(tmp_path, "ipc", base_url=base_url)
+
+    with pytest.raises(ValueError):
+        export(tmp_path, "parquet", append=True, base_url=base_url)
+    with pytest.raises(ValueError):
+        export(tmp_path, "csv", base_url=base_url)
@@ -1,7 +1,15 @@
 import polars as pl
 import pytest
+import subprocess
+import sys
 from io import StringIO
-from main import df_print
+from pathlib import Path
+from typer.testing import CliRunner
+from main import app, df_print
+
+# Import time main may add on top of typer, in microseconds
+IMPORT_BUDGET_US = 50_000
+HEAVY_MODULES = ["polars", "requests", "httpx", "notes", "tags", "tasks", "store"]
 
 
 def test_df_print(capsys):
@@ -21,5 +29,49 @@ def test_df_print(capsys):
     assert captured.out.strip() == expected_output.strip()
 
 
+def import_main(code: str) -> subprocess.CompletedProcess:
+    return subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=Path(__file__).parent.parent,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+
+def test_import_skips_heavy_modules():
+    code = (
+        f"import sys, main; print([m for m in {HEAVY_MODULES!r} if m in sys.modules])"
+    )
+    assert import_main(code).stdout.strip() == "[]"
+
+
+def test_import_time_budget():
+    cumulative = {}
+    for line in import_main("import main").stderr.splitlines():
+        _, total, name = line.split("|")
+        if total.strip().isdigit():
+            cumulative[name.strip()] = int(total)
+    own_time = cumulative["main"] - cumulative["typer"]
+    assert own_time < IMPORT_BUDGET_US
+
+
 if __name__ == "__main__":
     pytest.main()
+
+
+@pytest.mark.parametrize(
+    "args",
+    [
+        ["notes", "get", "1", "--offline"],
+        ["notes", "list", "--offline"],
+        ["notes", "search", "plan", "--local"],
+        ["task", "list", "--offline"],
+    ],
+)
+def test_offline_before_sync(args, monkeypatch, tmp_path):
+    monkeypatch.setenv("DRAFTSMITH_CACHE_DIR", str(tmp_path))
+    result = CliRunner(mix_stderr=False).invoke(app, args)
+    assert result.exit_code == 1
+    assert "run `draftsmith sync` first" in result.stderr
+    assert not isinstance(result.exception, FileNotFoundError)
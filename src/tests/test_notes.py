@@ -1,17 +1,21 @@
 import pytest
 import requests_mock
+import notes
 from typing import Dict, Any, List
 from notes import (
     create_note,
     update_note,
     delete_note,
     get_notes,
+    get_note,
+    clear_note_cache,
     get_notes_no_content,
     search_notes,
     create_note_hierarchy,
     update_note_hierarchy,
     delete_note_hierarchy,
     get_notes_tree,
+    iter_notes,
 )
 from urllib.parse import quote
 
@@ -116,6 +120,7 @@ def test_get_notes():
         m.get(f"{base_url}/notes", json=expected_response)
         response = get_notes(base_url)
         assert response == expected_response
+        assert list(iter_notes(base_url)) == expected_response
 
 
 def test_get_notes_no_content():
@@ -233,5 +238,91 @@ def test_get_notes_tree():
         assert response == expected_response
 
 
+def test_get_note():
+    base_url = "http://localhost:37238"
+    expected_response: Dict[str, Any] = {
+        "id": 1,
+        "title": "First note",
+        "content": "This is the first note in the system.",
+    }
+    clear_note_cache()
+
+    with requests_mock.Mocker() as m:
+        m.get(f"{base_url}/notes/1", json=expected_response)
+        assert get_note(1, base_url) == expected_response
+        # The second lookup is answered from the cache
+        assert get_note(1, base_url) == expected_response
+        assert m.call_count == 1
+
+
+def test_get_note_falls_back_to_index():
+    base_url = "http://localhost:37238"
+    notes = [
+        {"id": 1, "title": "First note", "content": "First"},
+        {"id": 2, "title": "Foo", "content": "Second"},
+    ]
+    clear_note_cache()
+
+    with requests_mock.Mocker() as m:
+        m.get(f"{base_url}/notes/1", status_code=405)
+        m.get(f"{base_url}/notes", json=notes)
+        assert get_note(1, base_url) == notes[0]
+        assert get_note(2, base_url) == notes[1]
+        assert m.call_count == 2
+
+        with pytest.raises(ValueError):
+            get_note(3, base_url)
+
+
+def test_get_note_expires(monkeypatch):
+    base_url = "http://localhost:37238"
+    clear_note_cache()
+
+    with requests_mock.Mocker() as m:
+        m.get(f"{base_url}/notes/1", json={"id": 1, "title": "Old"})
+        assert get_note(1, base_url)["title"] == "Old"
+        m.get(f"{base_url}/notes/1", json={"id": 1, "title": "New"})
+        assert get_note(1, base_url)["title"] == "Old"
+
+        monkeypatch.setattr(notes, "NOTE_CACHE_TTL", -1)
+        assert get_note(1, base_url)["title"] == "New"
+
+
+def test_get_note_limits_index_downloads(monkeypatch):
+    base_url = "http://localhost:37238"
+    clear_note_cache()
+
+    with requests_mock.Mocker() as m:
+        m.get(f"{base_url}/notes/1", status_code=405)
+        m.get(f"{base_url}/notes", json=[{"id": 1, "title": "First note"}])
+        get_note(1, base_url)
+        # Missing notes are looked up in the index just downloaded
+        for note_id in (2, 3, 4):
+            with pytest.raises(ValueError):
+                get_note(note_id, base_url)
+        assert [r.path for r in m.request_history].count("/notes") == 1
+
+        m.get(f"{base_url}/notes", json=[{"id": 2, "title": "Foo"}])
+        monkeypatch.setattr(notes, "NOTE_INDEX_INTERVAL", -1)
+        assert get_note(2, base_url)["title"] == "Foo"
+        with pytest.raises(ValueError):
+            get_note(1, base_url)
+
+
+def test_update_note_invalidates_get_note():
+    base_url = "http://localhost:37238"
+    clear_note_cache()
+
+    with requests_mock.Mocker() as m:
+        m.get(f"{base_url}/notes/1", json={"id": 1, "title": "Old"})
+        assert get_note(1, base_url)["title"] == "Old"
+
+        m.put(f"{base_url}/notes/1", json={"id": 1, "message": "Note updated"})
+        update_note(1, {"title": "New"}, base_url)
+
+        m.get(f"{base_url}/notes/1", json={"id": 1, "title": "New"})
+        assert get_note(1, base_url)["title"] == "New"
+
+
 if __name__ == "__main__":
     pytest.main()
@@ -0,0 +1,81 @@
+import io
+import json
+import pytest
+import output
+from output import set_defaults, stream_records, write_records
+
+records = [
+    {"id": 1, "title": "First\tnote", "tags": ["a"], "done": True},
+    {"id": 2, "title": "Two\nlines", "tags": [], "done": None},
+]
+
+
+@pytest.fixture(autouse=True)
+def reset_defaults():
+    yield
+    set_defaults()
+
+
+def test_stream_records_ndjson_and_json(capsys):
+    assert stream_records(iter(records), "ndjson", ["id", "title"]) == 2
+    lines = capsys.readouterr().out.splitlines()
+    assert [json.loads(line) for line in lines] == [
+        {"id": 1, "title": "First\tnote"},
+        {"id": 2, "title": "Two\nlines"},
+    ]
+
+    stream_records(iter(records), "json")
+    assert json.loads(capsys.readouterr().out) == records
+    stream_records(iter([]), "json")
+    assert json.loads(capsys.readouterr().out) == []
+
+
+def test_stream_records_tsv_escapes_values(capsys):
+    stream_records(iter(records), "tsv")
+    assert capsys.readouterr().out.splitlines() == [
+        "id\ttitle\ttags\tdone",
+        '1\tFirst\\tnote\t["a"]\ttrue',
+        "2\tTwo\\nlines\t[]\t",
+    ]
+
+
+def test_write_records_uses_global_defaults(capsys):
+    set_defaults("tsv", "title")
+    write_records(iter(records), table=print)
+    assert capsys.readouterr().out.splitlines()[0] == "title"
+
+    # The table gets the projected records
+    write_records(iter(records), table=lambda r: print(list(r)), format="table")
+    assert capsys.readouterr().out.strip() == str(
+        [{"title": "First\tnote"}, {"title": "Two\nlines"}]
+    )
+    with pytest.raises(ValueError):
+        write_records(iter(records), table=print, format="csv")
+
+
+class ClosedPipe(io.StringIO):
+    def write(self, data):
+        raise BrokenPipeError
+
+    def fileno(self):
+        return self.descriptor
+
+
+def test_write_records_stops_on_a_closed_pipe(monkeypatch, tmp_path):
+    read = []
+
+    def generate():
+        for i in range(1000):
+            read.append(i)
+            yield {"id": i}
+
+    records = generate()
+    stdout = ClosedPipe()
+    stdout.descriptor = open(tmp_path / "out", "w").fileno()
+    monkeypatch.setattr(output.sys, "stdout", stdout)
+
+    with pytest.raises(SystemExit):
+        write_records(records, table=print, format="ndjson")
+    # Stopped at the first record, and the generator was closed
+    assert read == [0]
+    assert records.gi_frame is None
@@ -0,0 +1,123 @@
+import pytest
+import requests
+import requests_mock
+from response_cache import ResponseCache
+
+url = "http://localhost:37238/notes"
+notes = [{"id": 1, "title": "First note", "content": "Hello"}]
+
+
+def fetch(cache):
+    session = requests.Session()
+    return cache.fetch(url, lambda headers: session.get(url, headers=headers))
+
+
+def test_etag_revalidation(tmp_path):
+    cache = ResponseCache(tmp_path / "responses.sqlite3")
+
+    with requests_mock.Mocker() as m:
+        m.get(
+            url,
+            [
+                {"json": notes, "headers": {"ETag": '"v1"'}},
+                {"status_code": 304},
+            ],
+        )
+        assert fetch(cache) == notes
+        assert fetch(cache) == notes
+        assert m.request_history[1].headers["If-None-Match"] == '"v1"'
+
+    assert cache.stats == {"hits": 0, "not_modified": 1, "unchanged": 0, "misses": 1}
+
+
+def test_ttl_without_validators(tmp_path):
+    cache = ResponseCache(tmp_path / "responses.sqlite3", ttl=60)
+
+    with requests_mock.Mocker() as m:
+        m.get(url, json=notes)
+        fetch(cache)
+        fetch(cache)
+        assert m.call_count == 1
+
+        cache.invalidate()
+        fetch(cache)
+        assert m.call_count == 2
+        assert "If-None-Match" not in m.last_request.headers
+
+    assert cache.stats == {"hits": 1, "not_modified": 0, "unchanged": 0, "misses": 2}
+
+
+def test_invalidate_skips_the_file_once_it_is_clean(tmp_path):
+    path = tmp_path / "responses.sqlite3"
+    with requests_mock.Mocker() as m:
+        m.get(url, json=notes)
+        fetch(ResponseCache(path, ttl=60))
+
+        cache = ResponseCache(path, ttl=60)
+        # Left by an earlier run, so the first write still has to drop it
+        cache.invalidate()
+        fetch(cache)
+        assert m.call_count == 2
+
+        statements = []
+        cache._db().set_trace_callback(statements.append)
+        cache.invalidate()
+        cache.invalidate()
+        assert len([s for s in statements if s.startswith("DELETE")]) == 1
+
+        fetch(cache)
+        assert m.call_count == 3
+        m.get(url, json=notes, headers={"ETag": '"v1"'})
+        cache.invalidate()
+        fetch(cache)
+        cache.invalidate()
+        assert len([s for s in statements if s.startswith("DELETE")]) == 2
+
+
+def test_invalidate_reaches_the_default_file(tmp_path, monkeypatch):
+    monkeypatch.setenv("DRAFTSMITH_CACHE_DIR", str(tmp_path))
+    with requests_mock.Mocker() as m:
+        m.get(url, json=notes)
+        fetch(ResponseCache(ttl=60))
+
+        # A new process writes before it has read anything
+        cache = ResponseCache(ttl=60)
+        cache.invalidate()
+        m.get(url, json=[])
+        assert fetch(cache) == []
+        cache.invalidate()
+        assert fetch(cache) == []
+        assert m.call_count == 3
+
+
+def test_disk_tier_is_shared(tmp_path):
+    path = tmp_path / "responses.sqlite3"
+    with requests_mock.Mocker() as m:
+        m.get(
+            url, json=notes, headers={"Last-Modified": "Mon, 21 Oct 2024 07:28:00 GMT"}
+        )
+        fetch(ResponseCache(path))
+
+        m.get(url, status_code=304)
+        assert fetch(ResponseCache(path)) == notes
+        assert (
+            m.last_request.headers["If-Modified-Since"]
+            == "Mon, 21 Oct 2024 07:28:00 GMT"
+        )
+
+
+def test_memory_tier_is_bounded(tmp_path):
+    cache = ResponseCache(tmp_path / "responses.sqlite3", memory_limit=120)
+
+    with requests_mock.Mocker() as m:
+        for i in range(5):
+            m.get(f"{url}/{i}", json={"id": i, "content": "x" * 30})
+            cache.fetch(f"{url}/{i}", lambda headers, i=i: requests.get(f"{url}/{i}"))
+
+    assert cache._memory_size <= 120
+    assert list(cache._memory) == [f"{url}/3", f"{url}/4"]
+    assert cache.get(f"{url}/0") is not None
+
+
+if __name__ == "__main__":
+    pytest.main()
@@ -0,0 +1,148 @@
+import sqlite3
+import pytest
+import requests_mock
+from search_index import SearchIndex, open_search_index, snippet, tokenize
+from store import LocalStore
+
+notes = [
+    {
+        "id": 1,
+        "title": "Shopping list",
+        "content": "Buy apples, bananas and bread.",
+        "modified_at": "1",
+    },
+    {
+        "id": 2,
+        "title": "Bread recipe",
+        "content": "Flour, water and salt make bread. Bread needs time.",
+        "modified_at": "1",
+    },
+    {
+        "id": 3,
+        "title": "Meeting",
+        "content": "Discuss the banana budget with the team.",
+        "modified_at": "1",
+    },
+]
+
+
+def build_index():
+    index = SearchIndex()
+    for note in notes:
+        index.add_note(note)
+    return index
+
+
+def test_tokenize():
+    assert tokenize("Hello, World!") == ["hello", "world"]
+    assert tokenize(None) == []
+
+
+def test_bm25_ranks_by_term_frequency():
+    index = build_index()
+    results = index.search("bread")
+    assert [note_id for note_id, _ in results] == [2, 1]
+    assert results[0][1] > results[1][1]
+
+
+def test_phrase_query_requires_phrase():
+    index = build_index()
+    assert [note_id for note_id, _ in index.search('"make bread"')] == [2]
+    assert index.search('"bread make"') == []
+
+
+def test_prefix_query():
+    index = build_index()
+    assert {note_id for note_id, _ in index.search("banan*")} == {1, 3}
+    assert index.matched_terms("banan*") == ["banana", "bananas"]
+
+
+def test_limit():
+    index = build_index()
+    assert len(index.search("bread", limit=1)) == 1
+
+
+def test_update_reindexes_only_changed_notes():
+    index = build_index()
+    fetched = []
+
+    def fetch_notes(note_ids):
+        fetched.extend(note_ids)
+        return [dict(notes[0], content="Buy pears.", modified_at="2")]
+
+    changes = index.update({1: "2", 2: "1"}, fetch_notes)
+    assert changes == 2
+    assert fetched == [1]
+    assert index.search("apples") == []
+    assert [note_id for note_id, _ in index.search("pears")] == [1]
+    assert index.search("banana") == []
+    assert len(index) == 2
+
+
+def test_index_is_kept_in_the_database(tmp_path):
+    path = tmp_path / "mirror.sqlite3"
+    index = SearchIndex(sqlite3.connect(path))
+    index.update({note["id"]: note["modified_at"] for note in notes}, lambda ids: notes)
+
+    reopened = SearchIndex(sqlite3.connect(path))
+    assert len(reopened) == 3
+    assert reopened.search("bread") == index.search("bread")
+    assert reopened.update({1: "1", 2: "1", 3: "1"}, lambda ids: []) == 0
+
+
+def test_outdated_index_is_rebuilt(tmp_path):
+    connection = sqlite3.connect(tmp_path / "mirror.sqlite3")
+    SearchIndex(connection).add_note(notes[0])
+    connection.execute("UPDATE search_version SET version = 0")
+    connection.commit()
+
+    assert len(SearchIndex(connection)) == 0
+
+
+def test_query_is_tokenized_by_the_index():
+    index = SearchIndex()
+    index.add_note({"id": 1, "title": "Café", "content": "e-mail x\ue000y"})
+    assert [note_id for note_id, _ in index.search("CAFÉ")] == [1]
+    assert [note_id for note_id, _ in index.search("e-mail")] == [1]
+    # Private use characters are part of a token for unicode61, not for \w
+    assert [note_id for note_id, _ in index.search("x\ue000y")] == [1]
+    assert index.search('"" * !!') == []
+
+
+def test_open_search_index_scans_the_mirror_only_after_a_sync(tmp_path, monkeypatch):
+    base_url = "http://localhost:37238"
+    store = LocalStore(tmp_path / "mirror.sqlite3")
+    scans = []
+    note_versions = store.note_versions
+    monkeypatch.setattr(
+        store, "note_versions", lambda: scans.append(1) or note_versions()
+    )
+
+    def sync(notes):
+        with requests_mock.Mocker() as m:
+            m.get(f"{base_url}/notes", json=notes)
+            m.get(f"{base_url}/notes/no-content", json=notes)
+            m.get(f"{base_url}/tags/with-notes", json=[])
+            m.get(f"{base_url}/tags/tree", json=[])
+            m.get(f"{base_url}/tasks/details", json=[])
+            store.sync(base_url)
+
+    sync(notes)
+    assert len(open_search_index(store)) == 3
+    assert open_search_index(store).search("bread")
+    assert len(scans) == 1
+
+    sync(notes[:1])
+    assert len(open_search_index(store)) == 1
+    assert len(scans) == 2
+
+
+def test_snippet():
+    content = "word " * 40 + "needle in the haystack " + "word " * 40
+    text = snippet(content, ["needle"], width=40)
+    assert "needle" in text
+    assert text.startswith("…") and text.endswith("…")
+
+
+if __name__ == "__main__":
+    pytest.main()
@@ -0,0 +1,147 @@
+import pytest
+import requests_mock
+from notes import clear_note_cache
+from store import LocalStore, open_store
+
+base_url = "http://localhost:37238"
+
+notes = [
+    {
+        "id": 1,
+        "title": "First note",
+        "content": "This is the first note in the system.",
+        "created_at": "2024-10-20T05:04:42.709064Z",
+        "modified_at": "2024-10-20T05:04:42.709064Z",
+    },
+    {
+        "id": 2,
+        "title": "Foo",
+        "content": "This is the updated content of the note.",
+        "created_at": "2024-10-20T05:04:42.709064Z",
+        "modified_at": "2024-10-20T05:15:03.334779Z",
+    },
+]
+tags_with_notes = [
+    {"tag_id": 1, "tag_name": "important", "notes": None},
+    {"tag_id": 3, "tag_name": "todo", "notes": [{"id": 2, "title": "Foo"}]},
+]
+tags_tree = [{"id": 1, "name": "important", "notes": None}]
+tasks_details = [
+    {
+        "id": 2,
+        "note_id": 1,
+        "status": "todo",
+        "schedules": [
+            {
+                "id": 5,
+                "start_datetime": "2023-06-01T09:00:00Z",
+                "end_datetime": "2023-06-01T17:00:00Z",
+            }
+        ],
+        "clocks": [
+            {
+                "id": 7,
+                "clock_in": "2023-06-01T09:00:00Z",
+                "clock_out": "2023-06-01T10:00:00Z",
+            }
+        ],
+    }
+]
+
+
+def mock_server(m):
+    m.get(f"{base_url}/notes", json=notes)
+    m.get(f"{base_url}/tags/with-notes", json=tags_with_notes)
+    m.get(f"{base_url}/tags/tree", json=tags_tree)
+    m.get(f"{base_url}/tasks/details", json=tasks_details)
+
+
+def test_first_sync_mirrors_everything(tmp_path):
+    store = LocalStore(tmp_path / "mirror.sqlite3")
+
+    with requests_mock.Mocker() as m:
+        mock_server(m)
+        stats = store.sync(base_url)
+
+    assert stats == {"notes_fetched": 2, "notes_deleted": 0, "tags": 2, "tasks": 1}
+    assert store.get_notes() == notes
+    assert store.get_note(2) == notes[1]
+    assert store.search_notes("updated") == [{"id": 2, "title": "Foo"}]
+    assert store.get_tags_with_notes() == tags_with_notes
+    assert store.list_tags_with_notes() == tags_tree
+    assert store.get_tasks_details() == tasks_details
+    assert store.connection.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+
+def test_incremental_sync_fetches_only_changed_notes(tmp_path):
+    store = LocalStore(tmp_path / "mirror.sqlite3")
+    clear_note_cache()
+
+    with requests_mock.Mocker() as m:
+        mock_server(m)
+        store.sync(base_url)
+
+        changed = dict(notes[0], content="Edited", modified_at="2024-11-01T00:00:00Z")
+        metadata = [
+            {k: v for k, v in note.items() if k != "content"} for note in [changed]
+        ]
+        m.get(f"{base_url}/notes/no-content", json=metadata)
+        m.get(f"{base_url}/notes/1", json=changed)
+        m.reset_mock()
+        stats = store.sync(base_url)
+
+        requested = [request.path for request in m.request_history]
+        assert "/notes" not in requested
+        assert requested.count("/notes/1") == 1
+
+    assert stats["notes_fetched"] == 1
+    assert stats["notes_deleted"] == 1
+    assert store.get_notes() == [changed]
+
+
+def test_full_sync_counts_only_deleted_notes(tmp_path):
+    store = LocalStore(tmp_path / "mirror.sqlite3")
+
+    with requests_mock.Mocker() as m:
+        mock_server(m)
+        store.sync(base_url)
+        m.get(f"{base_url}/notes", json=notes[1:])
+        stats = store.sync(base_url, full=True)
+
+    assert stats["notes_fetched"] == 1
+    assert stats["notes_deleted"] == 1
+    assert store.get_notes() == notes[1:]
+
+
+def test_sync_without_note_endpoint_downloads_the_notes_once(tmp_path):
+    store = LocalStore(tmp_path / "mirror.sqlite3")
+    clear_note_cache()
+    many = [
+        dict(notes[0], id=i, title=f"Note {i}", modified_at="1") for i in range(1, 6)
+    ]
+
+    with requests_mock.Mocker() as m:
+        mock_server(m)
+        store.sync(base_url)
+        m.get(f"{base_url}/notes", json=many)
+        m.get(f"{base_url}/notes/no-content", json=many)
+        for i in range(1, 6):
+            m.get(f"{base_url}/notes/{i}", status_code=405)
+        m.reset_mock()
+        stats = store.sync(base_url)
+
+        requested = [request.path for request in m.request_history]
+        assert requested.count("/notes") == 1
+        assert requested.count("/notes/1") == 1
+
+    assert stats["notes_fetched"] == 5
+    assert store.get_notes() == many
+
+
+def test_open_store_requires_sync(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        open_store(tmp_path / "missing.sqlite3")
+
+
+if __name__ == "__main__":
+    pytest.main()
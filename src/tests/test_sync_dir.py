@@ -0,0 +1,273 @@
+import re
+from pathlib import Path
+import pytest
+import requests_mock
+from notes import clear_note_cache
+from sync_dir import STATE_FILE, DirectorySync, plan_paths, render_note
+
+base_url = "http://localhost:37238"
+
+
+class FakeServer:
+    """Just enough of the notes API to sync against, counting the writes."""
+
+    def __init__(self, m, notes):
+        self.notes = {}
+        self.parents = {}
+        self.clock = 0
+        self.writes = []
+        self.reads = []
+        for note in notes:
+            self.add(note["title"], note["content"], note["id"])
+        note_id = re.compile(rf"{base_url}/notes/\d+$")
+        hierarchy_id = re.compile(rf"{base_url}/notes/hierarchy/\d+$")
+        m.get(f"{base_url}/notes", json=lambda *_: list(self.notes.values()))
+        m.get(f"{base_url}/notes/no-content", json=self.listing)
+        m.get(f"{base_url}/notes/tree", json=self.tree)
+        m.get(note_id, json=self.get)
+        m.put(note_id, json=self.update)
+        m.delete(note_id, json=self.delete)
+        m.post(f"{base_url}/notes", json=self.create)
+        m.post(f"{base_url}/notes/hierarchy", json=self.link)
+        m.put(hierarchy_id, json=self.link)
+        m.delete(hierarchy_id, json=self.unlink)
+
+    def id(self, request):
+        return int(request.path.rsplit("/", 1)[1])
+
+    def touch(self, note_id):
+        self.clock += 1
+        self.notes[note_id]["modified_at"] = f"2024-10-20T05:{self.clock:05d}Z"
+
+    def add(self, title, content, note_id=None):
+        note_id = note_id or max(self.notes, default=0) + 1
+        self.notes[note_id] = {"id": note_id, "title": title, "content": content}
+        self.touch(note_id)
+        return note_id
+
+    def listing(self, request, context):
+        return [
+            {key: value for key, value in note.items() if key != "content"}
+            for note in self.notes.values()
+        ]
+
+    def tree(self, request, context):
+        def node(note_id):
+            children = [c for c, p in self.parents.items() if p == note_id]
+            return {"id": note_id, "type": "", "children": [node(c) for c in children]}
+
+        return [node(i) for i in self.notes if i not in self.parents]
+
+    def get(self, request, context):
+        self.reads.append(self.id(request))
+        return self.notes[self.id(request)]
+
+    def update(self, request, context):
+        note_id = self.id(request)
+        self.writes.append(("update", note_id))
+        self.notes[note_id].update(request.json())
+        self.touch(note_id)
+        return {"id": note_id, "message": "Note updated successfully"}
+
+    def delete(self, request, context):
+        note_id = self.id(request)
+        self.writes.append(("delete", note_id))
+        del self.notes[note_id]
+        return {"message": "Note deleted successfully"}
+
+    def create(self, request, context):
+        note_id = self.add(**request.json())
+        self.writes.append(("create", note_id))
+        return {"id": note_id, "message": "Note created successfully"}
+
+    def link(self, request, context):
+        body = request.json()
+        child = body.get("child_note_id") or self.id(request)
+        self.writes.append(("link", child))
+        self.parents[child] = body["parent_note_id"]
+        return {"message": "Note hierarchy entry added successfully"}
+
+    def unlink(self, request, context):
+        self.writes.append(("unlink", self.id(request)))
+        del self.parents[self.id(request)]
+        return {"message": "Note hierarchy entry deleted successfully"}
+
+
+@pytest.fixture
+def server():
+    # Other tests leave servers marked as lacking GET /notes/{id}
+    clear_note_cache()
+    with requests_mock.Mocker() as m:
+        server = FakeServer(
+            m,
+            [
+                {"id": 1, "title": "Projects", "content": "All of them"},
+                {"id": 2, "title": "Alpha: the first", "content": "Started"},
+                {"id": 3, "title": "Inbox", "content": "Nothing yet"},
+            ],
+        )
+        server.parents[2] = 1
+        yield server
+
+
+def sync(directory):
+    return DirectorySync(directory, base_url).sync()
+
+
+def test_plan_paths():
+    parents = {1: None, 2: 1, 3: None, 4: None, 5: 6, 6: 5}
+    titles = {1: "Foo", 2: "a/b", 3: "New", 4: "Foo", 5: "Loop", 6: "Back"}
+
+    # Note 3 is new, so note 4 keeps the name its file has. Notes 5 and 6
+    # are each other's parent, so neither is under the other.
+    assert plan_paths(parents, titles, {4: "New"}) == {
+        1: "Foo.md",
+        2: "Foo/a-b.md",
+        3: "New-3.md",
+        4: "New.md",
+        5: "Loop.md",
+        6: "Back.md",
+    }
+
+
+def test_sync_dir_pulls_notes_as_a_tree(server, tmp_path):
+    stats = sync(tmp_path)
+
+    assert stats["pulled"] == 3
+    assert (tmp_path / "Projects" / "Alpha- the first.md").read_text() == render_note(
+        server.notes[2]
+    )
+    assert (tmp_path / "Inbox.md").exists()
+    assert (tmp_path / STATE_FILE).exists()
+
+    # Nothing changed, so no note is read or sent
+    server.reads.clear()
+    stats = sync(tmp_path)
+    assert stats["pulled"] == stats["pushed"] == 0
+    assert server.reads == server.writes == []
+
+
+def test_sync_dir_pushes_only_edited_files(server, tmp_path):
+    sync(tmp_path)
+    path = tmp_path / "Inbox.md"
+    path.write_text(path.read_text().replace("Nothing yet", "Call the bank"))
+
+    stats = sync(tmp_path)
+
+    assert stats["pushed"] == 1 and stats["pulled"] == 0
+    assert server.writes == [("update", 3)]
+    assert server.notes[3]["content"] == "Call the bank"
+    # The push is not pulled back
+    assert sync(tmp_path)["pulled"] == 0
+    assert server.writes == [("update", 3)]
+
+
+def test_sync_dir_pulls_only_changed_notes(server, tmp_path):
+    sync(tmp_path)
+    server.notes[1]["content"] = "Some of them"
+    server.touch(1)
+    server.reads.clear()
+
+    stats = sync(tmp_path)
+
+    assert stats["pulled"] == 1
+    assert server.reads == [1]
+    assert "Some of them" in (tmp_path / "Projects.md").read_text()
+
+
+def test_sync_dir_creates_and_deletes(server, tmp_path):
+    sync(tmp_path)
+    (tmp_path / "Projects" / "Beta.md").write_text("# Beta\n\nPlanned")
+    (tmp_path / "Inbox.md").unlink()
+    del server.notes[2]
+
+    stats = sync(tmp_path)
+
+    assert stats["created"] == stats["deleted_remote"] == stats["deleted_local"] == 1
+    assert ("delete", 3) in server.writes
+    beta = max(server.notes)
+    assert server.notes[beta]["title"] == "Beta"
+    assert server.parents[beta] == 1
+    # The new note's ID is written into its file
+    assert (
+        (tmp_path / "Projects" / "Beta.md").read_text().startswith(f"---\nid: {beta}")
+    )
+    assert not (tmp_path / "Projects" / "Alpha- the first.md").exists()
+
+
+def test_sync_dir_follows_moves(server, tmp_path):
+    sync(tmp_path)
+    # Moved into a folder here, and out of one on the server
+    (tmp_path / "Projects").mkdir(exist_ok=True)
+    (tmp_path / "Inbox.md").rename(tmp_path / "Projects" / "Inbox.md")
+    del server.parents[2]
+
+    stats = sync(tmp_path)
+
+    assert stats["moved"] == 1
+    assert server.parents == {3: 1}
+    assert (tmp_path / "Alpha- the first.md").exists()
+    assert (tmp_path / "Projects" / "Inbox.md").exists()
+
+
+def test_sync_dir_moves_under_a_new_note(server, tmp_path):
+    sync(tmp_path)
+    (tmp_path / "Area.md").write_text("# Area\n\nEverything")
+    (tmp_path / "Area").mkdir()
+    (tmp_path / "Inbox.md").rename(tmp_path / "Area" / "Inbox.md")
+
+    stats = sync(tmp_path)
+
+    area = max(server.notes)
+    assert stats["created"] == stats["moved"] == 1
+    assert server.parents[3] == area
+    assert (tmp_path / "Area" / "Inbox.md").exists()
+    assert sync(tmp_path)["moved"] == 0
+
+
+def test_sync_dir_finishes_moves_after_a_crash(server, tmp_path, monkeypatch):
+    sync(tmp_path)
+    server.parents[3] = 1
+    replace = Path.replace
+
+    def crash(path, target):
+        if path.name.endswith(".moving"):
+            raise KeyboardInterrupt
+        return replace(path, target)
+
+    # Stopped with the file set aside under a hidden name
+    monkeypatch.setattr(Path, "replace", crash)
+    with pytest.raises(KeyboardInterrupt):
+        sync(tmp_path)
+    monkeypatch.undo()
+    assert (tmp_path / ".Inbox.md.moving").exists()
+
+    stats = sync(tmp_path)
+
+    assert stats["deleted_remote"] == 0 and 3 in server.notes
+    assert (tmp_path / "Projects" / "Inbox.md").exists()
+    assert not list(tmp_path.rglob("*.moving"))
+
+
+def test_sync_dir_keeps_both_sides_of_a_conflict(server, tmp_path):
+    sync(tmp_path)
+    path = tmp_path / "Inbox.md"
+    path.write_text(path.read_text().replace("Nothing yet", "Mine"))
+    server.notes[3]["content"] = "Theirs"
+    server.touch(3)
+
+    stats = sync(tmp_path)
+
+    assert stats["conflicts"] == 1
+    assert server.notes[3]["content"] == "Mine"
+    assert "Theirs" in (tmp_path / "Inbox.md.conflict").read_text()
+
+
+def test_sync_dir_refuses_to_delete_everything(server, tmp_path):
+    sync(tmp_path)
+    for path in tmp_path.rglob("*.md"):
+        path.unlink()
+
+    with pytest.raises(ValueError):
+        sync(tmp_path)
+    assert len(server.notes) == 3
@@ -0,0 +1,123 @@
+import random
+import pytest
+from tag_query import TagBitmaps, TagQueryError, parse_tag_query, query_tags
+from tags import TagClosure
+
+
+def tags_with_notes():
+    def notes(*ids):
+        return [{"id": i, "title": f"Note {i}"} for i in ids]
+
+    return [
+        {"tag_id": 1, "tag_name": "urgent", "notes": notes(1, 2, 3)},
+        {"tag_id": 2, "tag_name": "important", "notes": notes(3, 4)},
+        {"tag_id": 3, "tag_name": "done", "notes": notes(2, 4, 5)},
+        {"tag_id": 4, "tag_name": "project", "notes": notes(6)},
+        {"tag_id": 5, "tag_name": "project/alpha", "notes": notes(7)},
+        {"tag_id": 6, "tag_name": "empty", "notes": None},
+    ]
+
+
+def test_parse_tag_query_precedence():
+    assert parse_tag_query("(urgent | important) & !done") == (
+        "and",
+        [("or", [("tag", "urgent"), ("tag", "important")]), ("not", ("tag", "done"))],
+    )
+    # NOT binds tightest and OR loosest, adjacent tags are ANDed
+    assert parse_tag_query("a b | !c && d") == (
+        "or",
+        [
+            ("and", [("tag", "a"), ("tag", "b")]),
+            ("and", [("not", ("tag", "c")), ("tag", "d")]),
+        ],
+    )
+    assert parse_tag_query("a OR NOT b") == parse_tag_query("a | !b")
+    assert parse_tag_query('"to do" & "OR" & project/alpha') == (
+        "and",
+        [("tag", "to do"), ("tag", "OR"), ("tag", "project/alpha")],
+    )
+
+
+@pytest.mark.parametrize("text", ["", "a &", "(a | b", "a )", "| a", '"open'])
+def test_parse_tag_query_rejects_malformed_queries(text):
+    with pytest.raises(TagQueryError):
+        parse_tag_query(text)
+
+
+def test_query_tags():
+    assert query_tags(parse_tag_query("(a | b) & !c & a")) == {"a", "b", "c"}
+
+
+def test_tag_bitmaps_select():
+    bitmaps = TagBitmaps(tags_with_notes())
+
+    assert bitmaps.select("(urgent | important) & !done") == [1, 3]
+    assert bitmaps.select("urgent important") == [3]
+    assert bitmaps.select("!urgent") == [4, 5, 6, 7]
+    assert bitmaps.select("empty | missing") == []
+    assert not bitmaps.known("missing")
+
+
+def test_tag_bitmaps_within_untagged_notes():
+    bitmaps = TagBitmaps(tags_with_notes())
+
+    # Note 99 has no tags, so only NOT can match it
+    assert bitmaps.select("!done", within=[1, 2, 99]) == [1, 99]
+    assert bitmaps.select("urgent", within=[3, 99]) == [3]
+    # Later queries over every note leave it out again
+    assert bitmaps.select("!urgent") == [4, 5, 6, 7]
+    assert bitmaps.select("!(urgent | important | done | project)") == [7]
+
+
+def test_tag_bitmaps_match_descendants():
+    closure = TagClosure(
+        [
+            {
+                "id": 4,
+                "name": "project",
+                "children": [{"id": 5, "name": "project/alpha"}],
+            }
+        ]
+    )
+    bitmaps = TagBitmaps(tags_with_notes(), closure)
+
+    assert bitmaps.select("project") == [6, 7]
+    assert bitmaps.select("project", exact=True) == [6]
+    assert bitmaps.select("project & !project/alpha") == [6]
+
+
+def test_tag_bitmaps_agree_with_sets():
+    rng = random.Random(0)
+    note_ids = range(1, 2001)
+    tags = [
+        {
+            "tag_id": t,
+            "tag_name": f"t{t}",
+            "notes": [
+                {"id": i, "title": ""} for i in rng.sample(note_ids, rng.randrange(200))
+            ],
+        }
+        for t in range(6)
+    ]
+    sets = {tag["tag_name"]: {note["id"] for note in tag["notes"]} for tag in tags}
+    bitmaps = TagBitmaps(tags)
+    universe = set().union(*sets.values())
+
+    def expected(query):
+        kind = query[0]
+        if kind == "tag":
+            return sets[query[1]]
+        if kind == "not":
+            return universe - expected(query[1])
+        results = [expected(operand) for operand in query[1]]
+        return set.intersection(*results) if kind == "and" else set.union(*results)
+
+    for text in [
+        "t0 & t1",
+        "t0 | t1 | t2",
+        "!(t0 | t1) & (t2 | !t3)",
+        "(t4 t5) | !t0 | t1",
+        "!!t2 & !t3",
+    ]:
+        query = parse_tag_query(text)
+        assert bitmaps.select(query) == sorted(expected(query))
@@ -13,6 +13,11 @@ from tags import (
     update_tag_hierarchy,
     delete_tag_hierarchy_entry,
     list_tags_with_notes,
+    get_tags,
+    get_tag_index,
+    get_tag_closure,
+    TagIndex,
+    TagClosure,
 )
 
 
@@ -171,5 +176,142 @@ def test_list_tags_with_notes():
         assert response == expected_response
 
 
+def test_get_tags():
+    base_url = "http://localhost:37238"
+    expected_response = [{"id": 4, "name": "done"}, {"id": 1, "name": "important"}]
+
+    with requests_mock.Mocker() as m:
+        m.get(f"{base_url}/tags", json=expected_response)
+        assert get_tags(base_url) == expected_response
+
+
+def test_tag_index_resolves_duplicate_names():
+    base_url = "http://localhost:37238"
+    tags = [
+        {"id": 1, "name": "important"},
+        {"id": 4, "name": "done"},
+        {"id": 5, "name": "important"},
+    ]
+
+    with requests_mock.Mocker() as m:
+        m.get(f"{base_url}/tags", json=tags)
+        index = TagIndex(base_url)
+        assert index.ids("important") == [1, 5]
+        assert index.resolve("important") == 1
+        assert index.name(4) == "done"
+        assert m.call_count == 1
+
+
+def test_tag_index_refreshes_on_miss_and_ttl():
+    base_url = "http://localhost:37238"
+
+    with requests_mock.Mocker() as m:
+        m.get(f"{base_url}/tags", json=[{"id": 1, "name": "done"}])
+        index = TagIndex(base_url, ttl=60)
+        assert index.resolve("todo") is None
+        assert m.call_count == 1
+
+        m.get(
+            f"{base_url}/tags",
+            json=[{"id": 1, "name": "done"}, {"id": 2, "name": "todo"}],
+        )
+        assert index.resolve("todo") == 2
+        assert m.call_count == 2
+
+        index.ttl = 0
+        assert index.resolve("done") == 1
+        assert m.call_count == 3
+
+
+def test_tag_index_follows_tag_writes():
+    base_url = "http://example.com"
+
+    with requests_mock.Mocker() as m:
+        m.get(f"{base_url}/tags", json=[{"id": 1, "name": "done"}])
+        index = get_tag_index(base_url)
+        index.refresh()
+
+        m.post(f"{base_url}/tags", json={"id": 7, "message": "Tag created"})
+        create_tag("todo", base_url)
+        m.put(f"{base_url}/tags/1", json={"message": "Tag updated"})
+        update_tag(1, "finished", base_url)
+        m.delete(f"{base_url}/tags/7", json={"message": "Tag deleted"})
+        delete_tag(7, base_url)
+
+        assert index.resolve("finished") == 1
+        assert index.ids("todo") == []
+        # Only the miss on "todo" refetched the tags
+        assert m.call_count == 5
+
+
+def tag_tree():
+    alpha = {
+        "id": 2,
+        "name": "project/alpha",
+        "notes": [{"id": 2, "title": "Alpha"}],
+        "children": [
+            {"id": 4, "name": "draft", "notes": [{"id": 4, "title": "Sketch"}]}
+        ],
+    }
+    return [
+        {
+            "id": 1,
+            "name": "project",
+            "notes": [{"id": 1, "title": "Plan"}],
+            "children": [
+                alpha,
+                {"id": 3, "name": "project/beta", "notes": None, "children": []},
+            ],
+        },
+        # A second tag called "draft", and tag 2 again under another parent
+        {"id": 5, "name": "draft", "notes": [{"id": 5, "title": "Scrap"}]},
+        {"id": 6, "name": "shared", "notes": None, "children": [alpha]},
+    ]
+
+
+def test_tag_closure_expands_descendants():
+    closure = TagClosure(tag_tree())
+
+    assert closure.descendants(1) == {1, 2, 3, 4}
+    assert closure.descendants(6) == {6, 2, 4}
+    assert closure.descendants(99) == frozenset()
+    assert closure.expand("draft") == {4, 5}
+    assert closure.note_ids("project") == {1, 2, 4}
+    assert closure.note_ids("project", exact=True) == {1}
+    assert closure.notes("project/alpha") == [
+        {"id": 2, "title": "Alpha"},
+        {"id": 4, "title": "Sketch"},
+    ]
+    assert closure.note_ids("missing") == set()
+
+
+def test_tag_closure_handles_deep_hierarchies():
+    tree = node = {"id": 0, "name": "tag0", "notes": None, "children": []}
+    for tag_id in range(1, 2000):
+        child = {"id": tag_id, "name": f"tag{tag_id}", "notes": None, "children": []}
+        node["children"].append(child)
+        node = child
+    node["notes"] = [{"id": 1, "title": "Deep"}]
+
+    closure = TagClosure([tree])
+
+    assert len(closure.descendants(0)) == 2000
+    assert closure.note_ids("tag0") == {1}
+
+
+def test_get_tag_closure_is_rebuilt_after_hierarchy_changes():
+    base_url = "http://closure.example.com"
+
+    with requests_mock.Mocker() as m:
+        m.get(f"{base_url}/tags/tree", json=tag_tree())
+        closure = get_tag_closure(base_url)
+        assert get_tag_closure(base_url) is closure
+
+        m.post(f"{base_url}/tags/hierarchy", json={"message": "added"})
+        create_tag_hierarchy(5, 3, base_url)
+
+        assert get_tag_closure(base_url) is not closure
+
+
 if __name__ == "__main__":
     pytest.main()
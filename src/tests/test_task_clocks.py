@@ -0,0 +1,324 @@
+import time
+import pytest
+import requests_mock
+from datetime import date, datetime
+from store import LocalStore
+from task_clocks import (
+    OpenClocks,
+    audit_clocks,
+    clock_in,
+    clock_out,
+    clock_report,
+    clocks_frame,
+    fix_clocks,
+    note_tags_frame,
+)
+
+base_url = "http://localhost:37238"
+
+
+def tasks_details(*clocks):
+    return [{"id": 3, "note_id": 1, "status": "todo", "clocks": list(clocks)}]
+
+
+@pytest.fixture
+def state(tmp_path):
+    return OpenClocks(base_url, tmp_path / "open_clocks.json")
+
+
+def test_clock_out_uses_local_state(state):
+    with requests_mock.Mocker() as m:
+        m.post(f"{base_url}/task_clocks", json={"id": 12, "message": "created"})
+        m.put(f"{base_url}/task_clocks/12", json={"message": "updated"})
+
+        opened = clock_in(3, base_url, state)
+        assert OpenClocks(base_url, state.path).clocks == {
+            3: {"clock_id": 12, "clock_in": opened["clock_in"]}
+        }
+        closed = clock_out(3, base_url, state)
+
+        assert [r.method for r in m.request_history] == ["POST", "PUT"]
+        assert m.last_request.json() == {"clock_out": closed["clock_out"]}
+
+    assert closed["id"] == 12
+    assert OpenClocks(base_url, state.path).clocks == {}
+
+
+def test_clock_out_reconciles_when_missing_locally(state):
+    open_clock = {"id": 7, "clock_in": "2023-06-01T09:00:00Z", "clock_out": None}
+
+    with requests_mock.Mocker() as m:
+        m.get(f"{base_url}/tasks/details", json=tasks_details(open_clock))
+        m.put(f"{base_url}/task_clocks/7", json={"message": "updated"})
+        closed = clock_out(3, base_url, state)
+
+    assert closed["id"] == 7
+    assert state.clocks == {}
+
+
+def test_clock_out_reconciles_when_clock_was_deleted(state):
+    state.open(3, 12, "2024-10-21 09:00:00")
+    open_clock = {"id": 7, "clock_in": "2023-06-01T09:00:00Z", "clock_out": None}
+
+    with requests_mock.Mocker() as m:
+        m.put(
+            f"{base_url}/task_clocks/12", status_code=404, json={"error": "Not found"}
+        )
+        m.get(f"{base_url}/tasks/details", json=tasks_details(open_clock))
+        m.put(f"{base_url}/task_clocks/7", json={"message": "updated"})
+        assert clock_out(3, base_url, state)["id"] == 7
+
+
+def test_clock_out_leaves_a_clock_closed_elsewhere(state, monkeypatch, tmp_path):
+    monkeypatch.setenv("DRAFTSMITH_CACHE_DIR", str(tmp_path))
+    state.open(3, 12, "2024-10-21 09:00:00")
+    # Closed in the web UI, which a later sync mirrors
+    closed = {
+        "id": 12,
+        "clock_in": "2024-10-21 09:00:00",
+        "clock_out": "2024-10-21 09:45:00",
+    }
+
+    with requests_mock.Mocker() as m:
+        m.get(f"{base_url}/notes", json=[])
+        m.get(f"{base_url}/tags/with-notes", json=[])
+        m.get(f"{base_url}/tags/tree", json=[])
+        m.get(f"{base_url}/tasks/details", json=tasks_details(closed))
+        LocalStore().sync(base_url)
+        put = m.put(f"{base_url}/task_clocks/12", json={"message": "updated"})
+
+        assert clock_out(3, base_url, state) is None
+        assert not put.called
+    assert state.clocks == {}
+
+
+def test_clock_out_when_not_clocked_in(state):
+    closed_clock = {
+        "id": 7,
+        "clock_in": "2023-06-01T09:00:00Z",
+        "clock_out": "2023-06-01T10:00:00Z",
+    }
+
+    with requests_mock.Mocker() as m:
+        m.get(f"{base_url}/tasks/details", json=tasks_details(closed_clock))
+        assert clock_out(3, base_url, state) is None
+
+
+report_tasks = [
+    {
+        "id": 1,
+        "note_id": 10,
+        "status": "todo",
+        "clocks": [
+            {
+                "id": 1,
+                "clock_in": "2023-06-01T09:00:00Z",
+                "clock_out": "2023-06-01T10:30:00Z",
+            },
+            {
+                "id": 2,
+                "clock_in": "2023-06-08 09:00:00",
+                "clock_out": "2023-06-08 09:30:00",
+            },
+        ],
+    },
+    {
+        "id": 2,
+        "note_id": 20,
+        "clocks": [{"id": 3, "clock_in": "2023-06-08 12:00:00", "clock_out": None}],
+    },
+    {"id": 3, "note_id": 30, "clocks": None},
+]
+
+
+def test_clock_report_by_week_and_task():
+    now = datetime(2023, 6, 8, 13, 0)
+    report = clock_report(clocks_frame(report_tasks), ["week", "task"], now=now)
+
+    assert report.to_dicts() == [
+        {"week": "2023-W22", "task_id": 1, "clocks": 1, "hours": 1.5},
+        {"week": "2023-W23", "task_id": 1, "clocks": 1, "hours": 0.5},
+        {"week": "2023-W23", "task_id": 2, "clocks": 1, "hours": 1.0},
+    ]
+
+
+def test_clock_report_date_range_and_tags():
+    tags = [
+        {"tag_id": 1, "tag_name": "work", "notes": [{"id": 10}, {"id": 20}]},
+        {"tag_id": 2, "tag_name": "urgent", "notes": [{"id": 10}]},
+    ]
+    report = clock_report(
+        clocks_frame(report_tasks),
+        ["tag", "day"],
+        since=datetime(2023, 6, 8),
+        until=datetime(2023, 6, 9),
+        note_tags=note_tags_frame(tags),
+        now=datetime(2023, 6, 8, 12, 15),
+    )
+
+    assert report.to_dicts() == [
+        {"tag": "urgent", "day": date(2023, 6, 8), "clocks": 1, "hours": 0.5},
+        {"tag": "work", "day": date(2023, 6, 8), "clocks": 2, "hours": 0.75},
+    ]
+
+
+@pytest.fixture
+def sydney(monkeypatch):
+    monkeypatch.setenv("TZ", "Australia/Sydney")
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+
+def test_clocks_frame_converts_time_zones_to_local_time(sydney):
+    tasks = [
+        {
+            "id": 3,
+            "note_id": 1,
+            "clocks": [
+                # 10:00 to 12:00 in Sydney, a day later than in UTC
+                {
+                    "id": 1,
+                    "clock_in": "2024-10-20T23:00:00Z",
+                    "clock_out": "2024-10-21T01:00:00.250Z",
+                },
+                {
+                    "id": 2,
+                    "clock_in": "2024-10-21T09:00:00+09:00",
+                    "clock_out": "2024-10-21 11:30:00",
+                },
+            ],
+        }
+    ]
+    frame = clocks_frame(tasks).collect()
+
+    assert frame.select("clock_in", "clock_out").rows() == [
+        (datetime(2024, 10, 21, 10), datetime(2024, 10, 21, 12)),
+        (datetime(2024, 10, 21, 11), datetime(2024, 10, 21, 11, 30)),
+    ]
+    report = clock_report(clocks_frame(tasks), [], now=datetime(2024, 10, 21, 13))
+    assert report.to_dicts() == [{"clocks": 2, "hours": 2.5}]
+
+
+def test_clock_report_rejects_unknown_groups():
+    with pytest.raises(ValueError):
+        clock_report(clocks_frame(report_tasks), ["year"])
+
+
+if __name__ == "__main__":
+    pytest.main()
+
+
+def audited_tasks():
+    def clock(id, clock_in, clock_out):
+        return {"id": id, "clock_in": clock_in, "clock_out": clock_out}
+
+    return [
+        {
+            "id": 3,
+            "clocks": [
+                clock(1, "2024-10-21 09:00:00", "2024-10-21 11:00:00"),
+                # Inverted, and once swapped overlaps clock 1
+                clock(2, "2024-10-21 12:00:00", "2024-10-21 10:00:00"),
+                # Left open, closed when task 3 is next clocked in
+                clock(3, "2024-10-22 09:00:00", None),
+                clock(4, "2024-10-22 13:00:00", "2024-10-22 14:00:00"),
+            ],
+        },
+        {
+            "id": 7,
+            "clocks": [
+                # Inside clock 1 of another task
+                clock(5, "2024-10-21 09:30:00", "2024-10-21 10:30:00"),
+                clock(6, "2024-10-23 09:00:00", "2024-10-23 10:00:00"),
+                # Still running
+                clock(7, "2024-10-23 16:00:00", None),
+            ],
+        },
+    ]
+
+
+def test_audit_clocks():
+    issues = audit_clocks(
+        clocks_frame(audited_tasks()), now=datetime(2024, 10, 23, 17)
+    ).to_dicts()
+
+    assert [
+        (i["clock_id"], i["issues"], i["action"], i["new_clock_in"], i["new_clock_out"])
+        for i in issues
+    ] == [
+        (5, "overlap", "delete", None, None),
+        (
+            2,
+            "inverted, overlap",
+            "update",
+            "2024-10-21 11:00:00",
+            "2024-10-21 12:00:00",
+        ),
+        (3, "stale", "update", None, "2024-10-22 13:00:00"),
+    ]
+
+
+def test_audit_clocks_stale_limit():
+    tasks = [{"id": 3, "clocks": [{"id": 1, "clock_in": "2024-10-21 09:00:00"}]}]
+
+    now = datetime(2024, 10, 21, 12)
+
+    issues = audit_clocks(clocks_frame(tasks), max_open_hours=2, now=now)
+    assert issues.select("clock_id", "new_clock_out").rows() == [
+        (1, "2024-10-21 11:00:00")
+    ]
+    assert audit_clocks(clocks_frame(tasks), max_open_hours=4, now=now).is_empty()
+
+
+def test_audit_clocks_never_closes_after_now():
+    tasks = [
+        {
+            "id": 3,
+            "clocks": [
+                # Inverted, swapping it would close it after now
+                {
+                    "id": 1,
+                    "clock_in": "2024-10-21 18:00:00",
+                    "clock_out": "2024-10-21 16:00:00",
+                },
+                {"id": 2, "clock_in": "2024-10-22 09:00:00", "clock_out": None},
+            ],
+        }
+    ]
+    issues = audit_clocks(clocks_frame(tasks), now=datetime(2024, 10, 21, 17))
+
+    assert issues.select("clock_id", "new_clock_in", "new_clock_out").rows() == [
+        (1, "2024-10-21 16:00:00", "2024-10-21 17:00:00")
+    ]
+
+
+def test_audit_clocks_running_in_another_time_zone(sydney):
+    # Clocked in an hour ago, 09:00 in Sydney
+    tasks = [{"id": 3, "clocks": [{"id": 1, "clock_in": "2024-10-20T22:00:00Z"}]}]
+    now = datetime(2024, 10, 21, 10)
+
+    assert audit_clocks(clocks_frame(tasks), max_open_hours=2, now=now).is_empty()
+
+
+def test_fix_clocks():
+    issues = audit_clocks(
+        clocks_frame(audited_tasks()), now=datetime(2024, 10, 23, 17)
+    ).to_dicts()
+
+    with requests_mock.Mocker() as m:
+        m.delete(f"{base_url}/task_clocks/5", json={"message": "deleted"})
+        m.put(f"{base_url}/task_clocks/2", json={"message": "updated"})
+        m.put(f"{base_url}/task_clocks/3", status_code=500, json={"error": "failed"})
+
+        result = fix_clocks(issues, base_url, workers=2)
+
+        assert result["updated"] == 1
+        assert result["deleted"] == 1
+        assert result["errors"] == [(3, "failed")]
+        updates = {r.url: r.json() for r in m.request_history if r.method == "PUT"}
+        assert updates[f"{base_url}/task_clocks/2"] == {
+            "clock_in": "2024-10-21 11:00:00",
+            "clock_out": "2024-10-21 12:00:00",
+        }
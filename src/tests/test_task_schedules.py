@@ -0,0 +1,119 @@
+import random
+from datetime import datetime, timedelta
+from task_schedules import (
+    Schedule,
+    ScheduleIndex,
+    agenda,
+    find_conflicts,
+    schedule_intervals,
+)
+
+
+def at(hour, minute=0, day=1):
+    return datetime(2023, 6, day, hour, minute)
+
+
+def schedule(id, start, end, task_id=3):
+    return Schedule(id, task_id, start, end)
+
+
+def test_schedule_intervals():
+    tasks = [
+        {
+            "id": 3,
+            "schedules": [
+                {
+                    "id": 2,
+                    "start_datetime": "2023-06-02 09:00:00",
+                    "end_datetime": "2023-06-02 10:00:00",
+                },
+                {
+                    "id": 1,
+                    "start_datetime": "2023-06-01 09:00:00",
+                    "end_datetime": "2023-06-01 17:00:00",
+                },
+            ],
+        },
+        {"id": 7, "schedules": None},
+    ]
+
+    assert schedule_intervals(tasks) == [
+        schedule(1, at(9), at(17)),
+        schedule(2, at(9, day=2), at(10, day=2)),
+    ]
+
+
+def test_find_conflicts():
+    schedules = [
+        schedule(1, at(9), at(12)),
+        schedule(2, at(11), at(13)),
+        schedule(3, at(12, 30), at(14)),
+        # Touching the previous window is not a conflict
+        schedule(4, at(14), at(15)),
+        schedule(5, at(16), at(18)),
+        schedule(6, at(17), at(17, 30)),
+    ]
+    random.Random(0).shuffle(schedules)
+
+    assert [[s.id for s in window] for window in find_conflicts(schedules)] == [
+        [1, 2, 3],
+        [5, 6],
+    ]
+
+
+def test_schedule_index_matches_pairwise_overlaps():
+    rng = random.Random(1)
+    start = at(0)
+    schedules = []
+    for i in range(300):
+        begin = start + timedelta(minutes=rng.randrange(10_000))
+        schedules.append(
+            schedule(i, begin, begin + timedelta(minutes=rng.randrange(1, 600)))
+        )
+    index = ScheduleIndex(schedules)
+
+    for _ in range(100):
+        begin = start + timedelta(minutes=rng.randrange(10_000))
+        end = begin + timedelta(minutes=rng.randrange(1, 300))
+        expected = {s.id for s in schedules if s.overlaps(begin, end)}
+        found = index.overlapping(begin, end)
+        assert {s.id for s in found} == expected
+        assert found == sorted(found, key=lambda s: (s.start, s.end))
+
+
+def test_schedule_index_with_an_all_year_schedule(monkeypatch):
+    schedules = [schedule(0, at(0), datetime(2024, 6, 1))]
+    for i in range(1, 2000):
+        begin = at(0) + timedelta(hours=i)
+        schedules.append(schedule(i, begin, begin + timedelta(minutes=30)))
+    index = ScheduleIndex(schedules)
+
+    checked = []
+    overlaps = Schedule.overlaps
+    monkeypatch.setattr(
+        Schedule, "overlaps", lambda s, *args: checked.append(s) or overlaps(s, *args)
+    )
+    begin = at(0) + timedelta(hours=1500)
+    found = index.overlapping(begin, begin + timedelta(minutes=10))
+
+    assert [s.id for s in found] == [0, 1500]
+    # The long schedule does not make every earlier schedule a candidate
+    assert len(checked) < 50
+
+
+def test_agenda():
+    schedules = [
+        schedule(1, at(9), at(12)),
+        # Outside the agenda, but it overlaps schedule 3
+        schedule(2, at(19), at(22, 30)),
+        schedule(3, at(22), at(1, day=2)),
+        schedule(4, at(9, day=2), at(10, day=2)),
+        schedule(5, at(9, day=9), at(10, day=9)),
+    ]
+
+    rows = agenda(schedules, at(23), at(0, day=8))
+
+    assert [(row["id"], row["conflict"]) for row in rows] == [
+        (3, True),
+        (4, False),
+    ]
@@ -7,6 +7,7 @@ from tasks import (
     update_task,
     delete_task,
     get_tasks_details,
+    iter_tasks_details,
     get_tasks_tree,
     create_task_schedule,
     update_task_schedule,
@@ -149,6 +150,7 @@ def test_get_tasks_details():
         m.get(f"{base_url}/tasks/details", json=expected_response)
         response = get_tasks_details(base_url)
         assert response == expected_response
+        assert list(iter_tasks_details(base_url)) == expected_response
 
 
 def test_get_tasks_tree():
@@ -0,0 +1,118 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+import requests_mock
+import tracing
+from api_client import ApiClient
+from notes import get_notes, iter_notes
+from tracing import TRACE_FILE_ENV, finish_trace, format_waterfall, start_trace
+
+base_url = "http://localhost:37238"
+notes = [{"id": i, "title": f"Note {i}", "content": "x" * 100} for i in range(50)]
+
+
+@pytest.fixture(autouse=True)
+def no_trace_file(monkeypatch):
+    monkeypatch.delenv(TRACE_FILE_ENV, raising=False)
+    yield
+    finish_trace()
+
+
+def test_trace_records_requests():
+    tracer = start_trace("notes list", show=True)
+    with requests_mock.Mocker() as m:
+        m.get(f"{base_url}/notes", json=notes)
+        m.get(f"{base_url}/notes/search?q=a%20b", json=[])
+        assert get_notes(base_url) == notes
+        ApiClient(base_url).get(f"{base_url}/notes/search?q=a%20b")
+
+    first, second = tracer.records
+    assert first["method"] == "GET" and first["path"] == "/notes"
+    assert first["status"] == 200
+    assert first["bytes"] == len(json.dumps(notes))
+    assert first["decode_ms"] > 0 and first["total_ms"] >= first["ttfb_ms"] >= 0
+    assert second["path"] == "/notes/search?q=a%20b"
+    assert second["start_ms"] >= first["start_ms"]
+
+
+def test_trace_records_streamed_responses():
+    tracer = start_trace("notes list --format ndjson", show=True)
+    with requests_mock.Mocker() as m:
+        m.get(f"{base_url}/notes", json=notes)
+        assert list(iter_notes(base_url)) == notes
+
+    (record,) = tracer.records
+    assert record["streamed"]
+    assert record["bytes"] == len(json.dumps(notes))
+    assert record["decode_ms"] > 0
+
+
+def test_no_trace_unless_asked():
+    assert start_trace("notes list") is None
+    with requests_mock.Mocker() as m:
+        m.get(f"{base_url}/notes", json=notes)
+        response = ApiClient(base_url).get(f"{base_url}/notes")
+    assert not hasattr(response, "trace")
+    assert tracing.current() is None
+
+
+def test_trace_file_gets_a_line_per_request(monkeypatch, tmp_path):
+    path = tmp_path / "trace.jsonl"
+    monkeypatch.setenv(TRACE_FILE_ENV, str(path))
+    for _ in range(2):
+        start_trace("notes list")
+        with requests_mock.Mocker() as m:
+            m.get(f"{base_url}/notes", json=notes)
+            get_notes(base_url)
+        finish_trace()
+
+    records = [json.loads(line) for line in path.read_text().splitlines()]
+    assert len(records) == 2
+    assert records[0]["command"] == "notes list"
+    assert records[0]["path"] == "/notes" and records[0]["status"] == 200
+
+
+def test_trace_times_new_connections():
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            self.send_response(200)
+            self.send_header("Content-Length", "2")
+            self.end_headers()
+            self.wfile.write(b"[]")
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://localhost:{server.server_address[1]}/notes"
+    try:
+        tracer = start_trace("notes list", show=True)
+        client = ApiClient()
+        client.get(url)
+        client.get(url)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    opened, reused = tracer.records
+    assert opened["dns_ms"] >= 0 and opened["connect_ms"] >= 0
+    # The second request reuses the pooled connection
+    assert reused["dns_ms"] is None and reused["connect_ms"] is None
+
+
+def test_format_waterfall():
+    tracer = start_trace("tags search plan", show=True)
+    with requests_mock.Mocker() as m:
+        m.get(f"{base_url}/notes", json=notes)
+        get_notes(base_url)
+    with tracing.phase("polars"):
+        pass
+
+    waterfall = format_waterfall(tracer)
+    assert waterfall.startswith("Trace of `tags search plan`")
+    assert "GET    /notes" in waterfall
+    assert "network" in waterfall and "polars" in waterfall
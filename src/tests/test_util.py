@@ -0,0 +1,52 @@
+import threading
+import time
+import pytest
+from utils import cache_dir, map_concurrently, run_concurrently
+
+
+def test_cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv("DRAFTSMITH_CACHE_DIR", str(tmp_path / "cache"))
+    assert cache_dir() == tmp_path / "cache"
+    assert cache_dir().is_dir()
+
+
+def test_run_concurrently_overlaps_calls():
+    # Both calls must be running at once to get past the barrier
+    barrier = threading.Barrier(2, timeout=5)
+
+    def call(value):
+        barrier.wait()
+        return value
+
+    assert run_concurrently(lambda: call("a"), lambda: call("b")) == ["a", "b"]
+
+
+def test_run_concurrently_raises():
+    def fail():
+        raise ValueError("boom")
+
+    with pytest.raises(ValueError, match="boom"):
+        run_concurrently(lambda: 1, fail)
+
+
+def test_run_concurrently_waits_for_every_call_before_raising():
+    finished = threading.Event()
+
+    def fail():
+        raise ValueError("boom")
+
+    def slow():
+        time.sleep(0.1)
+        finished.set()
+
+    with pytest.raises(ValueError, match="boom"):
+        run_concurrently(fail, slow)
+    assert finished.is_set()
+
+
+def test_map_concurrently_keeps_order():
+    assert map_concurrently(lambda x: x * 2, range(20)) == list(range(0, 40, 2))
+
+
+if __name__ == "__main__":
+    pytest.main()
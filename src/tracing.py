@@ -0,0 +1,348 @@
+import atexit
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+# Imported by every command for --trace, so codec and urllib are imported
+# only once there is something to trace
+
+# Append a JSON line per request to this file, with or without --trace
+TRACE_FILE_ENV = "DRAFTSMITH_TRACE_FILE"
+WATERFALL_WIDTH = 30
+
+# The DNS and connect times, in seconds, of the connection this thread just
+# opened, set by the connections of `api_client.ApiClient`
+connection = threading.local()
+
+
+class Tracer:
+    """
+    The requests made while tracing a command, and where its time went.
+
+    Every request sent through `ApiClient.request` is recorded with its
+    method, path, status, body size and its DNS, connect, time to first byte,
+    total and decode times in milliseconds. `start_ms` is when it was sent,
+    from the start of the trace.
+
+    Args:
+        command (str): The command line being traced.
+        show (bool): Print the waterfall from `finish_trace`.
+        path (Optional[str]): The JSONL file the records are appended to.
+        startup (Optional[float]): Seconds from the process starting to the command starting.
+    """
+
+    def __init__(
+        self,
+        command: str,
+        show: bool = False,
+        path: Optional[str] = None,
+        startup: Optional[float] = None,
+    ):
+        self.command = command
+        self.show = show
+        self.path = path
+        self.startup = startup
+        self.started = time.perf_counter()
+        self.started_at = time.time()
+        self.records: List[Dict[str, Any]] = []
+        self.phases: Dict[str, float] = {}
+        self._written = 0
+        self._lock = threading.Lock()
+
+    def elapsed_ms(self, since: Optional[float] = None) -> float:
+        return (time.perf_counter() - (since or self.started)) * 1000
+
+    def add(self, record: Dict[str, Any]) -> None:
+        with self._lock:
+            self.records.append(record)
+
+    def flush(self) -> None:
+        """Append the records not yet written to the JSONL file, if there is one."""
+        with self._lock:
+            records, self._written = self.records[self._written :], len(self.records)
+        if not self.path or not records:
+            return
+        import codec
+
+        lines = b"".join(
+            codec.dumps({"command": self.command, "pid": os.getpid(), **record}) + b"\n"
+            for record in records
+        )
+        with open(self.path, "ab") as f:
+            f.write(lines)
+
+
+_tracer: Optional[Tracer] = None
+_measure_startup = True
+
+
+def _process_age() -> Optional[float]:
+    # Seconds since this process started, from /proc, so where there is one
+    try:
+        with open("/proc/self/stat") as f:
+            started = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+    except (OSError, IndexError, ValueError):
+        return None
+    return max(0.0, uptime - started / os.sysconf("SC_CLK_TCK"))
+
+
+def skip_startup() -> None:
+    """Leave the startup time out of traces, as in a long running process."""
+    global _measure_startup
+    _measure_startup = False
+
+
+def start_trace(command: str, show: bool = False) -> Optional[Tracer]:
+    """
+    Start tracing a command's requests.
+
+    Nothing is traced unless `show` is set or `$DRAFTSMITH_TRACE_FILE` names
+    a file to append the records to.
+
+    Args:
+        command (str): The command line, kept with each record.
+        show (bool): Print a waterfall of the requests from `finish_trace`.
+
+    Returns:
+        Optional[Tracer]: The new tracer, or None when not tracing.
+    """
+    global _tracer, _measure_startup
+    path = os.environ.get(TRACE_FILE_ENV) or None
+    if not (show or path):
+        _tracer = None
+        return None
+    startup = _process_age() if _measure_startup else None
+    # Only the first command in a process pays for its startup
+    _measure_startup = False
+    _tracer = Tracer(command, show, path, startup)
+    return _tracer
+
+
+def finish_trace() -> Optional[Tracer]:
+    """
+    Stop tracing, write the records and print the waterfall when asked for.
+
+    Returns:
+        Optional[Tracer]: The finished tracer, or None when not tracing.
+    """
+    global _tracer
+    tracer, _tracer = _tracer, None
+    if tracer is None:
+        return None
+    tracer.flush()
+    if tracer.show:
+        print(format_waterfall(tracer), file=sys.stderr)
+    return tracer
+
+
+def current() -> Optional[Tracer]:
+    """
+    Return the active tracer, if any.
+
+    When `$DRAFTSMITH_TRACE_FILE` is set outside the CLI, a tracer is started
+    on the first request and its records are written at exit.
+    """
+    global _tracer
+    if _tracer is None and os.environ.get(TRACE_FILE_ENV):
+        _tracer = Tracer(" ".join(sys.argv), path=os.environ[TRACE_FILE_ENV])
+        atexit.register(finish_trace)
+    return _tracer
+
+
+@contextmanager
+def phase(name: str) -> Iterator[None]:
+    """Add the time spent in the block to a named phase of the trace, e.g. "polars"."""
+    tracer = current()
+    if tracer is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = (time.perf_counter() - start) * 1000
+        tracer.phases[name] = tracer.phases.get(name, 0.0) + elapsed
+
+
+# Recording requests
+
+
+def _ms(seconds: Optional[float]) -> Optional[float]:
+    return None if seconds is None else round(seconds * 1000, 3)
+
+
+def send(
+    tracer: Tracer,
+    request: Callable[..., Any],
+    method: str,
+    url: str,
+    **kwargs: Any,
+) -> Any:
+    """
+    Send a request with `request(method, url, **kwargs)` and record it.
+
+    The record is kept on the response as `response.trace`, so `loads` and
+    `stream` can add the time spent decoding its body.
+    """
+    from urllib.parse import urlsplit
+
+    connection.__dict__.clear()
+    start = time.perf_counter()
+    response = request(method, url, **kwargs)
+    total = time.perf_counter() - start
+    streamed = bool(kwargs.get("stream"))
+    split = urlsplit(url)
+    record = {
+        "time": round(tracer.started_at + (start - tracer.started), 6),
+        "method": method,
+        "path": split.path + (f"?{split.query}" if split.query else ""),
+        "status": response.status_code,
+        "bytes": 0 if streamed else len(response.content),
+        "start_ms": _ms(start - tracer.started),
+        "dns_ms": _ms(getattr(connection, "dns", None)),
+        "connect_ms": _ms(getattr(connection, "connect", None)),
+        "ttfb_ms": _ms(response.elapsed.total_seconds()),
+        "total_ms": _ms(total),
+        "decode_ms": 0.0,
+        "streamed": streamed,
+    }
+    response.trace = record
+    tracer.add(record)
+    return response
+
+
+def loads(data: bytes, response: Any = None) -> Any:
+    """`codec.loads`, adding the time taken to the response's trace record."""
+    import codec
+
+    record = getattr(response, "trace", None)
+    if record is None:
+        return codec.loads(data)
+    start = time.perf_counter()
+    try:
+        return codec.loads(data)
+    finally:
+        record["decode_ms"] += _ms(time.perf_counter() - start)
+
+
+def stream(
+    response: Any,
+    chunks: Iterable[bytes],
+    decode: Callable[[Iterable[bytes]], Iterator[Any]],
+) -> Iterator[Any]:
+    """
+    Decode a streamed body, recording its size and the time spent reading and decoding it.
+
+    Reading the body adds to the record's total time and decoding to its
+    decode time. The time the caller spends between elements is counted in
+    neither.
+    """
+    record = getattr(response, "trace", None)
+    if record is None:
+        yield from decode(chunks)
+        return
+    reading = 0.0
+
+    def timed_chunks() -> Iterator[bytes]:
+        nonlocal reading
+        iterator = iter(chunks)
+        while True:
+            start = time.perf_counter()
+            chunk = next(iterator, None)
+            reading += time.perf_counter() - start
+            if chunk is None:
+                return
+            record["bytes"] += len(chunk)
+            yield chunk
+
+    elements = decode(timed_chunks())
+    busy = 0.0
+    try:
+        while True:
+            start = time.perf_counter()
+            try:
+                element = next(elements)
+            finally:
+                busy += time.perf_counter() - start
+            yield element
+    except StopIteration:
+        return
+    finally:
+        record["total_ms"] = round(record["total_ms"] + _ms(reading), 3)
+        record["decode_ms"] = _ms(max(0.0, busy - reading))
+
+
+# The waterfall
+
+
+def _intervals_ms(records: List[Dict[str, Any]]) -> float:
+    # The time at least one request was in flight, so concurrent requests
+    # are not counted twice
+    covered, end = 0.0, float("-inf")
+    for record in sorted(records, key=lambda r: r["start_ms"]):
+        start, stop = record["start_ms"], record["start_ms"] + record["total_ms"]
+        if stop > end:
+            covered += stop - max(start, end)
+            end = stop
+    return covered
+
+
+def _format_ms(value: Optional[float]) -> str:
+    if value is None:
+        return "-"
+    return f"{value:.1f}ms" if value < 1000 else f"{value / 1000:.2f}s"
+
+
+def format_waterfall(tracer: Tracer) -> str:
+    """
+    Lay out a trace as a table of its requests, each with a bar of when it ran.
+
+    The last line splits the command's time into startup, network, decoding,
+    any named phases and everything else.
+
+    Example:
+        >>> print(format_waterfall(tracer))
+        Trace of `notes list` (95.2ms)
+          # method path           status     bytes    dns connect   ttfb  total decode
+          1 GET    /notes            200   812,406  0.1ms   0.3ms  4.2ms 41.0ms 22.3ms |██████████        |
+        startup 182.0ms, network 41.0ms, decode 22.3ms, polars 18.4ms, other 13.5ms
+    """
+    wall = tracer.elapsed_ms()
+    lines = [f"Trace of `{tracer.command}` ({_format_ms(wall)})"]
+    if tracer.records:
+        path_width = max(4, *(len(r["path"]) for r in tracer.records))
+        path_width = min(path_width, 40)
+        lines.append(
+            f"  {'#':>3} {'method':<6} {'path':<{path_width}} {'status':>6}"
+            f" {'bytes':>11} {'dns':>7} {'connect':>7} {'ttfb':>7}"
+            f" {'total':>7} {'decode':>7}"
+        )
+    scale = WATERFALL_WIDTH / wall if wall else 0
+    for number, record in enumerate(tracer.records, 1):
+        start = min(WATERFALL_WIDTH - 1, int(record["start_ms"] * scale))
+        width = max(1, round((record["total_ms"] + record["decode_ms"]) * scale))
+        bar = (" " * start + "█" * width).ljust(WATERFALL_WIDTH)[:WATERFALL_WIDTH]
+        lines.append(
+            f"  {number:>3} {record['method']:<6}"
+            f" {record['path'][:path_width]:<{path_width}} {record['status']:>6}"
+            f" {record['bytes']:>11,} {_format_ms(record['dns_ms']):>7}"
+            f" {_format_ms(record['connect_ms']):>7}"
+            f" {_format_ms(record['ttfb_ms']):>7} {_format_ms(record['total_ms']):>7}"
+            f" {_format_ms(record['decode_ms']):>7} |{bar}|"
+        )
+    network = _intervals_ms(tracer.records)
+    decode = sum(record["decode_ms"] for record in tracer.records)
+    parts = []
+    if tracer.startup is not None:
+        parts.append(f"startup {_format_ms(tracer.startup * 1000)}")
+    parts += [f"network {_format_ms(network)}", f"decode {_format_ms(decode)}"]
+    parts += [f"{name} {_format_ms(ms)}" for name, ms in tracer.phases.items()]
+    other = wall - network - decode - sum(tracer.phases.values())
+    parts.append(f"other {_format_ms(max(0.0, other))}")
+    lines.append(", ".join(parts))
+    return "\n".join(lines)
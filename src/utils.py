@@ -0,0 +1,88 @@
+import os
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import Any, Callable, Iterable, List, Optional, TypeVar
+
+T = TypeVar("T")
+# Kept below the client's connection pool so every call gets a connection
+MAX_CONCURRENT_CALLS = 8
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def cache_dir() -> Path:
+    """
+    Return the directory the client keeps its local state in, creating it if needed.
+
+    The location is `$DRAFTSMITH_CACHE_DIR` when set, otherwise `draftsmith`
+    under `$XDG_CACHE_HOME` (default: ~/.cache).
+
+    Returns:
+        Path: The cache directory.
+    """
+    if path := os.environ.get("DRAFTSMITH_CACHE_DIR"):
+        directory = Path(path)
+    else:
+        xdg_cache = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+        directory = Path(xdg_cache) / "draftsmith"
+    directory.mkdir(parents=True, exist_ok=True)
+    return directory
+
+
+def parse_datetime(value: str) -> datetime:
+    """
+    Parse a timestamp from the API or the CLI into a naive local datetime.
+
+    Accepts ISO 8601 timestamps with or without a time zone, such as the
+    server's "2023-06-01T09:00:00Z", and the CLI's "2023-06-01 09:00:00".
+
+    Example:
+        >>> parse_datetime("2023-06-01 09:00:00")
+        datetime.datetime(2023, 6, 1, 9, 0)
+    """
+    moment = datetime.fromisoformat(value)
+    if moment.tzinfo is not None:
+        moment = moment.astimezone().replace(tzinfo=None)
+    return moment
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """Return the thread pool shared by `run_concurrently` and `map_concurrently`."""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=MAX_CONCURRENT_CALLS, thread_name_prefix="draftsmith"
+        )
+    return _executor
+
+
+def run_concurrently(*calls: Callable[[], Any]) -> List[Any]:
+    """
+    Run independent calls at the same time and return their results in order.
+
+    Every call is waited for, then the exception of the first call to fail,
+    in the order given, is re-raised.
+
+    Args:
+        *calls (Callable[[], Any]): Functions taking no arguments.
+
+    Returns:
+        List[Any]: The result of each call, in the order given.
+
+    Example:
+        >>> notes, tags = run_concurrently(lambda: search_notes("foo"), get_tags_with_notes)
+    """
+    futures = [get_executor().submit(call) for call in calls]
+    wait(futures)
+    return [future.result() for future in futures]
+
+
+def map_concurrently(function: Callable[[Any], T], items: Iterable[Any]) -> List[T]:
+    """
+    Apply a function to every item at the same time and return the results in order.
+
+    Example:
+        >>> map_concurrently(get_note, [1, 2, 3])
+        [{"id": 1, ...}, {"id": 2, ...}, {"id": 3, ...}]
+    """
+    return list(get_executor().map(function, items))